@@ -0,0 +1,206 @@
+""" Headless benchmark of the live and non-live analysis pipelines.
+
+Runs each analyser over the given videos and reports frames/sec and p50/p95/p99 latency for every pipeline stage
+(decode, preprocess, inference, interpretation, overlay, encode) as JSON, so runs can be compared across commits and machines.
+
+    python pipeline_benchmark.py ../assets/goblet_squat.mp4 ../assets/barbell_back_squat.mp4 -o results.json
+
+live_analysis and non_live_analysis both have modules called squat_analyser, mediapipe_estimator, etc., so each
+analyser is benchmarked in its own subprocess with only its directory on the path. """
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+
+backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+analyser_dirs = {
+    'live': os.path.join(backend_dir, 'live_analysis'),
+    'non_live': os.path.join(backend_dir, 'non_live_analysis'),
+}
+
+
+def benchmark_live(video_path, model_complexity, frame_stride, landmark_filter):
+    """ Feeds every frame of the video through the live analyser as fast as possible, without display. """
+    import cv2
+    from mediapipe_estimator import MediaPipeDetector
+    from squat_analyser import SquatFormAnalyser
+    from stage_timer import StageTimer
+
+    stage_timer = StageTimer()
+    form_analyser = SquatFormAnalyser(
+        use_advanced_criteria=True,
+        stage_timer=stage_timer,
+        pose_detector=MediaPipeDetector(model_complexity=model_complexity),
+        frame_stride=frame_stride,
+        landmark_filter=landmark_filter
+    )
+
+    cap = cv2.VideoCapture(video_path)
+    frames = 0
+    start_time = time.perf_counter()
+    try:
+        while True:
+            _, success = form_analyser.analyse(cap, show_output=False)
+            if not success:
+                break
+            frames += 1
+        elapsed_time = time.perf_counter() - start_time
+    finally:
+        cap.release()
+        form_analyser.close()
+
+    return frames, elapsed_time, stage_timer.get_summary()
+
+
+def benchmark_non_live(video_path, model_complexity, frame_stride, landmark_filter, render_video=True):
+    """ Analyses the video with the non-live analyser, without display or landmark cache, and discards the output.
+    Without render_video, the annotated video isn't drawn or encoded. """
+    from squat_analyser import SquatFormAnalyser
+    from stage_timer import StageTimer
+
+    stage_timer = StageTimer()
+    form_analyser = SquatFormAnalyser(
+        model_complexity=model_complexity,
+        stage_timer=stage_timer,
+        frame_stride=frame_stride,
+        landmark_filter=landmark_filter
+    )
+
+    start_time = time.perf_counter()
+    try:
+        temp_video_file, _ = form_analyser.analyse(video_path, show_output=False, render_video=render_video)
+        elapsed_time = time.perf_counter() - start_time
+    finally:
+        form_analyser.close()
+    if temp_video_file is not None:
+        temp_video_file.close()
+        os.unlink(temp_video_file.name)
+
+    return stage_timer.frames, elapsed_time, stage_timer.get_summary()
+
+
+def run_worker(analyser, video_path, model_complexity, frame_stride, adaptive_frame_stride, landmark_filter, render_video):
+    """ Benchmarks one analyser on one video in this process and prints the result as JSON. """
+    sys.path.insert(0, analyser_dirs[analyser])
+    from frame_stride import FrameStride
+    from landmark_filter import LandmarkFilter
+
+    benchmark_args = [
+        video_path,
+        model_complexity,
+        FrameStride(frame_stride, adaptive=adaptive_frame_stride),
+        None if landmark_filter is None else LandmarkFilter(landmark_filter)
+    ]
+    if analyser == 'live':
+        frames, elapsed_time, stages = benchmark_live(*benchmark_args)
+    else:
+        frames, elapsed_time, stages = benchmark_non_live(*benchmark_args, render_video=render_video)
+
+    print(json.dumps({
+        'analyser': analyser,
+        'video': video_path,
+        'model_complexity': model_complexity,
+        'frame_stride': frame_stride,
+        'adaptive_frame_stride': adaptive_frame_stride,
+        'landmark_filter': landmark_filter,
+        'render_video': render_video,
+        'frames': frames,
+        'total_seconds': round(elapsed_time, 4),
+        'fps': round(frames / elapsed_time, 2) if elapsed_time > 0 else None,
+        'stages': stages,
+    }))
+
+
+def get_git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'],
+            cwd=backend_dir,
+            capture_output=True,
+            text=True,
+            check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('videos', nargs='+', help='videos to benchmark')
+    parser.add_argument('-a', '--analysers', nargs='+', choices=list(analyser_dirs), default=list(analyser_dirs))
+    parser.add_argument('-m', '--model-complexity', type=int, choices=[0, 1, 2], default=1)
+    parser.add_argument('-s', '--frame-stride', type=int, default=1, help='run pose inference on every nth frame')
+    parser.add_argument('--adaptive-frame-stride', action='store_true', help='run pose inference on every frame during reps')
+    parser.add_argument('--landmark-filter', choices=['one_euro', 'kalman'], help='smooth the landmarks over time')
+    parser.add_argument(
+        '--render',
+        action=argparse.BooleanOptionalAction,
+        default=True,
+        help='draw and encode the annotated video in non-live analysis'
+    )
+    parser.add_argument('-o', '--output', help='file to write the JSON results to (default: stdout)')
+    parser.add_argument('--worker', choices=list(analyser_dirs), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker is not None:
+        run_worker(
+            args.worker,
+            args.videos[0],
+            args.model_complexity,
+            args.frame_stride,
+            args.adaptive_frame_stride,
+            args.landmark_filter,
+            args.render
+        )
+        return
+
+    runs = []
+    for analyser in args.analysers:
+        for video_path in args.videos:
+            print(f'Benchmarking {analyser} analysis of {video_path}...', file=sys.stderr)
+            result = subprocess.run(
+                [
+                    sys.executable, os.path.abspath(__file__),
+                    '--worker', analyser,
+                    '--model-complexity', str(args.model_complexity),
+                    '--frame-stride', str(args.frame_stride),
+                    *(['--adaptive-frame-stride'] if args.adaptive_frame_stride else []),
+                    *([] if args.landmark_filter is None else ['--landmark-filter', args.landmark_filter]),
+                    '--render' if args.render else '--no-render',
+                    os.path.abspath(video_path)
+                ],
+                cwd=analyser_dirs[analyser],
+                stdout=subprocess.PIPE,
+                text=True
+            )
+            if result.returncode != 0:
+                print(f'Benchmark of {analyser} analysis of {video_path} failed', file=sys.stderr)
+                continue
+
+            # The analysers print their own progress, so the result is the last line
+            runs.append(json.loads(result.stdout.strip().splitlines()[-1]))
+
+    results = json.dumps({
+        'commit': get_git_commit(),
+        'machine': {
+            'platform': platform.platform(),
+            'processor': platform.processor(),
+            'cpu_count': os.cpu_count(),
+            'python': platform.python_version(),
+        },
+        'runs': runs,
+    }, indent=2)
+
+    if args.output is None:
+        print(results)
+    else:
+        with open(args.output, 'w') as f:
+            f.write(results)
+
+
+if __name__ == '__main__':
+    main()
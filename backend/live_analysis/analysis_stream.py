@@ -0,0 +1,147 @@
+import asyncio
+import time
+from collections import namedtuple
+from concurrent.futures import CancelledError
+from queue import Queue
+from threading import Event, Lock, Thread
+
+import cv2
+from landmark_frame import NUM_LANDMARKS
+from stage_timer import DECODE
+
+
+# Landmarks still to be estimated from a stream item's frame
+NOT_GIVEN = object()
+# Marks the end of the items handed to a pipeline running on its own thread
+END = object()
+
+# What the pose estimation stage of a pipeline passes on for each frame: its (33, 4) landmarks array, None if no
+# pose was detected, and when it was ingested and its landmarks were known. frame is None if the stream held
+# landmarks only.
+PoseEstimate = namedtuple('PoseEstimate', ['timestamp', 'frame', 'landmarks', 'ingested_at', 'inferred_at'])
+
+# What analysing a stream yields for each frame: its index in the stream, timestamp in seconds, the frame itself
+# (None if the stream held landmarks only), its (33, 4) landmarks (None if no pose was detected), the analyser's
+# feedback on it and the overlay instructions (see frame_renderer) for drawing it, if any
+FeedbackEvent = namedtuple('FeedbackEvent', ['index', 'timestamp', 'frame', 'landmarks', 'feedback', 'overlay'])
+
+
+def is_landmarks(data):
+    """ Whether data is a (33, 4) landmarks array rather than a frame. """
+    return getattr(data, 'shape', None) == (NUM_LANDMARKS, 4)
+
+
+def split_item(item):
+    """ Returns the (timestamp, frame, landmarks) of a stream item, which is (timestamp, frame), (timestamp, landmarks)
+    with landmarks None if no pose was detected, or (timestamp, frame, landmarks). frame is None for landmarks only
+    and landmarks NOT_GIVEN if they are to be estimated from the frame. """
+    if len(item) == 3:
+        return item
+
+    timestamp, data = item
+    if data is None or is_landmarks(data):
+        return timestamp, None, data
+    return timestamp, data, NOT_GIVEN
+
+
+def read_frames(cap, buffers=None, clock=None, stage_timer=None):
+    """ Decode stage: yields (timestamp, frame) for each frame read from cap, anything with the read() of a
+    cv2.VideoCapture, until it runs out. clock(cap) gives the frame's timestamp in seconds, by default its position
+    in the media. If given, frames are decoded into the arrays in buffers (a deque) while it has any. """
+    while True:
+        stage_start = time.perf_counter()
+        if buffers is None:
+            success, frame = cap.read()
+        else:
+            success, frame = cap.read(buffers.pop() if buffers else None)
+        if not success:
+            return
+
+        timestamp = cap.get(cv2.CAP_PROP_POS_MSEC) / 1000 if clock is None else clock(cap)
+        if stage_timer is not None:
+            stage_timer.record_since(DECODE, stage_start)
+        yield timestamp, frame
+
+
+def attach_landmarks(frames, landmarks, detected, timestamps):
+    """ Pairs each (timestamp, frame) of frames with its landmarks from a (num_frames, 33, 4) track already known,
+    e.g. from a LandmarkCache, giving stream items that skip pose estimation. Frames beyond the track have none. """
+    for i, (timestamp, frame) in enumerate(frames):
+        if i < len(landmarks):
+            yield timestamps[i], frame, landmarks[i] if detected[i] else None
+        else:
+            yield timestamp, frame, None
+
+
+async def iterate_in_thread(pipeline, items, max_pending=2):
+    """ Runs pipeline, a function from an iterable to an iterator such as an analyser's analyse_stream(), over the
+    async iterable items on a thread of its own, yielding what it yields. Analysis never blocks the event loop, and
+    at most max_pending items wait for the pipeline before items stops being read. Likewise at most max_pending of
+    its outputs wait to be yielded before the pipeline waits for them to be taken. """
+    loop = asyncio.get_running_loop()
+    inputs = Queue(maxsize=max_pending)
+    outputs = asyncio.Queue(maxsize=max_pending)
+    stopped = Event()
+    lock = Lock()
+    pending_put = None
+
+    def get_items():
+        item = inputs.get()
+        while item is not END:
+            yield item
+            item = inputs.get()
+
+    def put(output):
+        """ Waits until output is queued, returning False instead if its outputs are no longer being taken. """
+        nonlocal pending_put
+        with lock:
+            if stopped.is_set():
+                return False
+            pending_put = asyncio.run_coroutine_threadsafe(outputs.put(output), loop)
+        try:
+            pending_put.result()
+        except CancelledError:
+            return False
+        return True
+
+    def run():
+        source = get_items()
+        try:
+            for output in pipeline(source):
+                if not put((output, None)):
+                    break
+            else:
+                put((END, None))
+        except Exception as e:
+            put((END, e))
+        finally:
+            # Keep taking items until the end, so that feeding them never blocks on a pipeline that stopped early
+            for _ in source:
+                pass
+
+    async def feed():
+        try:
+            async for item in items:
+                await loop.run_in_executor(None, inputs.put, item)
+        finally:
+            await loop.run_in_executor(None, inputs.put, END)
+
+    Thread(target=run, daemon=True).start()
+    feeder = asyncio.ensure_future(feed())
+    try:
+        while True:
+            output, error = await outputs.get()
+            if error is not None:
+                raise error
+            if output is END:
+                break
+            yield output
+        # Raises anything items raised
+        await feeder
+    finally:
+        # Stops reading items, and the pipeline once it has caught up
+        feeder.cancel()
+        with lock:
+            stopped.set()
+            if pending_put is not None:
+                pending_put.cancel()
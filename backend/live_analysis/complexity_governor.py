@@ -0,0 +1,71 @@
+import time
+
+from mediapipe_estimator import MediaPipeDetector
+
+
+class ComplexityGovernor():
+    """ Stands in for a MediaPipeDetector, switching between model complexities to keep inference within a latency budget.
+
+    A warm detector is kept for each of model_complexities, so switching is instant. Inference latency is tracked as an
+    exponentially weighted moving average (weight smoothing per frame). When it goes over latency_budget the governor
+    steps down to the next cheaper model, and when it is under headroom * latency_budget it steps back up. After each
+    switch the governor waits switch_cooldown frames before switching again, so it doesn't oscillate between levels.
+    If given, metrics (e.g. a PipelineMetrics) counts the switches. """
+    def __init__(
+        self,
+        latency_budget,
+        model_complexities=(0, 1),
+        smoothing=0.1,
+        headroom=0.5,
+        switch_cooldown=30,
+        metrics=None
+    ):
+        self.latency_budget = latency_budget
+        self.model_complexities = sorted(model_complexities)
+        self.smoothing = smoothing
+        self.headroom = headroom
+        self.switch_cooldown = switch_cooldown
+        self.metrics = metrics
+
+        self.detectors = [MediaPipeDetector(model_complexity=c) for c in self.model_complexities]
+        self.level = len(self.detectors) - 1
+        self.latency = None
+        self.frames_since_switch = 0
+
+    @property
+    def model_complexity(self):
+        return self.model_complexities[self.level]
+
+    @property
+    def params(self):
+        return self.detectors[self.level].params
+
+    def make_prediction(self, image):
+        start = time.perf_counter()
+        pose_landmarks = self.detectors[self.level].make_prediction(image)
+        self.__update(time.perf_counter() - start)
+
+        return pose_landmarks
+
+    def __update(self, latency):
+        if self.latency is None:
+            self.latency = latency
+        else:
+            self.latency += self.smoothing * (latency - self.latency)
+
+        self.frames_since_switch += 1
+        if self.frames_since_switch < self.switch_cooldown:
+            return
+
+        if self.latency > self.latency_budget and self.level > 0:
+            self.__switch(self.level - 1)
+        elif self.latency < self.headroom * self.latency_budget and self.level < len(self.detectors) - 1:
+            self.__switch(self.level + 1)
+
+    def __switch(self, level):
+        if self.metrics is not None:
+            self.metrics.record_complexity_switch()
+        self.level = level
+        # The new level's latency is unknown, so start measuring afresh
+        self.latency = None
+        self.frames_since_switch = 0
@@ -0,0 +1,38 @@
+from threading import Lock
+
+
+def get_feedback_key(f):
+    """ Identifies a piece of feedback by what it says rather than when it was given. """
+    return f['tag'], f.get('message')
+
+
+class FeedbackAccumulator():
+    """ Insertion-ordered, de-duplicating store of the feedback waiting to be collected by a client.
+
+    Feedback is keyed on (tag, message), so adding feedback that is already waiting is an O(1) no-op.
+    All operations hold a lock, so the analysis thread can add feedback while server threads drain it. """
+    def __init__(self):
+        self.feedback = {}
+        self.lock = Lock()
+
+    def add(self, feedback):
+        with self.lock:
+            for f in feedback:
+                self.feedback.setdefault(get_feedback_key(f), f)
+
+    def replace(self, feedback):
+        """ Discards any waiting feedback in favour of feedback, e.g. when a set ends. """
+        new_feedback = {get_feedback_key(f): f for f in feedback}
+        with self.lock:
+            self.feedback = new_feedback
+
+    def drain(self):
+        """ Atomically takes and returns all waiting feedback in the order it was first added. """
+        with self.lock:
+            feedback, self.feedback = self.feedback, {}
+
+        return list(feedback.values())
+
+    def __len__(self):
+        with self.lock:
+            return len(self.feedback)
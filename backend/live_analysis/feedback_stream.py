@@ -0,0 +1,37 @@
+from collections import deque
+from itertools import islice
+from threading import Condition
+
+
+class FeedbackStream():
+    """ Bounded, sequence-numbered log of feedback events that any number of clients can follow.
+
+    Sequence numbers start at 1 and increase by one per event, so a client that reconnects can resume
+    from the last sequence number it saw. Only the newest max_events are kept for resuming. """
+    def __init__(self, max_events=1000):
+        self.events = deque(maxlen=max_events)
+        self.last_sequence = 0
+        self.closed = False
+        self.condition = Condition()
+
+    def publish(self, feedback):
+        with self.condition:
+            for f in feedback:
+                self.last_sequence += 1
+                self.events.append((self.last_sequence, f))
+            self.condition.notify_all()
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+    def get_events(self, after_sequence=0, timeout=None):
+        """ Blocks for up to timeout seconds until there are events after after_sequence, then returns
+        them as (sequence, feedback) pairs along with whether the stream has been closed. """
+        with self.condition:
+            self.condition.wait_for(lambda: self.last_sequence > after_sequence or self.closed, timeout)
+
+            first_sequence = self.last_sequence - len(self.events) + 1
+            start = max(after_sequence + 1 - first_sequence, 0)
+            return list(islice(self.events, start, None)), self.closed
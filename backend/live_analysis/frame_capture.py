@@ -0,0 +1,101 @@
+import time
+from collections import deque
+from threading import Condition, Event
+
+import cv2
+
+
+class FrameRing():
+    """ Fixed-size ring of the most recently captured frames. Writing to a full ring overwrites the oldest
+    frame and reading always takes the newest one, so stale frames are dropped instead of queueing up.
+    Up to size of the dropped frames, which were never read, are kept for take_dropped() so that their arrays can be
+    decoded into again. """
+    def __init__(self, size=2):
+        self.frames = deque(maxlen=size)
+        self.dropped_frames = deque(maxlen=size)
+        self.frames_dropped = 0
+        self.closed = False
+        self.condition = Condition()
+
+    def put(self, frame):
+        with self.condition:
+            if len(self.frames) == self.frames.maxlen:
+                self.frames_dropped += 1
+                self.dropped_frames.append(self.frames[0])
+            self.frames.append(frame)
+            self.condition.notify()
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+    def get_latest(self, timeout=None):
+        """ Blocks until a frame is available and returns the newest one, discarding any older frames.
+        Returns None if the ring is closed, or the timeout expires, with no frames left. """
+        with self.condition:
+            self.condition.wait_for(lambda: self.frames or self.closed, timeout)
+            if not self.frames:
+                return None
+
+            frame = self.frames.pop()
+            self.frames_dropped += len(self.frames)
+            self.dropped_frames.extend(self.frames)
+            self.frames.clear()
+
+            return frame
+
+    def take_dropped(self):
+        """ Returns a frame that was dropped without being read, or None if there are none. """
+        with self.condition:
+            return self.dropped_frames.pop() if self.dropped_frames else None
+
+
+class LatestFrameCapture():
+    """ Receives frames from a capture whose read() is a coroutine (see stream_decoder.StreamDecoder) into a
+    FrameRing on the event loop with receive(), for analysis on another thread.
+
+    read() matches cv2.VideoCapture.read() so it can be passed straight to SquatFormAnalyser.analyse,
+    but it always returns the freshest received frame, so slow inference never lets latency build up.
+    Each frame's media timestamp (in seconds) and the wall-clock time it was received are read alongside it and,
+    after read(), are available as timestamp and ingest_time.
+    Frames are decoded into the arrays of frames the ring dropped unread, when there are any.
+    The underlying capture is left to its owner to release. """
+    def __init__(self, cap, ring_size=2):
+        self.cap = cap
+        self.timestamp = None
+        self.ingest_time = None
+        self.ring = FrameRing(ring_size)
+        self.stopped = Event()
+
+    @property
+    def frames_dropped(self):
+        return self.ring.frames_dropped
+
+    def read(self):
+        timestamped_frame = self.ring.get_latest()
+        if timestamped_frame is None:
+            return False, None
+
+        self.timestamp, self.ingest_time, frame = timestamped_frame
+        return True, frame
+
+    def release(self):
+        self.stopped.set()
+        self.ring.close()
+
+    async def receive(self):
+        """ Receives frames from the capture as they arrive, until it ends or release() is called. """
+        try:
+            while not self.stopped.is_set():
+                buffer = self.__get_buffer()
+                success, frame = await (self.cap.read() if buffer is None else self.cap.read(buffer))
+                if not success:
+                    break
+                self.ring.put((self.cap.get(cv2.CAP_PROP_POS_MSEC) / 1000, time.time(), frame))
+        finally:
+            self.ring.close()
+
+    def __get_buffer(self):
+        dropped_frame = self.ring.take_dropped()
+        return None if dropped_frame is None else dropped_frame[2]
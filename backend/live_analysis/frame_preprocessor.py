@@ -0,0 +1,119 @@
+import cv2
+import numpy as np
+
+
+class FramePreprocessor():
+    """ Prepares decoded BGR frames for pose estimation and maps the resulting landmarks back onto the frame.
+
+    prepare() downsizes the frame so its longest side is at most max_size, optionally first cropping it to the person's
+    bounding box in the previous frame (plus crop_margin of the box's size on each side), and converts it to RGB, as
+    MediaPipe expects. The resized and RGB images are written into buffers that are reused from frame to frame, so
+    steady-state preprocessing allocates nothing.
+
+    MediaPipe's landmarks are normalised to the image it was given, so map_to_frame() must be called with them to
+    convert them to coordinates normalised to the whole frame, e.g. for drawing overlays. """
+    def __init__(self, max_size=640, crop_to_person=False, crop_margin=0.25, min_visibility=0.5, crop_granularity=32):
+        # Everything that affects the predicted landmarks, e.g. for keying cached landmarks
+        self.params = {
+            'max_size': max_size,
+            'crop_to_person': crop_to_person,
+            'crop_margin': crop_margin,
+        }
+        self.max_size = max_size
+        self.crop_to_person = crop_to_person
+        self.crop_margin = crop_margin
+        self.min_visibility = min_visibility
+        # Crops are rounded out to multiples of this many pixels, so that the same buffer sizes come up again
+        self.crop_granularity = crop_granularity
+
+        self.buffers = {}  # (width, height): (resized frame, RGB image)
+        self.max_buffers = 8
+        self.frame_size = None
+        self.crop = None  # (x0, y0, x1, y1) region of the last frame given to the detector, in pixels
+        self.person_box = None  # (x0, y0, x1, y1) bounding box of the person in the last frame, in pixels
+
+    def reset(self):
+        self.person_box = None
+
+    def prepare(self, frame):
+        """ Returns the RGB image to run pose estimation on for frame. It is only valid until the next call. """
+        height, width = frame.shape[:2]
+        self.frame_size = (width, height)
+        self.crop = self.__get_crop(width, height)
+
+        x0, y0, x1, y1 = self.crop
+        region = frame[y0:y1, x0:x1]
+        scale = min(1.0, self.max_size / max(x1 - x0, y1 - y0))
+        size = (max(round((x1 - x0) * scale), 1), max(round((y1 - y0) * scale), 1))
+        resized, rgb_image = self.__get_buffers(size, scale < 1.0)
+
+        if resized is not None:
+            region = cv2.resize(region, size, dst=resized, interpolation=cv2.INTER_AREA)
+        # MediaPipeDetector marks the image it was given as read-only
+        rgb_image.flags.writeable = True
+        cv2.cvtColor(region, cv2.COLOR_BGR2RGB, dst=rgb_image)
+
+        return rgb_image
+
+    def map_to_frame(self, pose_landmarks):
+        """ Converts the landmarks predicted for the last prepared image, in place, to be normalised to its whole frame
+        and notes where the person is for cropping the next frame. Returns pose_landmarks. """
+        if pose_landmarks is None:
+            self.person_box = None
+            return None
+
+        width, height = self.frame_size
+        x0, y0, x1, y1 = self.crop
+        if self.crop != (0, 0, width, height):
+            scale_x, scale_y = (x1 - x0) / width, (y1 - y0) / height
+            offset_x, offset_y = x0 / width, y0 / height
+            for lm in pose_landmarks.landmark:
+                lm.x = offset_x + lm.x * scale_x
+                lm.y = offset_y + lm.y * scale_y
+                # z is on roughly the same scale as x
+                lm.z *= scale_x
+
+        if self.crop_to_person:
+            visible = [lm for lm in pose_landmarks.landmark if lm.visibility >= self.min_visibility]
+            if visible:
+                self.person_box = (
+                    min(lm.x for lm in visible) * width,
+                    min(lm.y for lm in visible) * height,
+                    max(lm.x for lm in visible) * width,
+                    max(lm.y for lm in visible) * height
+                )
+            else:
+                self.person_box = None
+
+        return pose_landmarks
+
+    def __get_crop(self, width, height):
+        if not self.crop_to_person or self.person_box is None:
+            return 0, 0, width, height
+
+        box_x0, box_y0, box_x1, box_y1 = self.person_box
+        margin = self.crop_margin * max(box_x1 - box_x0, box_y1 - box_y0)
+        g = self.crop_granularity
+        x0 = max(int((box_x0 - margin) // g) * g, 0)
+        y0 = max(int((box_y0 - margin) // g) * g, 0)
+        x1 = min(int(-((box_x1 + margin) // -g)) * g, width)
+        y1 = min(int(-((box_y1 + margin) // -g)) * g, height)
+        if x1 - x0 < g or y1 - y0 < g:
+            return 0, 0, width, height
+
+        return x0, y0, x1, y1
+
+    def __get_buffers(self, size, needs_resize):
+        buffers = self.buffers.get(size)
+        if buffers is None:
+            if len(self.buffers) >= self.max_buffers:
+                self.buffers.clear()
+
+            width, height = size
+            buffers = self.buffers[size] = (
+                np.empty((height, width, 3), dtype=np.uint8),
+                np.empty((height, width, 3), dtype=np.uint8)
+            )
+
+        resized, rgb_image = buffers
+        return resized if needs_resize else None, rgb_image
@@ -0,0 +1,172 @@
+import time
+from collections import deque
+from queue import Full, Queue
+from threading import Event, Thread
+
+import cv2
+import mediapipe as mp
+import numpy as np
+from landmark_cache import array_to_pose_landmarks
+from stage_timer import ENCODE, OVERLAY
+
+
+# Overlay instructions, drawn in order
+LANDMARKS = 'landmarks'  # (LANDMARKS, landmarks) with a (33, 4) landmarks array
+LINE = 'line'  # (LINE, (x1, y1), (x2, y2), colour) in pixels
+TEXT = 'text'  # (TEXT, text, (x, y), to_centre, font_scale) in pixels, on a black background
+RESIZE = 'resize'  # (RESIZE, (width, height)), e.g. for display
+
+FONT = cv2.FONT_HERSHEY_PLAIN
+FONT_THICKNESS = 2
+TEXT_COLOUR = (219, 123, 3)
+TEXT_BACKGROUND_COLOUR = (0, 0, 0)
+LINE_THICKNESS = 3
+
+
+class FrameRenderer():
+    """ Draws overlays on analysed frames and writes them out on its own thread, so that analysis never waits on
+    drawing or encoding.
+
+    Analysers submit() each frame along with a list of overlay instructions (see LANDMARKS, LINE, TEXT and RESIZE)
+    instead of drawing on it themselves. Frames queue up to queue_size deep, after which submit() blocks or, with
+    drop_when_full (e.g. for display only), drops the frame. Rendered frames are written to out (a cv2.VideoWriter)
+    and/or shown in a window called window_name. With recycle_frames, the submitted frame buffers are then put on
+    spare_frames to be decoded into again, so the caller must take them back off it (see analysis_stream.read_frames).
+    If the window is shown, pressing q sets quit_requested.
+
+    Text is drawn from sprites cached by text and font scale, as the same few labels come up on most frames. """
+    def __init__(
+        self,
+        out=None,
+        window_name=None,
+        queue_size=8,
+        drop_when_full=False,
+        stage_timer=None,
+        max_sprites=256,
+        recycle_frames=False
+    ):
+        self.out = out
+        self.window_name = window_name
+        self.drop_when_full = drop_when_full
+        self.stage_timer = stage_timer
+        self.queue = Queue(maxsize=queue_size)
+        self.recycle_frames = recycle_frames
+        self.spare_frames = deque()
+        self.quit_requested = Event()
+        self.frames_dropped = 0
+
+        self.mp_draw = mp.solutions.drawing_utils
+        self.mp_drawing_spec = mp.solutions.drawing_styles.get_default_pose_landmarks_style()
+        self.sprites = {}  # (text, font scale): (sprite, text size, padding)
+        self.max_sprites = max_sprites
+        self.resized_frame = None
+
+        self.thread = Thread(target=self.__run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def submit(self, frame, overlay):
+        """ Queues frame to be drawn with overlay. Returns False if it was dropped instead. """
+        if not self.drop_when_full:
+            self.queue.put((frame, overlay))
+            return True
+
+        try:
+            self.queue.put_nowait((frame, overlay))
+            return True
+        except Full:
+            self.frames_dropped += 1
+            return False
+
+    def close(self):
+        """ Waits for every queued frame to be written out. """
+        if self.thread.ident is not None:
+            self.queue.put(None)
+            self.thread.join()
+
+    def __run(self):
+        try:
+            while True:
+                item = self.queue.get()
+                if item is None:
+                    break
+
+                frame, overlay = item
+                self.__render(frame, overlay)
+                if self.recycle_frames:
+                    self.spare_frames.append(frame)
+        finally:
+            if self.window_name is not None:
+                cv2.destroyWindow(self.window_name)
+
+    def __render(self, frame, overlay):
+        stage_start = time.perf_counter()
+        image = frame
+        for instruction in overlay:
+            kind = instruction[0]
+            if kind == LANDMARKS:
+                # Only built for MediaPipe's drawing, here on the renderer's thread
+                self.mp_draw.draw_landmarks(
+                    image,
+                    array_to_pose_landmarks(instruction[1]),
+                    mp.solutions.pose.POSE_CONNECTIONS,
+                    landmark_drawing_spec=self.mp_drawing_spec
+                )
+            elif kind == LINE:
+                _, p1, p2, colour = instruction
+                cv2.line(image, p1, p2, colour, thickness=LINE_THICKNESS)
+            elif kind == TEXT:
+                _, text, pos, to_centre, font_scale = instruction
+                self.__draw_text(image, text, pos, to_centre, font_scale)
+            elif kind == RESIZE:
+                self.resized_frame = cv2.resize(image, instruction[1], dst=self.resized_frame)
+                image = self.resized_frame
+
+        if self.window_name is not None:
+            cv2.imshow(self.window_name, image)
+            if cv2.waitKey(1) == ord('q'):
+                self.quit_requested.set()
+        if self.stage_timer is not None:
+            stage_start = self.stage_timer.record_since(OVERLAY, stage_start)
+
+        if self.out is not None:
+            self.out.write(image)
+            if self.stage_timer is not None:
+                self.stage_timer.record_since(ENCODE, stage_start)
+
+    def __draw_text(self, image, text, pos, to_centre, font_scale):
+        sprite, (text_w, text_h), pad = self.__get_sprite(text, font_scale)
+        x, y = pos
+        if to_centre:
+            x -= text_w // 2
+            y -= text_h // 2
+        x -= pad
+        y -= pad
+
+        # Copy the sprite, clipped to the image
+        x0, y0 = max(x, 0), max(y, 0)
+        x1, y1 = min(x + sprite.shape[1], image.shape[1]), min(y + sprite.shape[0], image.shape[0])
+        if x0 < x1 and y0 < y1:
+            image[y0:y1, x0:x1] = sprite[y0 - y:y1 - y, x0 - x:x1 - x]
+
+    def __get_sprite(self, text, font_scale):
+        key = (text, font_scale)
+        sprite = self.sprites.get(key)
+        if sprite is not None:
+            return sprite
+
+        if len(self.sprites) >= self.max_sprites:
+            self.sprites.clear()
+
+        # The background covers the whole sprite, including descenders and stroke thickness, so that it is opaque
+        # and can simply be copied onto frames
+        (text_w, text_h), baseline = cv2.getTextSize(text, FONT, font_scale, FONT_THICKNESS)
+        pad = FONT_THICKNESS
+        image = np.empty((text_h + baseline + font_scale + 2 * pad, text_w + 1 + 2 * pad, 3), dtype=np.uint8)
+        image[:] = TEXT_BACKGROUND_COLOUR
+        cv2.putText(image, text, (pad, pad + text_h + font_scale - 1), FONT, font_scale, TEXT_COLOUR, FONT_THICKNESS)
+
+        sprite = self.sprites[key] = (image, (text_w, text_h), pad)
+        return sprite
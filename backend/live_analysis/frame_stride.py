@@ -0,0 +1,107 @@
+import numpy as np
+from landmark_frame import VISIBILITY
+
+
+LINEAR = 'linear'
+SPLINE = 'spline'
+
+
+class FrameStride():
+    """ Runs pose inference on every stride-th frame (a keyframe) and fills in the landmarks of the frames in between.
+
+    interpolate() fills the frames between the last two keyframes with (33, 4) landmark arrays, either linearly or
+    along a cubic Hermite spline whose tangent at the earlier keyframe comes from the keyframes either side of it, so
+    the form rules and overlays still get landmarks for every frame. That has to wait for the later keyframe, so where
+    the delay can't be afforded extrapolate() predicts a frame from the last two keyframes instead. Frames next to a
+    keyframe with no pose get no landmarks.
+
+    Squats are mostly slow, but the descent and the bottom of a rep move fastest and are where most form mistakes
+    happen, so with adaptive the stride drops to 1 for as long as set_fast_phase(True). """
+    def __init__(self, stride=1, adaptive=False, method=LINEAR):
+        if method not in (LINEAR, SPLINE):
+            raise ValueError(f'Unknown interpolation method {method!r}')
+
+        # Everything that affects the landmarks, e.g. for keying cached landmarks
+        self.params = {
+            'frame_stride': stride,
+            'adaptive_frame_stride': adaptive,
+            'frame_interpolation': method,
+        }
+        self.stride = stride
+        self.adaptive = adaptive
+        self.method = method
+        self.fast_phase = False
+        self.keyframes = []  # The last three keyframes as (frame index, landmarks or None), oldest first
+
+    def reset(self):
+        self.fast_phase = False
+        self.keyframes = []
+
+    @property
+    def current_stride(self):
+        return 1 if self.adaptive and self.fast_phase else self.stride
+
+    def set_fast_phase(self, fast_phase):
+        self.fast_phase = fast_phase
+
+    def is_keyframe(self, frame_index):
+        return not self.keyframes or frame_index - self.keyframes[-1][0] >= self.current_stride
+
+    def add_keyframe(self, frame_index, landmarks):
+        """ Records the (33, 4) landmarks inferred for frame_index, or None if no pose was detected, returning the copy
+        it keeps. The copy is never changed, so it can be passed on in place of landmarks. """
+        keyframe_landmarks = None if landmarks is None else np.array(landmarks, dtype=np.float32)
+        self.keyframes.append((frame_index, keyframe_landmarks))
+        if len(self.keyframes) > 3:
+            self.keyframes.pop(0)
+        return keyframe_landmarks
+
+    def interpolate(self):
+        """ Returns the landmarks (or None) of each frame strictly between the last two keyframes, in order. """
+        if len(self.keyframes) < 2:
+            return []
+
+        (start_index, start), (end_index, end) = self.keyframes[-2:]
+        num_frames = end_index - start_index - 1
+        if num_frames <= 0:
+            return []
+        if start is None or end is None:
+            return [None] * num_frames
+
+        t = (np.arange(1, num_frames + 1, dtype=np.float32) / (end_index - start_index))[:, None, None]
+        if self.method == LINEAR:
+            return list(start + t * (end - start))
+
+        # Hermite tangents are per keyframe interval. The later keyframe's next neighbour isn't known yet, so its
+        # tangent is one-sided
+        end_tangent = end - start
+        start_tangent = end_tangent
+        if len(self.keyframes) == 3 and self.keyframes[0][1] is not None:
+            previous_index, previous = self.keyframes[0]
+            start_tangent = (end - previous) * (end_index - start_index) / (end_index - previous_index)
+
+        t2, t3 = t * t, t * t * t
+        frames = (
+            (2 * t3 - 3 * t2 + 1) * start
+            + (t3 - 2 * t2 + t) * start_tangent
+            + (-2 * t3 + 3 * t2) * end
+            + (t3 - t2) * end_tangent
+        )
+        # The spline can overshoot, which visibility (a probability) can't
+        np.clip(frames[..., VISIBILITY], 0, 1, out=frames[..., VISIBILITY])
+        return list(frames)
+
+    def extrapolate(self, frame_index):
+        """ Predicts the landmarks of frame_index, after the last keyframe, by carrying on the motion between the last
+        two keyframes. Visibility is held at the last keyframe's. """
+        if not self.keyframes or self.keyframes[-1][1] is None:
+            return None
+
+        end_index, end = self.keyframes[-1]
+        if len(self.keyframes) < 2 or self.keyframes[-2][1] is None:
+            return end.copy()
+
+        start_index, start = self.keyframes[-2]
+        landmarks = end + (end - start) * ((frame_index - end_index) / (end_index - start_index))
+        landmarks[:, VISIBILITY] = end[:, VISIBILITY]
+        return landmarks
@@ -0,0 +1,158 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import cv2
+import numpy as np
+from mediapipe.framework.formats import landmark_pb2
+
+
+NUM_LANDMARKS = 33
+
+default_cache_dir = os.path.join(tempfile.gettempdir(), 'squat_tracker_landmark_cache')
+default_max_size = 2 * 1024 * 1024 * 1024  # Bytes
+hash_chunk_size = 1024 * 1024
+
+
+def hash_video(video_path):
+    """ Returns the SHA-256 hex digest of the video file's contents. """
+    digest = hashlib.sha256()
+    with open(video_path, 'rb') as f:
+        while True:
+            chunk = f.read(hash_chunk_size)
+            if not chunk:
+                break
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+
+def pose_landmarks_to_array(pose_landmarks):
+    return np.array(
+        [[lm.x, lm.y, lm.z, lm.visibility] for lm in pose_landmarks.landmark],
+        dtype=np.float32
+    )
+
+
+def array_to_pose_landmarks(landmarks):
+    return landmark_pb2.NormalizedLandmarkList(landmark=[
+        landmark_pb2.NormalizedLandmark(x=x, y=y, z=z, visibility=visibility)
+        for x, y, z, visibility in landmarks.tolist()
+    ])
+
+
+class LandmarkCache():
+    """ Disk cache of the landmark tracks of whole videos, so that re-analysing a video doesn't run pose estimation again.
+
+    Tracks are keyed on the video's contents and the detector's parameters. Each is stored in its own directory as
+    .npy files: the (T, 33, 4) float32 landmarks, which load() memory-maps, the (T,) frame timestamps in seconds and
+    a (T,) mask of the frames where a pose was detected. Once the cache grows past max_size bytes, the least recently
+    used tracks are evicted. """
+    def __init__(self, cache_dir=default_cache_dir, max_size=default_max_size):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def get_key(self, video_hash, detector_params):
+        key_data = json.dumps({'video': video_hash, **detector_params}, sort_keys=True)
+        return hashlib.sha256(key_data.encode()).hexdigest()[:32]
+
+    def load(self, key):
+        """ Returns (landmarks, timestamps, detected) for key, or None if it isn't cached. """
+        entry_dir = os.path.join(self.cache_dir, key)
+        try:
+            track = (
+                np.load(os.path.join(entry_dir, 'landmarks.npy'), mmap_mode='r'),
+                np.load(os.path.join(entry_dir, 'timestamps.npy')),
+                np.load(os.path.join(entry_dir, 'detected.npy'))
+            )
+            # Mark as recently used
+            os.utime(entry_dir)
+        except FileNotFoundError:
+            return None
+
+        return track
+
+    def store(self, key, landmarks, timestamps, detected):
+        # Write to a hidden directory and rename it into place so readers never see a partial entry
+        temp_dir = tempfile.mkdtemp(prefix='.', dir=self.cache_dir)
+        np.save(os.path.join(temp_dir, 'landmarks.npy'), np.asarray(landmarks, dtype=np.float32))
+        np.save(os.path.join(temp_dir, 'timestamps.npy'), np.asarray(timestamps, dtype=np.float64))
+        np.save(os.path.join(temp_dir, 'detected.npy'), np.asarray(detected, dtype=bool))
+        try:
+            os.replace(temp_dir, os.path.join(self.cache_dir, key))
+        except OSError:
+            # Already stored by someone else
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+        self.evict()
+
+    def evict(self):
+        """ Removes the least recently used tracks until the cache is no larger than max_size. """
+        entries = []
+        for key in os.listdir(self.cache_dir):
+            entry_dir = os.path.join(self.cache_dir, key)
+            if key.startswith('.') or not os.path.isdir(entry_dir):
+                continue
+            try:
+                size = sum(entry.stat().st_size for entry in os.scandir(entry_dir))
+                entries.append((os.path.getmtime(entry_dir), size, entry_dir))
+            except FileNotFoundError:
+                pass
+
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, entry_dir in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            total_size -= size
+
+
+class CachedDetector():
+    """ Stands in for a MediaPipeDetector while processing the video at video_path from its first frame.
+
+    If the video's landmarks are cached, make_prediction() replays them frame by frame instead of running the
+    detector. Otherwise it runs the detector and records its predictions, which finish() stores once every frame
+    of the video has been passed through. If cap is given, frame timestamps are taken from it.
+    The cache key covers the detector's params and params, anything else that affects its predictions, such as the
+    params of the FramePreprocessor preparing its images and of the FrameStride choosing which frames it sees. """
+    def __init__(self, detector, video_path, cache=None, cap=None, params=None):
+        self.detector = detector
+        self.cache = LandmarkCache() if cache is None else cache
+        self.cap = cap
+        self.key = self.cache.get_key(hash_video(video_path), {**detector.params, **({} if params is None else params)})
+        self.cached_track = self.cache.load(self.key)
+        self.frame_index = 0
+        self.landmarks = []
+        self.timestamps = []
+        self.detected = []
+
+    @property
+    def is_cached(self):
+        return self.cached_track is not None
+
+    def make_prediction(self, image):
+        frame_index = self.frame_index
+        self.frame_index += 1
+
+        if self.is_cached:
+            landmarks, _, detected = self.cached_track
+            if frame_index >= len(detected) or not detected[frame_index]:
+                return None
+            return array_to_pose_landmarks(landmarks[frame_index])
+
+        pose_landmarks = self.detector.make_prediction(image)
+        self.timestamps.append(np.nan if self.cap is None else self.cap.get(cv2.CAP_PROP_POS_MSEC) / 1000)
+        self.detected.append(pose_landmarks is not None)
+        if pose_landmarks is None:
+            self.landmarks.append(np.zeros((NUM_LANDMARKS, 4), dtype=np.float32))
+        else:
+            self.landmarks.append(pose_landmarks_to_array(pose_landmarks))
+
+        return pose_landmarks
+
+    def finish(self):
+        if not self.is_cached and self.landmarks:
+            self.cache.store(self.key, np.stack(self.landmarks), self.timestamps, self.detected)
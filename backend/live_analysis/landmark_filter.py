@@ -0,0 +1,148 @@
+import math
+
+import numpy as np
+from landmark_frame import NUM_LANDMARKS, VISIBILITY
+
+
+ONE_EURO = 'one_euro'
+KALMAN = 'kalman'
+
+
+class LandmarkFilter():
+    """ Smooths the jitter out of (33, 4) landmark arrays over time, filtering every landmark's x, y and z at once.
+
+    ONE_EURO is a One Euro filter: a low-pass filter whose cutoff rises from min_cutoff (Hz) by beta per unit/second of
+    the landmark's speed, so that a still lifter is steadied without lagging behind a moving one. KALMAN is a constant
+    velocity Kalman filter, with process_noise the variance of the landmarks' acceleration and measurement_noise that
+    of MediaPipe's positions, scaled up as a landmark's visibility drops so that unsure landmarks are trusted less.
+    Visibility itself is passed through.
+
+    The filter's state lives in arrays allocated up front and filter() writes into the same output array each call,
+    so copy anything that needs to outlive the next call. Call reset() between sessions or videos. State is also
+    reset if no landmarks are filtered for reset_after seconds, as the lifter will have moved since. """
+    def __init__(
+        self,
+        method=ONE_EURO,
+        min_cutoff=1.0,
+        beta=10.0,
+        derivative_cutoff=1.0,
+        process_noise=3.0,
+        measurement_noise=4e-5,
+        reset_after=0.5
+    ):
+        if method not in (ONE_EURO, KALMAN):
+            raise ValueError(f'Unknown landmark filter {method!r}')
+
+        # Everything that affects the landmarks, e.g. for keying cached landmarks
+        if method == ONE_EURO:
+            self.params = {
+                'landmark_filter': method,
+                'min_cutoff': min_cutoff,
+                'beta': beta,
+                'derivative_cutoff': derivative_cutoff,
+            }
+        else:
+            self.params = {
+                'landmark_filter': method,
+                'process_noise': process_noise,
+                'measurement_noise': measurement_noise,
+            }
+        self.params['reset_after'] = reset_after
+        self.method = method
+        self.min_cutoff = min_cutoff
+        self.beta = beta
+        self.derivative_cutoff = derivative_cutoff
+        self.process_noise = process_noise
+        self.measurement_noise = measurement_noise
+        self.reset_after = reset_after
+
+        shape = (NUM_LANDMARKS, VISIBILITY)
+        self.position = np.zeros(shape, dtype=np.float32)
+        self.velocity = np.zeros(shape, dtype=np.float32)
+        # Kalman covariance of each coordinate's (position, velocity), which is symmetric
+        self.position_variance = np.zeros(shape, dtype=np.float32)
+        self.covariance = np.zeros(shape, dtype=np.float32)
+        self.velocity_variance = np.zeros(shape, dtype=np.float32)
+        self.scratch = np.zeros(shape, dtype=np.float32)
+        self.gain = np.zeros(shape, dtype=np.float32)
+        self.filtered = np.zeros((NUM_LANDMARKS, 4), dtype=np.float32)
+        self.last_time = None
+
+    def reset(self):
+        self.last_time = None
+
+    def filter(self, landmarks, timestamp):
+        """ Returns the filtered (33, 4) copy of landmarks, from a frame at timestamp seconds. """
+        positions = landmarks[:, :VISIBILITY]
+        dt = None if self.last_time is None else timestamp - self.last_time
+        if dt is not None and dt > self.reset_after:
+            dt = None
+        if dt is not None and dt <= 0:
+            # Repeated or out of order timestamps; assume a typical frame gap
+            dt = 1 / 30
+        self.last_time = timestamp
+
+        if dt is None:
+            self.position[:] = positions
+            self.velocity[:] = 0
+            self.position_variance[:] = self.measurement_noise
+            self.covariance[:] = 0
+            self.velocity_variance[:] = 1  # Unknown, up to about a frame width per second
+        elif self.method == ONE_EURO:
+            self.__one_euro(positions, dt)
+        else:
+            self.__kalman(positions, landmarks[:, VISIBILITY], dt)
+
+        self.filtered[:, :VISIBILITY] = self.position
+        self.filtered[:, VISIBILITY] = landmarks[:, VISIBILITY]
+        return self.filtered
+
+    def filter_track(self, landmarks, detected, timestamps):
+        """ Filters a (num_frames, 33, 4) landmark track in place, frame by frame, skipping frames not detected. """
+        self.reset()
+        for i in np.flatnonzero(detected):
+            landmarks[i] = self.filter(landmarks[i], timestamps[i])
+
+        return landmarks
+
+    def __one_euro(self, positions, dt):
+        # Low-pass the speed, then the positions with a cutoff that rises with it
+        derivative_alpha = 1 / (1 + 1 / (2 * math.pi * self.derivative_cutoff * dt))
+        np.subtract(positions, self.position, out=self.scratch)
+        self.scratch /= dt
+        self.scratch -= self.velocity
+        self.scratch *= derivative_alpha
+        self.velocity += self.scratch
+
+        # alpha = 1 / (1 + tau / dt) with tau = 1 / (2 pi cutoff)
+        np.abs(self.velocity, out=self.gain)
+        self.gain *= self.beta
+        self.gain += self.min_cutoff
+        self.gain *= 2 * math.pi * dt
+        np.divide(self.gain, self.gain + 1, out=self.gain)
+
+        np.subtract(positions, self.position, out=self.scratch)
+        self.scratch *= self.gain
+        self.position += self.scratch
+
+    def __kalman(self, positions, visibility, dt):
+        # Predict, with the acceleration's variance spread over position and velocity
+        q = self.process_noise
+        self.position += self.velocity * dt
+        self.position_variance += dt * (2 * self.covariance + dt * self.velocity_variance) + q * dt ** 4 / 4
+        self.covariance += dt * self.velocity_variance + q * dt ** 3 / 2
+        self.velocity_variance += q * dt ** 2
+
+        # Update, trusting less visible landmarks less
+        np.clip(visibility, 0.05, 1, out=self.gain[:, 0])
+        np.divide(self.measurement_noise, self.gain[:, :1], out=self.scratch)
+        self.scratch += self.position_variance
+        innovation = positions - self.position
+        position_gain = self.position_variance / self.scratch
+        velocity_gain = self.covariance / self.scratch
+
+        self.position += position_gain * innovation
+        self.velocity += velocity_gain * innovation
+        self.velocity_variance -= velocity_gain * self.covariance
+        self.covariance *= 1 - position_gain
+        self.position_variance *= 1 - position_gain
@@ -0,0 +1,73 @@
+import numpy as np
+
+
+# Column indices into a landmark row
+X, Y, Z, VISIBILITY = 0, 1, 2, 3
+
+LANDMARK_NAMES = {
+    'nose': 0,
+    'left_eye_inner': 1,
+    'left_eye': 2,
+    'left_eye_outer': 3,
+    'right_eye_inner': 4,
+    'right_eye': 5,
+    'right_eye_outer': 6,
+    'left_ear': 7,
+    'right_ear': 8,
+    'mouth_left': 9,
+    'mouth_right': 10,
+    'left_shoulder': 11,
+    'right_shoulder': 12,
+    'left_elbow': 13,
+    'right_elbow': 14,
+    'left_wrist': 15,
+    'right_wrist': 16,
+    'left_pinky': 17,
+    'right_pinky': 18,
+    'left_index': 19,
+    'right_index': 20,
+    'left_thumb': 21,
+    'right_thumb': 22,
+    'left_hip': 23,
+    'right_hip': 24,
+    'left_knee': 25,
+    'right_knee': 26,
+    'left_ankle': 27,
+    'right_ankle': 28,
+    'left_heel': 29,
+    'right_heel': 30,
+    'left_foot_index': 31,
+    'right_foot_index': 32
+}
+NUM_LANDMARKS = len(LANDMARK_NAMES)
+
+# Landmark indices used directly by the form rules
+NOSE = LANDMARK_NAMES['nose']
+LEFT_SHOULDER, RIGHT_SHOULDER = LANDMARK_NAMES['left_shoulder'], LANDMARK_NAMES['right_shoulder']
+LEFT_ELBOW, RIGHT_ELBOW = LANDMARK_NAMES['left_elbow'], LANDMARK_NAMES['right_elbow']
+LEFT_HIP, RIGHT_HIP = LANDMARK_NAMES['left_hip'], LANDMARK_NAMES['right_hip']
+LEFT_KNEE, RIGHT_KNEE = LANDMARK_NAMES['left_knee'], LANDMARK_NAMES['right_knee']
+LEFT_ANKLE, RIGHT_ANKLE = LANDMARK_NAMES['left_ankle'], LANDMARK_NAMES['right_ankle']
+LEFT_FOOT_INDEX, RIGHT_FOOT_INDEX = LANDMARK_NAMES['left_foot_index'], LANDMARK_NAMES['right_foot_index']
+
+# Main joint groups, ordered the same for both sides so a position in the group means the same joint
+MAIN_JOINTS = ['foot_index', 'ankle', 'knee', 'hip', 'shoulder', 'elbow']
+FOOT_INDEX, ANKLE, KNEE, HIP, SHOULDER, ELBOW = range(len(MAIN_JOINTS))
+LEFT_MAIN_JOINTS = np.array([LANDMARK_NAMES['left_' + joint] for joint in MAIN_JOINTS], dtype=np.intp)
+RIGHT_MAIN_JOINTS = np.array([LANDMARK_NAMES['right_' + joint] for joint in MAIN_JOINTS], dtype=np.intp)
+MAIN_JOINT_INDICES = {'left_': LEFT_MAIN_JOINTS, 'right_': RIGHT_MAIN_JOINTS}
+
+
+class LandmarkFrame():
+    """ A single frame of MediaPipe pose landmarks held as one contiguous (33, 4) float32 array of
+    x, y, z and visibility. The buffer is allocated once and refilled in place for every frame. """
+    def __init__(self):
+        self.landmarks = np.zeros((NUM_LANDMARKS, 4), dtype=np.float32)
+
+    def fill(self, pose_landmarks):
+        self.landmarks[:] = [
+            (landmark.x, landmark.y, landmark.z, landmark.visibility)
+            for landmark in pose_landmarks.landmark
+        ]
+        return self
+
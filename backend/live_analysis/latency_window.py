@@ -0,0 +1,48 @@
+from collections import deque
+from threading import Lock
+
+import numpy as np
+from metrics import LATENCY_BUCKETS
+
+
+class LatencyWindow():
+    """ Rolling window of the latest frame latencies (in seconds) of a live session.
+
+    Keeps the time each of the last size frames took from being ingested to its feedback being emitted, along with
+    how long inference took, and summarises them as percentiles and a histogram over LATENCY_BUCKETS. """
+    def __init__(self, size=600):
+        self.feedback_latencies = deque(maxlen=size)
+        self.inference_latencies = deque(maxlen=size)
+        self.lock = Lock()
+
+    def add(self, frame_timing):
+        with self.lock:
+            self.feedback_latencies.append(frame_timing['emitted_at'] - frame_timing['ingested_at'])
+            self.inference_latencies.append(frame_timing['inferred_at'] - frame_timing['ingested_at'])
+
+    def get_summary(self):
+        with self.lock:
+            feedback_latencies = np.array(self.feedback_latencies)
+            inference_latencies = np.array(self.inference_latencies)
+
+        return {
+            'frames': len(feedback_latencies),
+            'ingest_to_feedback': self.__summarise(feedback_latencies),
+            'ingest_to_inference': self.__summarise(inference_latencies),
+        }
+
+    def __summarise(self, latencies):
+        if len(latencies) == 0:
+            return None
+
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+        counts = np.bincount(np.searchsorted(LATENCY_BUCKETS, latencies), minlength=len(LATENCY_BUCKETS) + 1)
+        return {
+            'mean': float(latencies.mean()),
+            'p50': float(p50),
+            'p95': float(p95),
+            'p99': float(p99),
+            'max': float(latencies.max()),
+            # Cumulative counts of latencies at or below each bucket, as in a Prometheus histogram
+            'buckets': dict(zip([str(bucket) for bucket in LATENCY_BUCKETS] + ['+Inf'], np.cumsum(counts).tolist())),
+        }
@@ -0,0 +1,343 @@
+import asyncio
+import json
+import os
+import re
+import traceback
+from concurrent import futures
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock, Thread
+
+import squat_analyser as sa
+from feedback_accumulator import FeedbackAccumulator, get_feedback_key
+from feedback_stream import FeedbackStream
+from complexity_governor import ComplexityGovernor
+from frame_capture import LatestFrameCapture
+from frame_stride import FrameStride
+from landmark_filter import LandmarkFilter
+from latency_window import LatencyWindow
+from stream_decoder import StreamDecoder
+
+
+# Stream keys go into the RTMP URL, file names and metric labels, so are kept to these characters
+STREAM_KEY_PATTERN = re.compile(r'[A-Za-z0-9_-]{1,64}')
+
+NORMAL = '\u001b[0m'
+YELLOW_BG = '\u001b[43m'
+
+
+class LiveSession():
+    """ Live form analysis for a single RTMP publisher (one stream key).
+
+    Each session owns a StreamDecoder for its RTMP stream, a SquatFormAnalyser and the feedback waiting to be collected.
+    Its lifecycle is a coroutine on the SessionManager's event loop that awaits ffmpeg, the publisher connecting and
+    each frame arriving, and hands frames to the analyser on a thread of the session's own, so that nothing waits by
+    polling. The session finishes once the final summary of the set has been collected (or final_summary_timeout
+    seconds have passed without it being collected), the stream ends or stop() is called, after which
+    on_finished(session) is called on the event loop.
+    If given, metrics (e.g. a PipelineMetrics) records the analyser's stage latencies, frame counts and model
+    complexity switches.
+    Each frame's latency is kept in latency_window and, if latency_log_path is given, appended to that file as JSON lines.
+    If inference_latency_budget (seconds) is given, a ComplexityGovernor switches between model_complexities to keep
+    inference within it. Pose inference runs on every frame_stride-th frame (every frame during reps if
+    adaptive_frame_stride), with the landmarks of the frames in between extrapolated. If given, landmark_filter
+    ('one_euro' or 'kalman') smooths the landmarks over time. The stream is decoded at stream_fps. """
+    def __init__(
+        self,
+        stream_key,
+        ip,
+        rtmp_port,
+        loop,
+        show_stream=False,
+        show_feedback=True,
+        on_finished=None,
+        metrics=None,
+        latency_log_path=None,
+        inference_latency_budget=None,
+        model_complexities=(0, 1),
+        frame_stride=1,
+        adaptive_frame_stride=False,
+        landmark_filter=None,
+        stream_fps=10,
+        final_summary_timeout=None
+    ):
+        self.stream_key = stream_key
+        self.rtmp_port = rtmp_port
+        self.video_stream_input = f'rtmp://{ip}:{rtmp_port}/form_analyser/{stream_key}'
+        self.loop = loop
+        self.show_stream = show_stream
+        self.show_feedback = show_feedback
+        self.on_finished = on_finished
+        self.latency_log_path = latency_log_path
+        self.final_summary_timeout = final_summary_timeout
+
+        self.form_analyser = sa.SquatFormAnalyser(
+            use_advanced_criteria=True,
+            stage_timer=metrics,
+            pose_detector=None if inference_latency_budget is None else ComplexityGovernor(
+                inference_latency_budget,
+                model_complexities=model_complexities,
+                metrics=metrics
+            ),
+            frame_stride=FrameStride(frame_stride, adaptive=adaptive_frame_stride),
+            landmark_filter=None if landmark_filter is None else LandmarkFilter(landmark_filter)
+        )
+        self.current_f = FeedbackAccumulator()
+        self.feedback_stream = FeedbackStream()
+        self.latency_window = LatencyWindow()
+        self.previous_f = []
+        self.final_feedback_waiting = False
+        # Only touched on the event loop, see stop() and get_feedback()
+        self.final_feedback_collected = asyncio.Event()
+        self.stopped = asyncio.Event()
+
+        self.stream_decoder = StreamDecoder(self.video_stream_input, fps=stream_fps)
+        # MediaPipe's graph and the output window stay on the one thread
+        self.analysis_thread = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f'session-{stream_key}')
+        self.finished = None
+
+    def start(self):
+        """ Starts the session on its event loop, from any thread. """
+        self.finished = asyncio.run_coroutine_threadsafe(self.__run(), self.loop)
+        self.finished.add_done_callback(self.__report_failure)
+
+    def stop(self):
+        """ Stops the session, from any thread. """
+        self.__call_on_loop(self.__stop)
+
+    def join(self, timeout=None):
+        """ Waits up to timeout seconds for the session to finish, returning whether it has. """
+        return self.finished is None or not futures.wait([self.finished], timeout).not_done
+
+    def get_feedback(self):
+        """ Returns the feedback gathered since the last call and clears it. """
+        # The final summary is stored before the flag is set, so if the flag is seen the drain includes it
+        final_feedback_waiting = self.final_feedback_waiting
+        feedback = self.current_f.drain()
+        if final_feedback_waiting:
+            self.final_feedback_waiting = False
+            self.__call_on_loop(self.final_feedback_collected.set)
+
+        return feedback
+
+    def acknowledge_final_feedback(self):
+        """ Lets the session finish once the final summary has been delivered some other way than get_feedback(),
+        e.g. over the feedback stream. """
+        self.__call_on_loop(self.final_feedback_collected.set)
+
+    def __call_on_loop(self, callback):
+        if not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(callback)
+
+    def __stop(self):
+        self.stopped.set()
+        self.final_feedback_collected.set()
+        # Ending the stream ends any wait for the publisher or the next frame
+        self.stream_decoder.stop()
+
+    async def __run(self):
+        capture = None
+        receiving = None
+        latency_log = None if self.latency_log_path is None else open(self.latency_log_path, 'a')
+        try:
+            if self.stopped.is_set():
+                return
+            await self.stream_decoder.start()
+            # Until the client connects and its stream has been opened, or the session is stopped
+            if not await self.stream_decoder.wait_until_ready():
+                return
+            capture = LatestFrameCapture(self.stream_decoder)
+            receiving = asyncio.ensure_future(capture.receive())
+            print(f'Stream started for session {self.stream_key}!')
+
+            while not self.stopped.is_set():
+                # Process the freshest frame, waiting for one to arrive if need be
+                immediate_f, success = await self.loop.run_in_executor(
+                    self.analysis_thread,
+                    self.form_analyser.analyse,
+                    capture,
+                    self.show_stream
+                )
+                if not success:
+                    break
+
+                self.latency_window.add(self.form_analyser.frame_timing)
+                if latency_log is not None:
+                    latency_log.write(json.dumps({'session': self.stream_key, **self.form_analyser.frame_timing}) + '\n')
+
+                # Push feedback that is new since the last frame to anyone following the stream
+                previous_keys = [get_feedback_key(f) for f in self.previous_f]
+                self.feedback_stream.publish([f for f in immediate_f if get_feedback_key(f) not in previous_keys])
+
+                if self.show_feedback:
+                    self.__log_feedback(immediate_f)
+                self.previous_f = immediate_f
+
+                # Add any new feedback to current_f
+                if len(immediate_f) > 0:
+                    if immediate_f[0]['tag'] != 'SET_ENDED':
+                        self.current_f.add(immediate_f)
+                    else:
+                        self.current_f.replace(immediate_f)
+                        self.final_feedback_waiting = True
+                        break
+
+            # Hold on to the final summary until the client has collected it, or gives up on it
+            if self.final_feedback_waiting:
+                try:
+                    await asyncio.wait_for(self.final_feedback_collected.wait(), self.final_summary_timeout)
+                except asyncio.TimeoutError:
+                    print(f'Final summary of session {self.stream_key} was not collected in time.')
+        finally:
+            if capture is not None:
+                capture.release()
+            if receiving is not None:
+                self.stream_decoder.stop()
+                await receiving
+            await self.stream_decoder.release()
+            await self.loop.run_in_executor(self.analysis_thread, self.form_analyser.close)
+            self.analysis_thread.shutdown(wait=False)
+            if latency_log is not None:
+                latency_log.close()
+            self.feedback_stream.close()
+            frames_dropped = 0 if capture is None else capture.frames_dropped
+            print(f'Session {self.stream_key} successfully shutdown! {frames_dropped} stale frames were dropped.')
+
+            if self.on_finished is not None:
+                self.on_finished(self)
+
+    def __report_failure(self, finished):
+        if not finished.cancelled() and finished.exception() is not None:
+            print(f'Session {self.stream_key} failed:')
+            traceback.print_exception(finished.exception())
+
+    def __log_feedback(self, immediate_f):
+        if not immediate_f or [get_feedback_key(f) for f in immediate_f] == [get_feedback_key(f) for f in self.previous_f]:
+            return
+
+        for f in immediate_f:
+            if f['tag'] in ['FEEDBACK']:
+                print(f'[{self.stream_key}] {f["tag"]}: {f["message"]}')
+            elif f['tag'] == 'REP_DETECTED':
+                print(f'[{self.stream_key}] Rep detected')
+            elif f['tag'] == 'SET_ENDED':
+                print(f'{YELLOW_BG} [{self.stream_key}] Final Summary: {f["summary"]} {NORMAL}')
+            else:
+                print(f'{YELLOW_BG} [{self.stream_key}] {f["tag"]}: {f["message"]} {NORMAL}')
+
+
+class SessionManager():
+    """ Creates, looks up and tears down LiveSessions, handing each one an RTMP port from a fixed pool.
+    Every session runs on the manager's event loop, which runs on its own thread until shutdown(). """
+    def __init__(
+        self,
+        ip,
+        rtmp_ports,
+        show_stream=False,
+        show_feedback=True,
+        on_session_finished=None,
+        metrics=None,
+        latency_log_dir=None,
+        inference_latency_budget=None,
+        model_complexities=(0, 1),
+        frame_stride=1,
+        adaptive_frame_stride=False,
+        landmark_filter=None,
+        stream_fps=10,
+        final_summary_timeout=None
+    ):
+        self.ip = ip
+        self.metrics = metrics
+        self.latency_log_dir = latency_log_dir
+        self.inference_latency_budget = inference_latency_budget
+        self.model_complexities = model_complexities
+        self.frame_stride = frame_stride
+        self.adaptive_frame_stride = adaptive_frame_stride
+        self.landmark_filter = landmark_filter
+        self.stream_fps = stream_fps
+        self.final_summary_timeout = final_summary_timeout
+        self.free_rtmp_ports = list(rtmp_ports)
+        self.show_stream = show_stream
+        self.show_feedback = show_feedback
+        self.on_session_finished = on_session_finished
+        self.sessions = {}
+        self.lock = Lock()
+        self.loop = asyncio.new_event_loop()
+        self.loop_thread = Thread(target=self.loop.run_forever, daemon=True)
+        self.loop_thread.start()
+
+    def create_session(self, stream_key):
+        """ Starts a new session for stream_key. Raises ValueError if stream_key is not 1 to 64 letters, digits,
+        underscores or hyphens, KeyError if it is already in use and RuntimeError if there are no RTMP ports left. """
+        if not isinstance(stream_key, str) or STREAM_KEY_PATTERN.fullmatch(stream_key) is None:
+            raise ValueError(f'Invalid stream key {stream_key!r}')
+
+        with self.lock:
+            if stream_key in self.sessions:
+                raise KeyError(stream_key)
+            if not self.free_rtmp_ports:
+                raise RuntimeError('No RTMP ports available')
+
+            session = LiveSession(
+                stream_key,
+                self.ip,
+                self.free_rtmp_ports.pop(0),
+                self.loop,
+                show_stream=self.show_stream,
+                show_feedback=self.show_feedback,
+                on_finished=self.__session_finished,
+                metrics=self.metrics,
+                latency_log_path=None if self.latency_log_dir is None else os.path.join(self.latency_log_dir, f'{stream_key}.jsonl'),
+                inference_latency_budget=self.inference_latency_budget,
+                model_complexities=self.model_complexities,
+                frame_stride=self.frame_stride,
+                adaptive_frame_stride=self.adaptive_frame_stride,
+                landmark_filter=self.landmark_filter,
+                stream_fps=self.stream_fps,
+                final_summary_timeout=self.final_summary_timeout
+            )
+            self.sessions[stream_key] = session
+
+        session.start()
+        return session
+
+    def get_session(self, stream_key):
+        with self.lock:
+            return self.sessions.get(stream_key)
+
+    def get_stream_keys(self):
+        with self.lock:
+            return list(self.sessions.keys())
+
+    def get_sessions(self):
+        with self.lock:
+            return list(self.sessions.values())
+
+    def remove_session(self, stream_key):
+        """ Stops the session for stream_key, returning False if there is no such session. """
+        session = self.get_session(stream_key)
+        if session is None:
+            return False
+
+        session.stop()
+        return True
+
+    def shutdown(self, timeout=10):
+        """ Stops every session, waiting up to timeout seconds for each to finish, then stops the event loop. """
+        sessions = self.get_sessions()
+        for session in sessions:
+            session.stop()
+        for session in sessions:
+            session.join(timeout)
+
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.loop_thread.join(timeout)
+
+    def __session_finished(self, session):
+        with self.lock:
+            if self.sessions.get(session.stream_key) is session:
+                del self.sessions[session.stream_key]
+            self.free_rtmp_ports.append(session.rtmp_port)
+
+        # e.g. to start another session, whose pose model would otherwise be built on the event loop
+        if self.on_session_finished is not None:
+            self.loop.run_in_executor(None, self.on_session_finished, session)
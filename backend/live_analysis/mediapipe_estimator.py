@@ -9,6 +9,13 @@ class MediaPipeDetector:
         min_detection_confidence=0.5,
         min_tracking_confidence=0.5
         ):
+        # Everything that affects the predicted landmarks, e.g. for keying cached landmarks
+        self.params = {
+            'model_complexity': model_complexity,
+            'smooth_landmarks': smooth_landmarks,
+            'min_detection_confidence': min_detection_confidence,
+            'min_tracking_confidence': min_tracking_confidence
+        }
         self.pose = mp.solutions.pose.Pose(
             static_image_mode=False,
             model_complexity=model_complexity,
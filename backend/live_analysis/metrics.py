@@ -0,0 +1,187 @@
+import bisect
+import time
+from threading import Lock
+
+from stage_timer import STAGES
+
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)  # Seconds
+
+
+def escape_label_value(value):
+    """ Escapes backslashes, double quotes and newlines, as the Prometheus text format requires. """
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{escape_label_value(value)}"' for name, value in labels) + '}'
+
+
+class Counter():
+    def __init__(self):
+        self.value = 0
+        self.lock = Lock()
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+    def render(self, name, labels):
+        return [f'{name}{format_labels(labels)} {self.value}']
+
+
+class Histogram():
+    """ Histogram over fixed buckets. Bucket counts are allocated up front, so observe() allocates nothing. """
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # The last count is for values above every bucket
+        self.sum = 0.0
+        self.lock = Lock()
+
+    def observe(self, value):
+        i = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[i] += 1
+            self.sum += value
+
+    def take_state(self):
+        """ Returns the counts and sum observed so far and resets them, e.g. to send to another process. """
+        with self.lock:
+            state = (self.counts, self.sum)
+            self.counts, self.sum = [0] * len(self.counts), 0.0
+        return state
+
+    def add_state(self, state):
+        counts, total = state
+        with self.lock:
+            for i, count in enumerate(counts):
+                self.counts[i] += count
+            self.sum += total
+
+    def render(self, name, labels):
+        with self.lock:
+            counts, total = list(self.counts), self.sum
+
+        lines = []
+        cumulative_count = 0
+        for bucket, count in zip(self.buckets + ('+Inf',), counts):
+            cumulative_count += count
+            lines.append(f'{name}_bucket{format_labels(labels + (("le", bucket),))} {cumulative_count}')
+        lines.append(f'{name}_sum{format_labels(labels)} {total}')
+        lines.append(f'{name}_count{format_labels(labels)} {cumulative_count}')
+        return lines
+
+
+class CallbackGauge():
+    """ Gauge whose value is read when rendered. function() returns either a value, or a dict of label tuples
+    (e.g. (('session', key),)) to values for a gauge with a series per label set. """
+    def __init__(self, function):
+        self.function = function
+
+    def render(self, name, labels):
+        values = self.function()
+        if not isinstance(values, dict):
+            values = {(): values}
+        return [f'{name}{format_labels(labels + series_labels)} {value}' for series_labels, value in values.items()]
+
+
+class MetricsRegistry():
+    """ Holds the server's metrics and renders them in the Prometheus text exposition format. """
+    def __init__(self, prefix='squat_tracker_'):
+        self.prefix = prefix
+        self.families = {}  # name: [type, help, [(labels, metric)]]
+        self.lock = Lock()
+
+    def counter(self, name, help_text, labels=()):
+        return self.__register(name, 'counter', help_text, labels, Counter())
+
+    def histogram(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        return self.__register(name, 'histogram', help_text, labels, Histogram(buckets))
+
+    def gauge(self, name, help_text, function, labels=()):
+        return self.__register(name, 'gauge', help_text, labels, CallbackGauge(function))
+
+    def render(self):
+        with self.lock:
+            families = [(name, family[0], family[1], list(family[2])) for name, family in self.families.items()]
+
+        lines = []
+        for name, metric_type, help_text, series in families:
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {metric_type}')
+            for labels, metric in series:
+                lines.extend(metric.render(name, labels))
+
+        return '\n'.join(lines) + '\n'
+
+    def __register(self, name, metric_type, help_text, labels, metric):
+        name = self.prefix + name
+        with self.lock:
+            family = self.families.setdefault(name, [metric_type, help_text, []])
+            family[2].append((tuple(labels), metric))
+        return metric
+
+
+class PipelineMetrics():
+    """ Stage latency histograms and frame counters for the analysis pipeline.
+
+    Has the same interface as StageTimer, so it can be given to a SquatFormAnalyser as its stage_timer and left
+    on in production: recording a frame updates preallocated counters and histograms without keeping samples. """
+    def __init__(self, registry):
+        self.stage_latency = {
+            stage: registry.histogram(
+                'stage_latency_seconds',
+                'Time each frame spends in each stage of the analysis pipeline',
+                labels=(('stage', stage),)
+            )
+            for stage in STAGES
+        }
+        self.frames_processed = registry.counter('frames_processed_total', 'Frames analysed')
+        self.frames_dropped = registry.counter('frames_dropped_total', 'Stale frames dropped before analysis')
+        self.frames_not_detected = registry.counter('frames_not_detected_total', 'Frames analysed where the user was not detected')
+        self.complexity_switches = registry.counter(
+            'model_complexity_switches_total',
+            'Pose model complexity switches made to keep inference within its latency budget'
+        )
+
+    def record(self, stage, seconds):
+        self.stage_latency[stage].observe(seconds)
+
+    def record_since(self, stage, start):
+        end = time.perf_counter()
+        self.stage_latency[stage].observe(end - start)
+        return end
+
+    def record_frame(self, not_detected, frames_dropped=0):
+        self.frames_processed.inc()
+        if frames_dropped:
+            self.frames_dropped.inc(frames_dropped)
+        if not_detected:
+            self.frames_not_detected.inc()
+
+    def record_complexity_switch(self):
+        self.complexity_switches.inc()
+
+    def take_state(self):
+        """ Returns everything recorded since the last call, so metrics recorded in another process can be added
+        to this process's with add_state(). """
+        return {
+            'stage_latency': {stage: histogram.take_state() for stage, histogram in self.stage_latency.items()},
+            'counters': {
+                name: self.__take_counter(getattr(self, name))
+                for name in ['frames_processed', 'frames_dropped', 'frames_not_detected', 'complexity_switches']
+            }
+        }
+
+    def add_state(self, state):
+        for stage, histogram_state in state['stage_latency'].items():
+            self.stage_latency[stage].add_state(histogram_state)
+        for name, value in state['counters'].items():
+            getattr(self, name).inc(value)
+
+    def __take_counter(self, counter):
+        with counter.lock:
+            value, counter.value = counter.value, 0
+        return value
@@ -1,48 +1,75 @@
+import json
 import logging
 import socket
-import subprocess
-import time
-from threading import Thread
+import uuid
 
-import cv2
-import pandas as pd
-import squat_analyser as sa
-from flask import Flask, jsonify
+from flask import Flask, Response, jsonify, request
+from live_session import SessionManager
+from metrics import MetricsRegistry, PipelineMetrics
 
 
-NORMAL = '\u001b[0m'
-YELLOW_BG = '\u001b[43m'
-
-# Declare constants for rtmp stream
+# Declare constants for rtmp streams
 ip = socket.gethostbyname(socket.gethostname())
-cap = cv2.VideoCapture()
-video_stream_input = f'rtmp://{ip}:1935/form_analyser/22022001'
-local_rtmp_endpoint = 'rtmp://localhost/live'
-ffmpeg_args = [
-    'ffmpeg',
-    '-fflags', 'nobuffer',
-    '-flags', 'low_delay',
-    '-an',  # Ignore audio
-    '-f', 'flv',
-    '-listen', '1',
-    '-i', video_stream_input,
-    '-copyts',
-    '-fps_mode', 'cfr',  # Ensure that video frames are synchronized
-    '-r', '10',  # Set the output frame rate to 10 FPS
-    '-c:v', 'libx264',
-    '-preset', 'ultrafast',
-    '-tune', 'zerolatency',
-    '-f', 'flv',
-    '-listen', '1',
-    local_rtmp_endpoint
-]
-
-
-# Declare constants and variables for feedback
-form_analyser = sa.SquatFormAnalyser(use_advanced_criteria=True)
+rtmp_ports = range(1935, 1945)  # One port per concurrent session
+default_stream_key = '22022001'  # Session served by the original /form-feedback endpoint
+stream_keep_alive_interval = 15  # Seconds between keep-alive comments on idle feedback streams
+latency_log_dir = None  # Directory to record each session's frame latencies to, for scripts_for_diss/latency_graph.py
+stream_fps = 10  # Frame rate sessions decode their stream at
+inference_latency_budget = 0.1  # Seconds per frame (at stream_fps) before sessions step down model complexity, None to disable
+model_complexities = (0, 1)  # Model complexities sessions can switch between
+frame_stride = 1  # Run pose inference on every nth frame, extrapolating landmarks in between
+adaptive_frame_stride = True  # Run pose inference on every frame during reps regardless of frame_stride
+landmark_filter = 'one_euro'  # Smooths landmarks over time, 'one_euro', 'kalman' or None
+final_summary_timeout = 5 * 60  # Seconds a finished set's final summary waits to be collected before the session ends
+
+# Declare constants for feedback
 port = 5000
-current_f = []
-final_feedback_waiting = False
+show_stream = False
+show_feedback = True
+shutting_down = False
+
+
+def on_session_finished(session):
+    # Keep a session listening for the default stream key so existing clients work without creating one
+    if session.stream_key == default_stream_key and not shutting_down:
+        session_manager.create_session(default_stream_key)
+
+
+metrics_registry = MetricsRegistry()
+session_manager = SessionManager(
+    ip,
+    rtmp_ports,
+    show_stream=show_stream,
+    show_feedback=show_feedback,
+    on_session_finished=on_session_finished,
+    metrics=PipelineMetrics(metrics_registry),
+    latency_log_dir=latency_log_dir,
+    inference_latency_budget=inference_latency_budget,
+    model_complexities=model_complexities,
+    frame_stride=frame_stride,
+    adaptive_frame_stride=adaptive_frame_stride,
+    landmark_filter=landmark_filter,
+    stream_fps=stream_fps,
+    final_summary_timeout=final_summary_timeout
+)
+metrics_registry.gauge(
+    'active_sessions',
+    'Live sessions currently listening or streaming',
+    lambda: len(session_manager.get_stream_keys())
+)
+metrics_registry.gauge(
+    'feedback_queue_depth',
+    'Feedback waiting to be collected by each session\'s client',
+    lambda: {(('session', session.stream_key),): len(session.current_f) for session in session_manager.get_sessions()}
+)
+metrics_registry.gauge(
+    'model_complexity',
+    'MediaPipe pose model complexity in use by each session',
+    lambda: {
+        (('session', session.stream_key),): session.form_analyser.pose_detector.params['model_complexity']
+        for session in session_manager.get_sessions()
+    }
+)
 
 
 # Create feedback server
@@ -50,83 +77,103 @@ app = Flask(__name__)
 log = logging.getLogger('werkzeug')
 log.setLevel(logging.ERROR)
 
+@app.route('/sessions', methods=['GET'])
+def get_sessions():
+    return jsonify(session_manager.get_stream_keys())
+
+@app.route('/sessions', methods=['POST'])
+def create_session():
+    body = request.get_json(silent=True) or {}
+    stream_key = str(body.get('stream_key', uuid.uuid4().hex[:8]))
+    try:
+        session = session_manager.create_session(stream_key)
+    except ValueError:
+        return 'stream_key must be 1 to 64 letters, digits, underscores or hyphens', 400
+    except KeyError:
+        return 'Session already exists', 409
+    except RuntimeError:
+        return 'No capacity for another session', 503
+
+    return jsonify({
+        'session': session.stream_key,
+        'rtmp_endpoint': f'rtmp://{ip}:{session.rtmp_port}/form_analyser',
+        'stream_key': session.stream_key,
+    }), 201
+
+@app.route('/sessions/<session>', methods=['DELETE'])
+def delete_session(session):
+    if not session_manager.remove_session(session):
+        return 'Session not found', 404
+    return '', 204
+
+@app.route('/sessions/<session>/latency', methods=['GET'])
+def get_session_latency(session):
+    """ Summarises the latency of the session's most recent frames, from being ingested to inference and to feedback. """
+    live_session = session_manager.get_session(session)
+    if live_session is None:
+        return 'Session not found', 404
+    return jsonify(live_session.latency_window.get_summary())
+
+@app.route('/form-feedback/<session>', methods=['GET'])
+def get_session_form_feedback(session):
+    live_session = session_manager.get_session(session)
+    if live_session is None:
+        return 'Session not found', 404
+    return jsonify(live_session.get_feedback())
+
+@app.route('/form-feedback/<session>/stream', methods=['GET'])
+def stream_session_form_feedback(session):
+    """ Server-Sent Events stream of a session's feedback. Each event's id is its sequence number, so clients
+    resume after reconnecting with the standard Last-Event-ID header or a last_event_id query parameter. """
+    live_session = session_manager.get_session(session)
+    if live_session is None:
+        return 'Session not found', 404
+
+    last_event_id = request.headers.get('Last-Event-ID', request.args.get('last_event_id', 0))
+    try:
+        last_event_id = int(last_event_id)
+    except ValueError:
+        return 'Invalid Last-Event-ID', 400
+
+    def generate_events(last_sequence):
+        closed = False
+        while not closed:
+            events, closed = live_session.feedback_stream.get_events(last_sequence, timeout=stream_keep_alive_interval)
+            if not events:
+                yield ': keep-alive\n\n'
+                continue
+
+            for sequence, f in events:
+                yield f'id: {sequence}\nevent: {f["tag"]}\ndata: {json.dumps(f)}\n\n'
+                if f['tag'] == 'SET_ENDED':
+                    live_session.acknowledge_final_feedback()
+            last_sequence = events[-1][0]
+
+    return Response(
+        generate_events(last_event_id),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
 @app.route('/form-feedback', methods=['GET'])
 def get_form_feedback():
-    global current_f, final_feedback_waiting
-    json_f = jsonify(current_f)
-    current_f = []
-    final_feedback_waiting = False
-    return json_f
-
-def run_flask_app():
-    app.run(host=ip, port=port)
-flask_thread = Thread(target=run_flask_app)
-flask_thread.daemon = True
-flask_thread.start()
-
-
-# Begin re-streaming to a local endpoint
-proc1 = subprocess.Popen(
-    ffmpeg_args,
-    stdout=subprocess.DEVNULL,
-    stderr=subprocess.STDOUT
-)
-time.sleep(3) # Allow server to start before opening rtmp stream
+    return get_session_form_feedback(default_stream_key)
 
-# NOTE: This allows for the script to wait for the client to connect indefinitely, but ffmpeg can be flakey so it is commented out
-# start_string = 'Input #0, flv, from '
-# print('Waiting for client to connect...')
-# while True:
-#     output = proc1.stdout.readline().decode('utf-8').strip()
-#     if start_string in output:
-#         print('Connection request received...')
-#         break
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    return Response(metrics_registry.render(), mimetype='text/plain; version=0.0.4')
 
-cap.open(local_rtmp_endpoint)
-print('Stream started!')
 
-show_stream = False
-show_feedback = True
+if __name__ == '__main__':
+    session_manager.create_session(default_stream_key)
+    print(f'Listening for streams on rtmp://{ip}:{rtmp_ports[0]}/form_analyser/{default_stream_key}')
 
-try:
-    while True:
-        # Process the frame
-        immediate_f, success = form_analyser.analyse(cap, show_output=show_stream)
-        if not success:
-            break
-
-        # Logging
-        if show_feedback and immediate_f not in [[], current_f]:
-            for f in immediate_f:
-                if f['tag'] in ['FEEDBACK']:
-                    print(f'{f["tag"]}: {f["message"]}')
-                elif f['tag'] == 'REP_DETECTED':
-                    print('Rep detected')
-                elif f['tag'] == 'SET_ENDED':
-                    print(f'{YELLOW_BG} Final Summary: {f["summary"]} {NORMAL}')
-                else:
-                    print(f'{YELLOW_BG} {f["tag"]}: {f["message"]} {NORMAL}')
-
-        # Add any new feedback to current_f
-        if len(immediate_f) > 0:
-            if immediate_f[0]['tag'] != 'SET_ENDED':
-                df1 = pd.DataFrame(current_f)
-                df2 = pd.DataFrame(immediate_f)
-                df3 = pd.concat([df1, df2]).drop_duplicates().reset_index(drop=True)
-                current_f = df3.to_dict('records')
-            else:
-                current_f = immediate_f
-                final_feedback_waiting = True
-                break
-
-except KeyboardInterrupt:
-    print('Exiting gracefully...')
-
-while True:
-    if not final_feedback_waiting:
-        cv2.destroyAllWindows()
-        cap.release()
-        proc1.terminate()
+    try:
+        app.run(host=ip, port=port, threaded=True)
+    except KeyboardInterrupt:
+        pass
 
-        print('Server successfully shutdown!')
-        break
+    print('Exiting gracefully...')
+    shutting_down = True
+    session_manager.shutdown()
+    print('Server successfully shutdown!')
@@ -1,9 +1,19 @@
 import time
 
 import cv2
-import mediapipe as mp
+import numpy as np
+from analysis_stream import (NOT_GIVEN, FeedbackEvent, PoseEstimate,
+                             iterate_in_thread, split_item)
+from form_rules import ASCENT, DESCENT, SQUAT_RULES, FormRules
+from frame_stride import FrameStride
+from landmark_frame import (LEFT_HIP, LEFT_SHOULDER, RIGHT_HIP,
+                            RIGHT_SHOULDER, VISIBILITY, LandmarkFrame)
 from mediapipe_estimator import MediaPipeDetector
+from pose_features import SIDE_INDEX, FeatureExtractor
 from squat_form_analyser import MediaPipe_To_Form_Interpreter
+from frame_preprocessor import FramePreprocessor
+from frame_renderer import LANDMARKS, RESIZE, TEXT, FrameRenderer
+from stage_timer import DECODE, INFERENCE, INTERPRETATION, PREPROCESS
 
 
 STANDING = 'STANDING'
@@ -15,15 +25,52 @@ YELLOW_BG = '\u001b[43m'
 RED_BG = '\u001b[41m'
 
 
+def media_clock(cap):
+    """ Returns the timestamp, in seconds, of the frame just read from cap. Captures that decode ahead of the
+    analyser (see frame_capture.LatestFrameCapture) report it as cap.timestamp, otherwise the capture's position
+    in the media is used, which for an RTMP stream is its PTS. """
+    timestamp = getattr(cap, 'timestamp', None)
+    if timestamp is None:
+        timestamp = cap.get(cv2.CAP_PROP_POS_MSEC) / 1000
+    return timestamp
+
+
+def wall_clock(cap):
+    """ Returns the current wall-clock time, ignoring cap, for captures that don't have usable timestamps. """
+    return time.time()
+
+
 class SquatFormAnalyser():
-    def __init__(self, use_advanced_criteria=False):
-        self.pose_detector = MediaPipeDetector()
+    def __init__(
+        self,
+        use_advanced_criteria=False,
+        clock=media_clock,
+        stage_timer=None,
+        pose_detector=None,
+        preprocessor=None,
+        frame_stride=None,
+        landmark_filter=None
+    ):
+        """ clock(cap) gives the time in seconds of the frame just read from cap and is used for the set start countdown
+        and rep timings. Using the media timestamps means replaying a recording as fast as possible gives the same
+        results as playing it in real-time. If given, stage_timer records how long each frame spends in each stage.
+        pose_detector defaults to a MediaPipeDetector, but anything with the same make_prediction() will do,
+        e.g. a ComplexityGovernor. preprocessor (a FramePreprocessor by default) prepares frames for pose_detector.
+        frame_stride (a FrameStride, by default with a stride of 1) decides which frames pose_detector is run on.
+        If given, landmark_filter (a LandmarkFilter) smooths the detected landmarks over time. """
+        self.clock = clock
+        self.stage_timer = stage_timer
+        self.frame_time = 0
+        self.frame_timing = None
+        self.pose_detector = MediaPipeDetector() if pose_detector is None else pose_detector
+        self.preprocessor = FramePreprocessor() if preprocessor is None else preprocessor
+        self.frame_stride = FrameStride() if frame_stride is None else frame_stride
+        self.landmark_filter = landmark_filter
+        self.landmark_frame = LandmarkFrame()
+        self.frame_index = 0
+        self.renderer = None
         self.form_analyser = MediaPipe_To_Form_Interpreter()
-        self.frame_stack = 2
-        self.frame_skip = 3
-        self.mp_drawing = mp.solutions.drawing_utils
-        self.mp_drawing_styles = mp.solutions.drawing_styles.get_default_pose_landmarks_style()
-        self.mp_pose = mp.solutions.pose
+        self.feature_extractor = FeatureExtractor()
         self.text_colour = (219, 123, 3)
         self.bad_form_colour = (0, 0, 255)
         self.general_thresholds = {
@@ -47,6 +94,7 @@ class SquatFormAnalyser():
             'BOTTOM_knee_angle_range': (0, 26),  # TODO: do this
 
             'safe_hip_angle': 62,  # TODO: do this
+            'collapsed_torso_knee_angle': 35,  # TODO: check this
 
             'hip_vertically_aligned': 0.04,  # TODO: do this
             'shoulder_vertically_aligned': 0.075,  # TODO: do this
@@ -57,11 +105,13 @@ class SquatFormAnalyser():
             'BOTTOM_knee_angle_range': (0, 26),
 
             'safe_hip_angle': 62,
+            'collapsed_torso_knee_angle': 35,  # TODO: check this
 
             'hip_vertically_aligned': 0.04,
             'shoulder_vertically_aligned': 0.075,
         }
         self.form_thresholds = self.form_thresholds_advanced if use_advanced_criteria else self.form_thresholds_beginner
+        self.form_rules = FormRules(SQUAT_RULES, {**self.general_thresholds, **self.form_thresholds})
         self.state_sequence = [STANDING]
         self.set_has_begun = False
         self.most_visible_side = ''
@@ -75,6 +125,7 @@ class SquatFormAnalyser():
         self.no_detection_count_threshold = 30
         self.no_landmarks_count = 0
         self.no_landmarks_count_threshold = 30
+        self.frames_dropped = 0
         self.squat_start_time = 0
         self.squat_mid_time = 0
         self.squat_end_time = 0
@@ -108,19 +159,110 @@ class SquatFormAnalyser():
             'final_comments': '',
         }
         self.current_rep_good = True
+        self.feature_extractor.reset()
+        if self.landmark_filter is not None:
+            self.landmark_filter.reset()
 
     def analyse(self, cap, show_output=True):
+        """ Analyses the next frame read from cap, returning its feedback and whether a frame was read. """
+        stage_start = time.perf_counter()
+
         # Get a frame
         success, frame = cap.read()
+        # Captures that skip stale frames (see frame_capture.LatestFrameCapture) report how many they dropped
+        frames_dropped = getattr(cap, 'frames_dropped', 0)
+        newly_dropped_frames = max(frames_dropped - self.frames_dropped, 0)
+        self.frames_dropped = frames_dropped
         if not success:
             return 'Video Ended', success
+        timestamp = self.clock(cap)
+        # Captures that receive frames ahead of the analyser report when the frame arrived, otherwise it was just now
+        ingest_time = getattr(cap, 'ingest_time', None)
+        if ingest_time is None:
+            ingest_time = time.time()
+        if self.stage_timer is not None:
+            self.stage_timer.record_since(DECODE, stage_start)
+
+        estimate = self.__estimate(timestamp, frame, ingest_time)
+        feedback = self.__interpret(estimate, frames_dropped=newly_dropped_frames)
+        if show_output:
+            self.__render(frame, self.__get_overlay(estimate.landmarks, feedback))
 
-        # Get pose landmarks
-        pose_landmarks = self.pose_detector.make_prediction(frame)
+        return feedback, success
+
+    def analyse_stream(self, frames, show_output=False):
+        """ Lazily analyses a stream of frames, yielding a FeedbackEvent (see analysis_stream) with the feedback of
+        each as soon as it is known. Items of frames are (timestamp, frame), (timestamp, landmarks) for landmarks
+        already estimated, as a (33, 4) array or None if no pose was detected, or (timestamp, frame, landmarks).
+        frames can be any iterable, e.g. read_frames(cap) or frames received over a websocket, or an async iterable,
+        in which case an async generator is returned that analyses them on a thread of its own.
+        The stream is made of the estimate_landmarks(), interpret() and, with show_output, render() stages, which
+        can be composed differently. The analyser's state carries on from frame to frame as with analyse(). """
+        if hasattr(frames, '__aiter__'):
+            return iterate_in_thread(lambda items: self.analyse_stream(items, show_output), frames)
+
+        events = self.interpret(self.estimate_landmarks(frames), draw=show_output)
+        return self.render(events) if show_output else events
+
+    def estimate_landmarks(self, frames):
+        """ Pose estimation stage: yields a PoseEstimate for each stream item (see analyse_stream()) of frames. """
+        for item in frames:
+            ingest_time = time.time()
+            timestamp, frame, landmarks = split_item(item)
+            if landmarks is NOT_GIVEN:
+                yield self.__estimate(timestamp, frame, ingest_time)
+            else:
+                landmarks = None if landmarks is None else np.asarray(landmarks, dtype=np.float32)
+                yield PoseEstimate(timestamp, frame, landmarks, ingest_time, ingest_time)
+
+    def interpret(self, estimates, draw=False):
+        """ Interpretation stage: yields a FeedbackEvent for each PoseEstimate of estimates, with the overlay for
+        drawing it if draw is set. """
+        for index, estimate in enumerate(estimates):
+            feedback = self.__interpret(estimate)
+            overlay = self.__get_overlay(estimate.landmarks, feedback) if draw else None
+            yield FeedbackEvent(index, estimate.timestamp, estimate.frame, estimate.landmarks, feedback, overlay)
+
+    def render(self, events):
+        """ Rendering stage: shows each FeedbackEvent's frame with its overlay, passing the events on. """
+        for event in events:
+            if event.frame is not None and event.overlay is not None:
+                self.__render(event.frame, event.overlay)
+            yield event
+
+    def __estimate(self, timestamp, frame, ingest_time):
+        stage_start = time.perf_counter()
+        if self.frame_stride.is_keyframe(self.frame_index):
+            # Downsize and convert to RGB for pose estimation
+            image = self.preprocessor.prepare(frame)
+            if self.stage_timer is not None:
+                stage_start = self.stage_timer.record_since(PREPROCESS, stage_start)
+
+            # Get pose landmarks, normalised to the whole frame
+            pose_landmarks = self.preprocessor.map_to_frame(self.pose_detector.make_prediction(image))
+            landmarks = None if pose_landmarks is None else self.landmark_frame.fill(pose_landmarks).landmarks
+            if landmarks is not None and self.landmark_filter is not None:
+                landmarks = self.landmark_filter.filter(landmarks, timestamp)
+            # Passed on as the frame stride's own copy, as the buffers above are refilled for the next keyframe
+            landmarks = self.frame_stride.add_keyframe(self.frame_index, landmarks)
+        else:
+            # Interpolating would mean holding feedback back until the next keyframe, so extrapolate from the last two
+            landmarks = self.frame_stride.extrapolate(self.frame_index)
+        self.frame_index += 1
+        if self.stage_timer is not None:
+            self.stage_timer.record_since(INFERENCE, stage_start)
+
+        return PoseEstimate(timestamp, frame, landmarks, ingest_time, time.time())
+
+    def __interpret(self, estimate, frames_dropped=0):
+        """ Steps the set's state on from the estimated landmarks of the next frame, returning its feedback. """
+        stage_start = time.perf_counter()
+        self.frame_time = estimate.timestamp
+        landmarks = estimate.landmarks
 
         feedback = []
 
-        if pose_landmarks is None:
+        if landmarks is None:
             feedback = [{'tag': 'NOT_DETECTED', 'message': 'User not Detected'}]
 
             if self.set_has_begun:
@@ -131,31 +273,25 @@ class SquatFormAnalyser():
                     self.__initialise_state()
                     self.form_analyser.initialise_state()
         else:
-            # Get dictionary of joints for ease of use
-            joints_dict = self.form_analyser.get_joints_dict(pose_landmarks)
+            # Get every feature the form rules need from the (33, 4) array of landmarks
+            features = self.feature_extractor.extract(landmarks)
 
             if self.set_has_begun:
-                most_visible_joints_dict = {
-                    joint_name: joints_dict[self.most_visible_side + joint_name]
-                    for joint_name in self.form_analyser.main_joints
-                }
+                most_visible_joints = self.form_analyser.get_main_joints(landmarks, self.most_visible_side)
 
                 if self.form_analyser.check_confidence(
                     self.form_analyser.min_confidence_threshold,
-                    list(most_visible_joints_dict.values())
+                    most_visible_joints
                 ):
                     self.no_confident_detection_count = 0
 
-                    if self.__check_set_has_ended(most_visible_joints_dict['ankle']):
+                    if self.__check_set_has_ended(features.ankle_displacement[0, SIDE_INDEX[self.most_visible_side]]):
                         feedback = [{'tag': 'SET_ENDED', 'summary': self.__get_final_summary()}]
 
                         self.__initialise_state()
                         self.form_analyser.initialise_state()
                     else:
-                        feedback = self.get_feedback_based_on_joints_dict(
-                            joints_dict,
-                            most_visible_joints_dict
-                        )
+                        feedback = self.get_feedback_based_on_joints_dict(landmarks, features)
 
                         # TODO: test this fixes jittery No Detection not ending set
                         if feedback:
@@ -168,8 +304,8 @@ class SquatFormAnalyser():
                         self.__initialise_state()
                         self.form_analyser.initialise_state()
             else:
-                left_joints = [joints_dict['left_' + j] for j in self.form_analyser.main_joints]
-                right_joints = [joints_dict['right_' + j] for j in self.form_analyser.main_joints]
+                left_joints = self.form_analyser.get_main_joints(landmarks, 'left_')
+                right_joints = self.form_analyser.get_main_joints(landmarks, 'right_')
 
                 if self.form_analyser.check_confidence(
                     self.form_analyser.min_confidence_threshold,
@@ -181,8 +317,7 @@ class SquatFormAnalyser():
                     if self.stationary_start_time is None:
                         time_remaining = self.stationary_duration
                     else:
-                        # TODO: change this to work with frame count, not time as causes flakiness and inaccuracy (only with test script)
-                        time_remaining = round(self.stationary_duration - time.time() + self.stationary_start_time, 2)
+                        time_remaining = round(self.stationary_duration - self.frame_time + self.stationary_start_time, 2)
 
                     feedback = [{'tag': 'SET_START_COUNTDOWN', 'message': str(time_remaining)}]
 
@@ -191,7 +326,7 @@ class SquatFormAnalyser():
                         right_joints,
                         set_begun=False
                     )
-                    if self.__check_set_has_begun(joints_dict, most_visible_side):
+                    if self.__check_set_has_begun(left_joints, right_joints, most_visible_side, features):
                         self.most_visible_side = self.form_analyser.get_most_visible_side(
                             left_joints,
                             right_joints,
@@ -207,41 +342,71 @@ class SquatFormAnalyser():
                     self.stationary_start_time = None
                     self.joint_buffer = []
 
-        # NOTE: this slows down performance
-        if show_output:
-            self.mp_drawing.draw_landmarks(
-                frame,
-                pose_landmarks,
-                self.mp_pose.POSE_CONNECTIONS,
-                landmark_drawing_spec=self.mp_drawing_styles
-            )
-            frame = cv2.resize(frame, (360, 640))
-            for i, f in enumerate(feedback):
-                self.__draw_text(frame, str(f), pos=(0, 35 * i), font_scale=1)
-            cv2.imshow('Live Stream', frame)
-            cv2.waitKey(1)
+        # Run inference on every frame while descending and at the bottom of a rep
+        self.frame_stride.set_fast_phase(self.set_has_begun and self.state_sequence[-1] != STANDING)
 
-        return feedback, success
+        if self.stage_timer is not None:
+            self.stage_timer.record_since(INTERPRETATION, stage_start)
+            self.stage_timer.record_frame(
+                len(feedback) > 0 and feedback[0]['tag'] == 'NOT_DETECTED',
+                frames_dropped=frames_dropped
+            )
 
-    def get_feedback_based_on_joints_dict(self, joints_dict, most_visible_joints_dict):
+        # Carry the frame's timing into its feedback so latency can be traced from ingest to feedback
+        self.frame_timing = {
+            'timestamp': self.frame_time,
+            'ingested_at': estimate.ingested_at,
+            'inferred_at': estimate.inferred_at,
+            'emitted_at': time.time(),
+        }
+        for f in feedback:
+            f['frame'] = self.frame_timing
+
+        return feedback
+
+    def __get_overlay(self, landmarks, feedback):
+        overlay = [] if landmarks is None else [(LANDMARKS, landmarks)]
+        overlay.append((RESIZE, (360, 640)))
+        overlay.extend((TEXT, str(f), (0, 35 * i), False, 1) for i, f in enumerate(feedback))
+        return overlay
+
+    def __render(self, frame, overlay):
+        # Drawn and shown by the renderer's thread, which drops frames rather than hold up analysis
+        if self.renderer is None:
+            self.renderer = FrameRenderer(
+                window_name='Live Stream',
+                queue_size=2,
+                drop_when_full=True,
+                stage_timer=self.stage_timer
+            ).start()
+        self.renderer.submit(frame, overlay)
+
+    def close(self):
+        """ Closes the output window, if it was shown. """
+        if self.renderer is not None:
+            self.renderer.close()
+            self.renderer = None
+
+    def get_feedback_based_on_joints_dict(self, landmarks, features):
         """ Analyses joint positions relative to current state sequence and form criteria to determine immediate feedback for user.
-        Assumes that the confidence of the joints joints_dict is high enough. """
+        landmarks is the (33, 4) landmark array and features the PoseFeatures extracted from it.
+        Assumes that the confidence of the joints is high enough. """
         ###### Determine orientation and angles ######
         orientation = self.form_analyser.get_orientation(
-            joints_dict['left_shoulder'],
-            joints_dict['right_shoulder'],
-            joints_dict['left_hip'],
-            joints_dict['right_hip'],
+            landmarks[LEFT_SHOULDER],
+            landmarks[RIGHT_SHOULDER],
+            landmarks[LEFT_HIP],
+            landmarks[RIGHT_HIP],
             self.general_thresholds['face_on']
         )
-        knee_angle, hip_angle = self.form_analyser.get_main_joint_angles(most_visible_joints_dict)
+        knee_angle, _ = self.form_analyser.get_main_joint_angles(features, self.most_visible_side)
 
 
         ##### Determine state_sequence based on angles #####
         final_feedback = []
         if self.state_sequence[-1] != STANDING and self.form_thresholds['STANDING_knee_angle_range'][0] <= knee_angle <= self.form_thresholds['STANDING_knee_angle_range'][1]:
             if self.state_sequence[-1] == TRANSITION:
-                self.squat_end_time = time.time()
+                self.squat_end_time = self.frame_time
             elif self.state_sequence[-1] == BOTTOM:
                 pass
                 # print(f'{YELLOW_BG} ANALYSIS INFO: Transition not detected. Was standing now bottom. {NORMAL}')
@@ -267,9 +432,9 @@ class SquatFormAnalyser():
             self.state_sequence = [STANDING]
         elif self.state_sequence[-1] != TRANSITION and self.form_thresholds['TRANSITION_knee_angle_range'][0] <= knee_angle <= self.form_thresholds['TRANSITION_knee_angle_range'][1]:
             if self.state_sequence[-1] == STANDING:
-                self.squat_start_time = time.time()
+                self.squat_start_time = self.frame_time
             elif self.state_sequence[-1] == BOTTOM:
-                self.squat_mid_time = time.time()
+                self.squat_mid_time = self.frame_time
             if self.state_sequence[-1] != TRANSITION:
                 self.state_sequence.append(TRANSITION)
         elif self.state_sequence[-1] != BOTTOM and self.form_thresholds['BOTTOM_knee_angle_range'][0] <= knee_angle <= self.form_thresholds['BOTTOM_knee_angle_range'][1]:
@@ -281,79 +446,16 @@ class SquatFormAnalyser():
 
 
         ###### Determine Feedback ######
-        if self.form_thresholds['TRANSITION_knee_angle_range'][0] < knee_angle < self.form_thresholds['TRANSITION_knee_angle_range'][1] and \
-            self.state_sequence.count(TRANSITION) == 1:
-            final_feedback.append({'tag': 'TIP', 'message': 'Lower Hips'})
-
-        if self.state_sequence[-1] == BOTTOM:
-            final_feedback.append({'tag': 'TIP', 'message': 'Keep your knees over your toes'})
-
-            if orientation == 'face_on' and not self.form_analyser.check_joints_are_level(
-                joints_dict['left_knee'],
-                joints_dict['right_knee'],
-                self.general_thresholds['knee_level']
-            ):
-                final_feedback.append({'tag': 'FEEDBACK', 'message': 'Knees are not level'})
-                self.current_rep_good = False
-                self.__add_final_summary_feedback('Knees were not level')
-
-        # TODO: check this and move 35 (constant) into thresholds
-        if self.state_sequence[-1] == TRANSITION and knee_angle < 35 and self.form_thresholds['safe_hip_angle'] < hip_angle:
-            final_feedback.append({'tag': 'FEEDBACK', 'message': f'COLLAPSED TORSO!\nLean back slightly'})
+        # The form rules (see form_rules.SQUAT_RULES) for the current phase and camera orientation
+        phase = self.state_sequence[-1]
+        if phase == TRANSITION:
+            phase = DESCENT if self.state_sequence.count(TRANSITION) == 1 else ASCENT
+        fired = self.form_rules.evaluate(features, SIDE_INDEX[self.most_visible_side], phase, orientation)[0]
+
+        final_feedback.extend(self.form_rules.get_feedback(fired))
+        for msg in self.form_rules.get_summaries(fired):
             self.current_rep_good = False
-            self.__add_final_summary_feedback('Torso was collapsed')
-
-        ##### Determine feedback specific to user camera orientation #####
-        if orientation == 'face_on':
-            if not self.form_analyser.check_joints_are_level(
-                joints_dict['left_shoulder'],
-                joints_dict['right_shoulder'],
-                self.general_thresholds['shoulder_level']
-            ):
-                final_feedback.append({'tag': 'FEEDBACK', 'message': 'Shoulders are not level'})
-                self.current_rep_good = False
-                self.__add_final_summary_feedback('Shoulders were not level')
-
-            if not self.form_analyser.check_joints_are_level(
-                joints_dict['left_hip'],
-                joints_dict['right_hip'],
-                self.general_thresholds['hip_level']
-            ):
-                final_feedback.append({'tag': 'FEEDBACK', 'message': 'Hips are not level'})
-                self.current_rep_good = False
-                self.__add_final_summary_feedback('Hips were not level')
-
-            if not self.form_analyser.check_joints_are_vertically_aligned(
-                joints_dict['left_hip'],
-                joints_dict['right_hip'],
-                joints_dict['left_ankle'],
-                joints_dict['right_ankle'],
-                self.form_thresholds['hip_vertically_aligned']
-            ):
-                final_feedback.append({'tag': 'FEEDBACK', 'message': 'Hips are not vertically aligned with feet'})
-                self.current_rep_good = False
-                self.__add_final_summary_feedback('Hips went out of alignment with feet')
-
-            if not self.form_analyser.check_joints_are_vertically_aligned(
-                joints_dict['left_shoulder'],
-                joints_dict['right_shoulder'],
-                joints_dict['left_ankle'],
-                joints_dict['right_ankle'],
-                self.form_thresholds['shoulder_vertically_aligned']
-            ):
-                final_feedback.append({'tag': 'FEEDBACK', 'message': 'Shoulders are not vertically aligned with feet'})
-                self.current_rep_good = False
-                self.__add_final_summary_feedback('Shoulders went out of alignment with feet')
-        elif orientation == 'side_on':
-            if not self.form_analyser.check_spine_is_neutral(
-                most_visible_joints_dict['hip'],
-                most_visible_joints_dict['shoulder'],
-                joints_dict['nose'],
-                self.general_thresholds['spine_neutral']
-            ):
-                final_feedback.append({'tag': 'FEEDBACK', 'message': 'Maintain a neutral spine'})
-                self.current_rep_good = False
-                self.__add_final_summary_feedback('A neutral spine was not maintained')
+            self.__add_final_summary_feedback(msg)
 
         return final_feedback
 
@@ -368,13 +470,10 @@ class SquatFormAnalyser():
 
         return True
 
-    def __check_set_has_begun(self, joints_dict, most_visible_side):
-        most_visible_main_joints = {
-            joint_name: joints_dict[most_visible_side + joint_name]
-            for joint_name in self.form_analyser.main_joints
-        }
+    def __check_set_has_begun(self, left_joints, right_joints, most_visible_side, features):
+        most_visible_main_joints = left_joints if most_visible_side == 'left_' else right_joints
 
-        knee_angle, hip_angle = self.form_analyser.get_main_joint_angles(most_visible_main_joints)
+        knee_angle, hip_angle = self.form_analyser.get_main_joint_angles(features, most_visible_side)
 
         if self.form_analyser.joints_in_starting_position(
             knee_angle,
@@ -387,8 +486,8 @@ class SquatFormAnalyser():
 
             if self.__joint_buffer_is_stationary():
                 if self.stationary_start_time is None:
-                    self.stationary_start_time = time.time()
-                elif time.time() - self.stationary_start_time > self.stationary_duration:
+                    self.stationary_start_time = self.frame_time
+                elif self.frame_time - self.stationary_start_time > self.stationary_duration:
                     return True
             else:
                 self.stationary_start_time = None
@@ -400,15 +499,8 @@ class SquatFormAnalyser():
 
         return False
 
-    def __check_set_has_ended(self, most_visible_ankle):
-        if not self.__add_to_joint_buffer(most_visible_ankle):
-            return False
-
-        j1 = self.joint_buffer[0]
-        j2 = self.joint_buffer[1]
-
-        distance = ((j1.x - j2.x)**2 + (j1.y - j2.y)**2 + (j1.z - j2.z)**2)**0.5
-        if distance > self.general_thresholds['set_end_stationary']:
+    def __check_set_has_ended(self, ankle_displacement):
+        if ankle_displacement > self.general_thresholds['set_end_stationary']:
             self.set_ended_counter += 1
             if self.set_ended_counter >= self.set_ended_threshold:
                 return True
@@ -418,15 +510,11 @@ class SquatFormAnalyser():
         return False
 
     def __joint_buffer_is_stationary(self):
-        for joint_name in self.form_analyser.main_joints:
-            j1 = self.joint_buffer[0][joint_name]
-            j2 = self.joint_buffer[1][joint_name]
-
-            distance = ((j1.x - j2.x)**2 + (j1.y - j2.y)**2 + (j1.z - j2.z)**2)**0.5
-            if distance > self.general_thresholds['set_start_stationary']:
-                return False
+        j1 = self.joint_buffer[0]
+        j2 = self.joint_buffer[1]
 
-        return True
+        distances = np.linalg.norm(j1[:, :VISIBILITY] - j2[:, :VISIBILITY], axis=1)
+        return bool(np.all(distances <= self.general_thresholds['set_start_stationary']))
 
     def __add_final_summary_feedback(self, msg):
         if msg not in self.final_summary['mistakes_made'][-1]['mistakes']:
@@ -440,31 +528,3 @@ class SquatFormAnalyser():
             self.final_summary['final_comments'] = 'NOT IMPLEMENTED YET'
 
         return self.final_summary
-
-    def __draw_text(self, img, text,
-        to_centre=False,
-        font=cv2.FONT_HERSHEY_PLAIN,
-        pos=(0, 0),
-        font_scale=3,
-        font_thickness=2,
-        text_color=(219, 123, 3),
-        text_color_bg=(0, 0, 0)
-    ):
-        x, y = pos
-        text_size, _ = cv2.getTextSize(text, font, font_scale, font_thickness)
-        text_w, text_h = text_size
-        if to_centre:
-            x -= text_w // 2
-            y -= text_h // 2
-        cv2.rectangle(img, (x, y), (x + text_w, y + text_h), text_color_bg, -1)
-        cv2.putText(
-            img,
-            text,
-            (x, y + text_h + font_scale - 1),
-            font,
-            font_scale,
-            text_color,
-            font_thickness
-        )
-
-        return text_size
@@ -2,6 +2,7 @@ import time
 
 import cv2
 import squat_analyser as sa2
+from landmark_cache import CachedDetector, LandmarkCache
 
 
 NORMAL = '\u001b[0m'
@@ -10,6 +11,9 @@ GREEN = '\u001b[32m'
 BLUE = '\u001b[34m'
 RED_BG = '\u001b[41m'
 
+# Replay cached landmarks so that re-running the tests after changing thresholds skips pose estimation
+landmark_cache = LandmarkCache()
+
 videos = [
     { 'path': '../assets/goblet_squat_paused_start.mp4', 'any_problems': False, 'reps': 3 },
     { 'path': '../assets/barbell_back_squat_paused_start.mp4', 'any_problems': False, 'reps': 11 },
@@ -32,6 +36,14 @@ for vid in videos:
         print(f'{RED_BG} Failed to open video: {vid["path"]} {NORMAL}')
         exit()
 
+    form_analyser.pose_detector = CachedDetector(
+        form_analyser.pose_detector,
+        vid['path'],
+        cache=landmark_cache,
+        cap=cap,
+        params={**form_analyser.preprocessor.params, **form_analyser.frame_stride.params}
+    )
+
     print(BLUE, f'Assessing: {vid["path"]}', NORMAL)
 
     current_test_failed = False
@@ -42,7 +54,6 @@ for vid in videos:
 
     process_start_time = time.time()
     while True:
-        # NOTE: the script works with time to determine some things. without a bit of a natural delay, it messes up. Solution is to replace time with frame count
         feedback, success = form_analyser.analyse(cap, show_output=True)
         if not success:
             break
@@ -66,6 +77,7 @@ for vid in videos:
         frame_index += 1
 
     end_time = time.time()
+    form_analyser.pose_detector.finish()
 
     if vid['reps'] == len(state_sequences):
         print(GREEN, 'Reps:', len(state_sequences), NORMAL)
@@ -119,6 +131,7 @@ for vid in videos:
         print(GREEN, 'TEST PASSED', NORMAL)
     print()
 
+    form_analyser.close()
     cv2.destroyAllWindows()
     cap.release()
 
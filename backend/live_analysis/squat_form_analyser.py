@@ -1,6 +1,8 @@
-from collections import Counter, namedtuple
+from collections import Counter
 
 import numpy as np
+from landmark_frame import LANDMARK_NAMES, MAIN_JOINT_INDICES, VISIBILITY, Z
+from pose_features import SIDE_INDEX
 
 
 class MediaPipe_To_Form_Interpreter():
@@ -9,42 +11,11 @@ class MediaPipe_To_Form_Interpreter():
     ):
         self.min_confidence_threshold = confidence_threshold
         self.main_joints = ['foot_index', 'ankle', 'knee', 'hip', 'shoulder']
-        self.landmark_names = {
-            'nose': 0,
-            'left_eye_inner': 1,
-            'left_eye': 2,
-            'left_eye_outer': 3,
-            'right_eye_inner': 4,
-            'right_eye': 5,
-            'right_eye_outer': 6,
-            'left_ear': 7,
-            'right_ear': 8,
-            'mouth_left': 9,
-            'mouth_right': 10,
-            'left_shoulder': 11,
-            'right_shoulder': 12,
-            'left_elbow': 13,
-            'right_elbow': 14,
-            'left_wrist': 15,
-            'right_wrist': 16,
-            'left_pinky': 17,
-            'right_pinky': 18,
-            'left_index': 19,
-            'right_index': 20,
-            'left_thumb': 21,
-            'right_thumb': 22,
-            'left_hip': 23,
-            'right_hip': 24,
-            'left_knee': 25,
-            'right_knee': 26,
-            'left_ankle': 27,
-            'right_ankle': 28,
-            'left_heel': 29,
-            'right_heel': 30,
-            'left_foot_index': 31,
-            'right_foot_index': 32
+        self.landmark_names = LANDMARK_NAMES
+        self.main_joint_indices = {
+            side: indices[:len(self.main_joints)]
+            for side, indices in MAIN_JOINT_INDICES.items()
         }
-        self.VerticalBase = namedtuple('VerticalBase', ['x', 'y', 'z', 'visibility'])
         self.most_visible_side = []
         self.orientation = []
 
@@ -52,40 +23,19 @@ class MediaPipe_To_Form_Interpreter():
         self.most_visible_side = []
         self.orientation = []
 
-    def __calc_3D_angle(self, joint1, joint2, joint3):
-        # Create vectors from joint2 to joint1 and joint2 to joint3
-        vector1 = np.array([joint1.x - joint2.x, joint1.y - joint2.y, joint1.z - joint2.z])
-        vector2 = np.array([joint3.x - joint2.x, joint3.y - joint2.y, joint3.z - joint2.z])
-
-        # Calculate the dot product and magnitudes of the vectors
-        dot_product = np.dot(vector1, vector2)
-        magnitude1_squared = np.dot(vector1, vector1)
-        magnitude2_squared = np.dot(vector2, vector2)
-
-        # Calculate the angle between the vectors in radians
-        radians = np.arccos(dot_product / np.sqrt(magnitude1_squared * magnitude2_squared))
-
-        # Convert radians to degrees
-        angle = np.rad2deg(radians)
-
-        return angle
-
     def check_confidence(self, confidence_threshold, joints):
-        return all(joints) and all([joint.visibility >= confidence_threshold for joint in joints])
+        return bool(np.all(joints[..., VISIBILITY] >= confidence_threshold))
 
-    def get_joints_dict(self, pose_landmarks):
-        return {
-            joint_name: pose_landmarks.landmark[self.landmark_names[joint_name]]
-            for joint_name in self.landmark_names.keys()
-        }
+    def get_main_joints(self, landmarks, side):
+        return landmarks[self.main_joint_indices[side]]
 
     def get_most_visible_side(self, left_joints, right_joints, set_begun):
         if set_begun:
             if isinstance(self.most_visible_side, type([])):
                 self.most_visible_side, _ = Counter(self.most_visible_side).most_common(1)[0]
         else:
-            left_visibility = sum([joint.visibility for joint in left_joints])
-            right_visibility = sum([joint.visibility for joint in right_joints])
+            left_visibility = left_joints[:, VISIBILITY].sum()
+            right_visibility = right_joints[:, VISIBILITY].sum()
 
             if right_visibility < left_visibility:
                 self.most_visible_side.append('left_')
@@ -98,8 +48,8 @@ class MediaPipe_To_Form_Interpreter():
 
     def get_orientation(self, left_shoulder, right_shoulder, left_hip, right_hip, threshold):
         if isinstance(self.orientation, type([])):
-            shoulder_depth_difference = abs(left_shoulder.z - right_shoulder.z)
-            hip_depth_difference = abs(left_hip.z - right_hip.z)
+            shoulder_depth_difference = abs(left_shoulder[Z] - right_shoulder[Z])
+            hip_depth_difference = abs(left_hip[Z] - right_hip[Z])
 
             if max(shoulder_depth_difference, hip_depth_difference) < threshold:
                 self.orientation.append("face_on")
@@ -114,10 +64,10 @@ class MediaPipe_To_Form_Interpreter():
 
         return self.orientation
 
-    def get_main_joint_angles(self, joints):
+    def get_main_joint_angles(self, features, side, frame=0):
         return [
-            round(self.__calc_3D_angle(joints['ankle'], joints['knee'], joints['hip']), 1),
-            round(self.__calc_3D_angle(joints['knee'], joints['hip'], joints['shoulder']), 1)
+            float(features.knee_angle[frame, SIDE_INDEX[side]]),
+            float(features.hip_angle[frame, SIDE_INDEX[side]])
         ]
 
     def joints_in_starting_position(
@@ -130,13 +80,11 @@ class MediaPipe_To_Form_Interpreter():
         return knee_angle_range[0] <= knee_vertical_angle <= knee_angle_range[1] and \
             hip_angle_range[0] <= hip_vertical_angle <= hip_angle_range[1]
 
-    def check_joints_are_level(self, joint1, joint2, threshold):
-        return abs(joint1.y - joint2.y) <= threshold
+    def check_joints_are_level(self, level_difference, threshold):
+        return level_difference <= threshold
 
-    def check_joints_are_vertically_aligned(self, left_joint1, right_joint1, left_joint2, right_joint2, threshold):
-        joint1_mid = abs(right_joint1.x + abs(right_joint1.x - left_joint1.x) / 2)
-        joint2_mid = abs(right_joint2.x + abs(right_joint2.x - left_joint2.x) / 2)
-        return abs(joint1_mid - joint2_mid) <= threshold
+    def check_joints_are_vertically_aligned(self, alignment_offset, threshold):
+        return alignment_offset <= threshold
 
-    def check_spine_is_neutral(self, hip, shoulder, nose, threshold):
-        return abs(self.__calc_3D_angle(hip, shoulder, nose) - 180) <= threshold
+    def check_spine_is_neutral(self, spine_angle, threshold):
+        return abs(spine_angle - 180) <= threshold
@@ -0,0 +1,114 @@
+import asyncio
+
+import cv2
+import numpy as np
+
+
+Y4M_MAGIC = b'YUV4MPEG2'
+Y4M_FRAME = b'FRAME'
+
+
+def get_ffmpeg_args(stream_url, fps):
+    return [
+        'ffmpeg',
+        '-hide_banner',
+        '-loglevel', 'error',
+        '-fflags', 'nobuffer',
+        '-flags', 'low_delay',
+        '-an',  # Ignore audio
+        '-f', 'flv',
+        '-listen', '1',
+        '-i', stream_url,
+        '-vf', f'fps={fps}',  # Drop frames down to fps, rather than re-encoding at that rate
+        '-pix_fmt', 'yuv420p',
+        '-f', 'yuv4mpegpipe',
+        'pipe:1'
+    ]
+
+
+class StreamDecoder():
+    """ Decodes a live stream straight into numpy frames with an ffmpeg subprocess, without re-encoding it.
+
+    ffmpeg listens for the publisher at stream_url, decodes its video, drops frames down to fps and writes the raw
+    frames to its stdout as YUV4MPEG2, whose header gives the frame size. The subprocess runs under asyncio, so
+    start(), wait_until_ready() and read() are coroutines that wait on ffmpeg without holding up the event loop or a
+    thread, and read() converts each frame to BGR in the event loop's default executor. wait_until_ready() returns
+    once that header arrives, i.e. once the publisher has connected and its stream has been opened.
+
+    read() and get() otherwise match cv2.VideoCapture, so it can be fed into a LatestFrameCapture with receive().
+    The frames are constant rate, so the nth has a timestamp of n / fps seconds. stop() ends the stream, which ends
+    any pending wait_until_ready() or read(). """
+    def __init__(self, stream_url, fps=10):
+        self.stream_url = stream_url
+        self.fps = fps
+        self.process = None
+        self.width = 0
+        self.height = 0
+        self.frame_size = 0
+        self.frames_read = 0
+
+    async def start(self):
+        self.process = await asyncio.create_subprocess_exec(
+            *get_ffmpeg_args(self.stream_url, self.fps),
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL
+        )
+        return self
+
+    async def wait_until_ready(self):
+        """ Waits until the stream starts, returning True, or ffmpeg exits first, returning False. """
+        header = (await self.process.stdout.readline()).split()
+        if not header or header[0] != Y4M_MAGIC:
+            return False
+
+        for param in header[1:]:
+            if param.startswith(b'W'):
+                self.width = int(param[1:])
+            elif param.startswith(b'H'):
+                self.height = int(param[1:])
+
+        # I420: the full size Y plane followed by the quarter size U and V planes
+        self.frame_size = self.height * 3 // 2 * self.width
+        return True
+
+    async def read(self, frame=None):
+        if not self.frame_size or not (await self.process.stdout.readline()).startswith(Y4M_FRAME):
+            return False, None
+        try:
+            yuv_frame = await self.process.stdout.readexactly(self.frame_size)
+        except asyncio.IncompleteReadError:
+            return False, None
+
+        self.frames_read += 1
+        yuv_frame = np.frombuffer(yuv_frame, dtype=np.uint8).reshape(self.height * 3 // 2, self.width)
+        # Converting a frame takes milliseconds, so it is done off the event loop
+        frame = await asyncio.get_running_loop().run_in_executor(
+            None, cv2.cvtColor, yuv_frame, cv2.COLOR_YUV2BGR_I420, frame
+        )
+        return True, frame
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_POS_MSEC:
+            return max(self.frames_read - 1, 0) * 1000 / self.fps
+        if prop == cv2.CAP_PROP_FPS:
+            return self.fps
+        if prop == cv2.CAP_PROP_FRAME_WIDTH:
+            return self.width
+        if prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            return self.height
+        return 0
+
+    def stop(self):
+        if self.process is not None and self.process.returncode is None:
+            try:
+                self.process.terminate()
+            except ProcessLookupError:
+                # Already exited, but not yet waited on
+                pass
+
+    async def release(self):
+        """ Stops ffmpeg and waits for it to exit. """
+        self.stop()
+        if self.process is not None:
+            await self.process.wait()
@@ -0,0 +1,175 @@
+import numpy as np
+
+
+# Phases of a rep that rules can apply to. STANDING and BOTTOM match the analysers' states, and their TRANSITION
+# state is split into the DESCENT into the first transition of a rep and the ASCENT out of the bottom
+STANDING = 'STANDING'
+DESCENT = 'DESCENT'
+BOTTOM = 'BOTTOM'
+ASCENT = 'ASCENT'
+PHASES = [STANDING, DESCENT, BOTTOM, ASCENT]
+PHASE_INDEX = {phase: i for i, phase in enumerate(PHASES)}
+
+# Camera orientations that rules can apply to
+FACE_ON = 'face_on'
+SIDE_ON = 'side_on'
+ORIENTATIONS = [FACE_ON, SIDE_ON]
+ORIENTATION_INDEX = {orientation: i for i, orientation in enumerate(ORIENTATIONS)}
+
+# Comparisons of a feature with a threshold, all strict, that make a condition hold
+LESS = 'less'  # feature < threshold
+GREATER = 'greater'  # feature > threshold
+BETWEEN = 'between'  # low < feature < high, for a (low, high) threshold
+OUTSIDE = 'outside'  # feature < low or high < feature, for a (low, high) threshold
+DEVIATES = 'deviates'  # |feature - centre| > threshold, for a condition with a fourth item, centre
+
+# Each rule fires on frames where all of its conditions hold, but only in the listed phases and orientations (all of
+# them if not listed). Conditions are (feature, comparison, threshold name) where feature is a PoseFeatures
+# attribute, taken from the most visible side if it is sided. Rules with a summary message count against the rep.
+# Feedback is given in the order the rules are listed.
+SQUAT_RULES = [
+    {
+        'tag': 'TIP',
+        'message': 'Lower Hips',
+        'conditions': [('knee_angle', BETWEEN, 'TRANSITION_knee_angle_range')],
+        'phases': [DESCENT],
+    },
+    {
+        'tag': 'TIP',
+        'message': 'Keep your knees over your toes',
+        'conditions': [],
+        'phases': [BOTTOM],
+    },
+    {
+        'tag': 'FEEDBACK',
+        'message': 'Knees are not level',
+        'summary': 'Knees were not level',
+        'conditions': [('knee_level', GREATER, 'knee_level')],
+        'phases': [BOTTOM],
+        'orientations': [FACE_ON],
+    },
+    {
+        'tag': 'FEEDBACK',
+        'message': 'COLLAPSED TORSO!\nLean back slightly',
+        'summary': 'Torso was collapsed',
+        'conditions': [
+            ('knee_angle', LESS, 'collapsed_torso_knee_angle'),
+            ('hip_angle', GREATER, 'safe_hip_angle'),
+        ],
+        'phases': [DESCENT, ASCENT],
+    },
+    {
+        'tag': 'FEEDBACK',
+        'message': 'Shoulders are not level',
+        'summary': 'Shoulders were not level',
+        'conditions': [('shoulder_level', GREATER, 'shoulder_level')],
+        'orientations': [FACE_ON],
+    },
+    {
+        'tag': 'FEEDBACK',
+        'message': 'Hips are not level',
+        'summary': 'Hips were not level',
+        'conditions': [('hip_level', GREATER, 'hip_level')],
+        'orientations': [FACE_ON],
+    },
+    {
+        'tag': 'FEEDBACK',
+        'message': 'Hips are not vertically aligned with feet',
+        'summary': 'Hips went out of alignment with feet',
+        'conditions': [('hip_alignment', GREATER, 'hip_vertically_aligned')],
+        'orientations': [FACE_ON],
+    },
+    {
+        'tag': 'FEEDBACK',
+        'message': 'Shoulders are not vertically aligned with feet',
+        'summary': 'Shoulders went out of alignment with feet',
+        'conditions': [('shoulder_alignment', GREATER, 'shoulder_vertically_aligned')],
+        'orientations': [FACE_ON],
+    },
+    {
+        'tag': 'FEEDBACK',
+        'message': 'Maintain a neutral spine',
+        'summary': 'A neutral spine was not maintained',
+        'conditions': [('spine_angle', DEVIATES, 'spine_neutral', 180)],
+        'orientations': [SIDE_ON],
+    },
+]
+
+
+class FormRules():
+    """ Evaluates a table of form rules (see SQUAT_RULES) against PoseFeatures for one frame or a batch of frames.
+
+    The rules are compiled with the values of their thresholds into flat arrays of conditions, so that every
+    condition of every rule is checked in a handful of numpy comparisons however many rules there are. Each condition
+    becomes low < feature < high, possibly negated, and a rule fires where the phase and orientation masks allow it
+    and all of its conditions hold. """
+    def __init__(self, rules, thresholds):
+        self.rules = rules
+        self.feature_names = sorted({condition[0] for rule in rules for condition in rule['conditions']})
+        feature_index = {name: i for i, name in enumerate(self.feature_names)}
+
+        conditions = [(i, condition) for i, rule in enumerate(rules) for condition in rule['conditions']]
+        self.condition_features = np.array([feature_index[condition[0]] for _, condition in conditions], dtype=np.intp)
+        self.low = np.full(len(conditions), -np.inf, dtype=np.float32)
+        self.high = np.full(len(conditions), np.inf, dtype=np.float32)
+        self.negate = np.zeros(len(conditions), dtype=bool)
+        for j, (_, (feature, comparison, threshold_name, *centre)) in enumerate(conditions):
+            threshold = thresholds[threshold_name]
+            if comparison == LESS:
+                self.high[j] = threshold
+            elif comparison == GREATER:
+                self.low[j] = threshold
+            elif comparison in (BETWEEN, OUTSIDE):
+                self.low[j], self.high[j] = threshold
+                self.negate[j] = comparison == OUTSIDE
+            elif comparison == DEVIATES:
+                self.low[j], self.high[j] = centre[0] - threshold, centre[0] + threshold
+                self.negate[j] = True
+            else:
+                raise ValueError(f'Unknown comparison {comparison!r}')
+
+        # Negated conditions are met outside the inclusive range, so widen it to the next float32 either side
+        self.low[self.negate] = np.nextafter(self.low[self.negate], np.float32(-np.inf))
+        self.high[self.negate] = np.nextafter(self.high[self.negate], np.float32(np.inf))
+
+        # (conditions, rules) membership, and how many conditions each rule has to meet
+        self.condition_rules = np.zeros((len(conditions), len(rules)), dtype=np.int32)
+        self.condition_rules[np.arange(len(conditions)), [i for i, _ in conditions]] = 1
+        self.num_conditions = self.condition_rules.sum(axis=0)
+
+        # (phases, rules) and (orientations, rules) masks of where each rule applies
+        self.phase_mask = np.array([
+            [phase in rule.get('phases', PHASES) for rule in rules] for phase in PHASES
+        ], dtype=bool)
+        self.orientation_mask = np.array([
+            [orientation in rule.get('orientations', ORIENTATIONS) for rule in rules] for orientation in ORIENTATIONS
+        ], dtype=bool)
+        self.counts_against_rep = np.array(['summary' in rule for rule in rules], dtype=bool)
+
+    def evaluate(self, features, side, phase, orientation):
+        """ Returns a (num_frames, num_rules) mask of the rules that fire on each frame of features (PoseFeatures).
+        side indexes sided features (see SIDE_INDEX). phase and orientation are either names, for every frame, or
+        (num_frames,) arrays of indices into PHASES and ORIENTATIONS. """
+        if isinstance(phase, str):
+            phase = PHASE_INDEX[phase]
+        if isinstance(orientation, str):
+            orientation = ORIENTATION_INDEX[orientation]
+
+        values = np.empty((features.num_frames, len(self.feature_names)), dtype=np.float32)
+        for i, name in enumerate(self.feature_names):
+            feature = getattr(features, name)
+            values[:, i] = feature[:, side] if feature.ndim == 2 else feature
+
+        values = values[:, self.condition_features]
+        conditions_met = ((self.low < values) & (values < self.high)) != self.negate
+        all_conditions_met = conditions_met.astype(np.int32) @ self.condition_rules == self.num_conditions
+
+        return all_conditions_met & self.phase_mask[phase] & self.orientation_mask[orientation]
+
+    def get_feedback(self, fired):
+        """ Returns the feedback of the rules that fired on a single frame, given its row of evaluate(). """
+        return [{'tag': self.rules[i]['tag'], 'message': self.rules[i]['message']} for i in np.flatnonzero(fired)]
+
+    def get_summaries(self, fired):
+        """ Returns the summary messages of the rules that fired on a single frame that count against the rep. """
+        return [self.rules[i]['summary'] for i in np.flatnonzero(fired & self.counts_against_rep)]
@@ -0,0 +1,258 @@
+import json
+import multiprocessing
+import os
+import shutil
+import time
+import traceback
+import uuid
+from threading import Lock, Thread
+
+
+QUEUED = 'queued'
+PROCESSING = 'processing'
+DONE = 'done'
+FAILED = 'failed'
+
+# What a job outputs, besides its final summary
+VIDEO = 'video'  # The annotated video
+LANDMARKS = 'landmarks'  # Each frame's landmarks and feedback, for the client to draw itself
+SUMMARY = 'summary'  # Nothing else
+OUTPUTS = [VIDEO, LANDMARKS, SUMMARY]
+
+# Codecs that the annotated video can be encoded with, by name, and their fourccs
+VIDEO_CODECS = {
+    'mp4v': 'mp4v',  # MPEG-4 Part 2, always available
+    'h264': 'avc1',  # Smaller, but only if OpenCV was built with an H.264 encoder
+}
+
+
+def get_result_paths(results_dir, video_id):
+    return os.path.join(results_dir, f'{video_id}.mp4'), os.path.join(results_dir, f'{video_id}.json')
+
+
+def get_track_paths(results_dir, video_id):
+    """ Returns the paths of a job's landmark track as JSON and as binary (see LandmarkTrack). """
+    return os.path.join(results_dir, f'{video_id}.track.json'), os.path.join(results_dir, f'{video_id}.track.bin')
+
+
+def run_worker(
+    job_queue,
+    update_queue,
+    results_dir,
+    model_complexity,
+    processes_per_job,
+    landmark_cache_dir,
+    landmark_cache_size,
+    frame_stride,
+    adaptive_frame_stride,
+    frame_interpolation,
+    landmark_filter
+):
+    """ Worker process loop. Each worker keeps its own warm SquatFormAnalyser (and so its own MediaPipe graph)
+    and processes one job at a time until it receives None. """
+    # Imported here so that only worker processes load MediaPipe
+    from frame_stride import FrameStride
+    from landmark_cache import LandmarkCache
+    from landmark_filter import LandmarkFilter
+    from landmark_track import LandmarkTrack
+    from metrics import MetricsRegistry, PipelineMetrics
+    from squat_analyser import SquatFormAnalyser
+
+    # Recorded here and sent to the server process along with each update
+    metrics = PipelineMetrics(MetricsRegistry())
+    form_analyser = SquatFormAnalyser(
+        model_complexity=model_complexity,
+        num_processes=processes_per_job,
+        landmark_cache=None if landmark_cache_dir is None else LandmarkCache(landmark_cache_dir, landmark_cache_size),
+        stage_timer=metrics,
+        frame_stride=FrameStride(frame_stride, adaptive=adaptive_frame_stride, method=frame_interpolation),
+        landmark_filter=None if landmark_filter is None else LandmarkFilter(landmark_filter)
+    )
+
+    while True:
+        job = job_queue.get()
+        if job is None:
+            break
+
+        job_id, video_path, options = job
+        update_queue.put((job_id, {'status': PROCESSING}, None))
+
+        def report_progress(frames_done, total_frames):
+            update_queue.put((job_id, {'frames_done': frames_done, 'total_frames': total_frames}, metrics.take_state()))
+
+        try:
+            track = LandmarkTrack() if options['output'] == LANDMARKS else None
+            temp_proc_file, final_summary = form_analyser.analyse(
+                video_path,
+                progress_callback=report_progress,
+                render_video=options['output'] == VIDEO,
+                output_size=options['max_size'],
+                codec=VIDEO_CODECS[options['codec']],
+                track=track
+            )
+
+            # Keep the outputs on disk for the client to download
+            processed_video_path, summary_path = get_result_paths(results_dir, job_id)
+            if temp_proc_file is not None:
+                temp_proc_file.close()
+                shutil.move(temp_proc_file.name, processed_video_path)
+            if track is not None:
+                track.save(*get_track_paths(results_dir, job_id))
+            with open(summary_path, 'w') as f:
+                json.dump(final_summary, f)
+
+            update_queue.put((job_id, {'status': DONE, 'final_summary': final_summary}, metrics.take_state()))
+        except Exception as e:
+            traceback.print_exc()
+            update_queue.put((job_id, {'status': FAILED, 'error': str(e)}, metrics.take_state()))
+        finally:
+            os.unlink(video_path)
+
+    form_analyser.close()
+
+
+class AnalysisJobQueue():
+    """ Queues uploaded videos for analysis by a pool of worker processes and tracks each job's progress.
+
+    Jobs are submitted with the path of an uploaded video, which the queue takes ownership of and deletes once
+    processed, and what to output for it (see submit()). Workers report status and frames done / total back to this
+    process on a separate queue.
+    With processes_per_job > 1, each worker splits pose estimation for a video across that many processes.
+    If landmark_cache_dir is given, workers share a landmark cache there of at most landmark_cache_size bytes.
+    Pose inference runs on every frame_stride-th frame (every frame during reps if adaptive_frame_stride), with the
+    landmarks of the frames in between interpolated by frame_interpolation ('linear' or 'spline'). If given,
+    landmark_filter ('one_euro' or 'kalman') smooths the landmarks over time.
+    If given, the stage latencies and frame counts recorded by the workers are added to metrics (a PipelineMetrics). """
+    def __init__(
+        self,
+        results_dir,
+        num_workers=1,
+        model_complexity=2,
+        processes_per_job=1,
+        landmark_cache_dir=None,
+        landmark_cache_size=2 * 1024 * 1024 * 1024,
+        frame_stride=1,
+        adaptive_frame_stride=False,
+        frame_interpolation='linear',
+        landmark_filter=None,
+        job_time_to_live=60 * 60,
+        metrics=None
+    ):
+        self.results_dir = results_dir
+        self.num_workers = num_workers
+        self.model_complexity = model_complexity
+        self.processes_per_job = processes_per_job
+        self.landmark_cache_dir = landmark_cache_dir
+        self.landmark_cache_size = landmark_cache_size
+        self.frame_stride = frame_stride
+        self.adaptive_frame_stride = adaptive_frame_stride
+        self.frame_interpolation = frame_interpolation
+        self.landmark_filter = landmark_filter
+        self.job_time_to_live = job_time_to_live
+        self.metrics = metrics
+
+        self.job_queue = None
+        self.update_queue = None
+        self.workers = []
+        self.update_thread = Thread(target=self.__apply_updates, daemon=True)
+
+        self.jobs = {}
+        self.lock = Lock()
+
+    def start(self):
+        # Spawn rather than fork so workers don't inherit the server's threads or any MediaPipe state
+        context = multiprocessing.get_context('spawn')
+        self.job_queue = context.Queue()
+        self.update_queue = context.Queue()
+        self.workers = [
+            context.Process(
+                target=run_worker,
+                args=(
+                    self.job_queue,
+                    self.update_queue,
+                    self.results_dir,
+                    self.model_complexity,
+                    self.processes_per_job,
+                    self.landmark_cache_dir,
+                    self.landmark_cache_size,
+                    self.frame_stride,
+                    self.adaptive_frame_stride,
+                    self.frame_interpolation,
+                    self.landmark_filter
+                ),
+                # Not daemonic, as daemonic processes can't start the processes for segment-parallel analysis
+                daemon=False
+            )
+            for _ in range(self.num_workers)
+        ]
+
+        for worker in self.workers:
+            worker.start()
+        self.update_thread.start()
+        return self
+
+    def shutdown(self):
+        for _ in self.workers:
+            self.job_queue.put(None)
+        for worker in self.workers:
+            worker.join()
+        self.update_queue.put(None)
+        self.update_thread.join()
+
+    def submit(self, video_path, output=VIDEO, max_size=None, codec='mp4v'):
+        """ Queues the video at video_path, returning the job's id. Besides the final summary, the job outputs
+        output (one of OUTPUTS). The annotated video is encoded with codec (one of VIDEO_CODECS) and, if max_size is
+        given, scaled down so that its longest side is at most max_size pixels. """
+        if output not in OUTPUTS:
+            raise ValueError(f'Unknown output {output!r}')
+        if codec not in VIDEO_CODECS:
+            raise ValueError(f'Unknown codec {codec!r}')
+
+        job_id = uuid.uuid4().hex
+        with self.lock:
+            self.jobs[job_id] = {
+                'status': QUEUED,
+                'output': output,
+                'frames_done': 0,
+                'total_frames': None,
+                'updated': time.time(),
+            }
+        self.job_queue.put((job_id, video_path, {'output': output, 'max_size': max_size, 'codec': codec}))
+
+        return job_id
+
+    def get_job(self, job_id):
+        with self.lock:
+            job = self.jobs.get(job_id)
+            return None if job is None else dict(job)
+
+    def get_queue_depth(self):
+        with self.lock:
+            return sum(job['status'] == QUEUED for job in self.jobs.values())
+
+    def get_num_processing(self):
+        with self.lock:
+            return sum(job['status'] == PROCESSING for job in self.jobs.values())
+
+    def remove_expired_jobs(self):
+        now = time.time()
+        with self.lock:
+            for job_id in [
+                job_id for job_id, job in self.jobs.items()
+                if job['status'] in [DONE, FAILED] and now - job['updated'] > self.job_time_to_live
+            ]:
+                del self.jobs[job_id]
+
+    def __apply_updates(self):
+        while True:
+            update = self.update_queue.get()
+            if update is None:
+                break
+
+            job_id, changes, metrics_state = update
+            with self.lock:
+                if job_id in self.jobs:
+                    self.jobs[job_id].update(changes, updated=time.time())
+
+            if self.metrics is not None and metrics_state is not None:
+                self.metrics.add_state(metrics_state)
@@ -0,0 +1,62 @@
+import json
+import struct
+
+import numpy as np
+from landmark_frame import NUM_LANDMARKS
+
+
+class LandmarkTrack():
+    """ The landmarks and feedback messages of every frame of an analysed video, for clients that draw the overlay
+    themselves instead of downloading an annotated video.
+
+    save() writes the track as JSON, with each frame's (33, 4) landmarks (or null where no pose was detected) rounded
+    to decimals places, and as binary: a little-endian uint32 header length, then a JSON header of the same without
+    the landmarks, padded with spaces to a multiple of 4 bytes, then the (frames, 33, 4) little-endian float32
+    landmarks, NaN where no pose was detected. """
+    def __init__(self, fps=None, decimals=4):
+        self.fps = fps
+        self.decimals = decimals
+        self.timestamps = []
+        self.landmarks = []
+        self.feedback = []
+
+    def add_frame(self, timestamp, landmarks, feedback):
+        """ Adds the next frame's timestamp (seconds), (33, 4) landmarks or None, and list of feedback messages. """
+        self.timestamps.append(round(float(timestamp), 3))
+        self.landmarks.append(None if landmarks is None else np.array(landmarks, dtype=np.float32))
+        self.feedback.append(list(feedback))
+
+    def get_header(self):
+        return {
+            'fps': self.fps,
+            'frames': len(self.landmarks),
+            'landmarks_shape': [len(self.landmarks), NUM_LANDMARKS, 4],
+            'timestamps': self.timestamps,
+            'feedback': self.feedback,
+        }
+
+    def to_json(self):
+        return {
+            **self.get_header(),
+            'landmarks': [
+                None if landmarks is None else np.round(landmarks, self.decimals).tolist()
+                for landmarks in self.landmarks
+            ],
+        }
+
+    def to_binary(self):
+        header = json.dumps(self.get_header(), separators=(',', ':')).encode()
+        header += b' ' * (-len(header) % 4)
+
+        landmarks = np.full((len(self.landmarks), NUM_LANDMARKS, 4), np.nan, dtype='<f4')
+        for i, frame_landmarks in enumerate(self.landmarks):
+            if frame_landmarks is not None:
+                landmarks[i] = frame_landmarks
+
+        return struct.pack('<I', len(header)) + header + landmarks.tobytes()
+
+    def save(self, json_path, binary_path):
+        with open(json_path, 'w') as f:
+            json.dump(self.to_json(), f, separators=(',', ':'))
+        with open(binary_path, 'wb') as f:
+            f.write(self.to_binary())
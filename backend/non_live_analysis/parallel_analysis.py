@@ -0,0 +1,204 @@
+import bisect
+import subprocess
+from concurrent.futures import as_completed
+
+import cv2
+import numpy as np
+from form_analyser import MediaPipe_To_Form_Interpreter
+from frame_preprocessor import FramePreprocessor
+from frame_stride import FrameStride
+from landmark_frame import NUM_LANDMARKS, LandmarkFrame
+from mediapipe_estimator import MediaPipeDetector
+from pose_features import SIDE_INDEX, FeatureExtractor
+
+
+def get_keyframe_indices(video_path):
+    """ Returns the total number of frames and the (display order) indices of the keyframes in the video's
+    first video stream, using ffprobe's packet listing so nothing needs decoding. Returns None if ffprobe
+    is unavailable or fails. """
+    try:
+        result = subprocess.run(
+            [
+                'ffprobe', '-v', 'error',
+                '-select_streams', 'v:0',
+                '-show_entries', 'packet=pts,flags',
+                '-of', 'csv=p=0',
+                video_path
+            ],
+            capture_output=True,
+            text=True,
+            check=True
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+    packets = []
+    for line in result.stdout.splitlines():
+        pts, _, flags = line.partition(',')
+        if pts.lstrip('-').isdigit():
+            packets.append((int(pts), 'K' in flags))
+
+    # Packets are listed in decode order, so sort by presentation time to get display order
+    packets.sort()
+    return len(packets), [i for i, (_, is_keyframe) in enumerate(packets) if is_keyframe]
+
+
+def plan_segments(total_frames, num_segments, warm_up_frames, keyframe_indices=None):
+    """ Splits total_frames into up to num_segments contiguous segments of roughly equal length, moving each
+    boundary to the nearest keyframe when keyframe_indices is given so every segment can be seeked to cheaply.
+
+    Returns (decode_start, start, end) tuples. Frames decode_start to start are only a warm-up for MediaPipe's
+    tracking and smoothing, so their results are discarded; start to end are the frames the segment owns. """
+    boundaries = set()
+    for i in range(1, num_segments):
+        target = round(i * total_frames / num_segments)
+        if keyframe_indices:
+            nearest = bisect.bisect_left(keyframe_indices, target)
+            candidates = keyframe_indices[max(nearest - 1, 0):nearest + 1]
+            target = min(candidates, key=lambda keyframe: abs(keyframe - target))
+        if 0 < target < total_frames:
+            boundaries.add(target)
+
+    boundaries = [0] + sorted(boundaries) + [total_frames]
+    return [
+        (max(start - warm_up_frames, 0), start, end)
+        for start, end in zip(boundaries, boundaries[1:])
+    ]
+
+
+def estimate_segment_landmarks(
+    video_path,
+    decode_start,
+    start,
+    end,
+    estimator_params,
+    preprocessing_params,
+    stride_params,
+    standing_knee_angle
+):
+    """ Runs pose estimation over frames decode_start to end with a fresh MediaPipeDetector, FramePreprocessor and
+    FrameStride made with estimator_params, preprocessing_params and stride_params (their params), returning start,
+    the (N, 33, 4) landmarks of the N frames from start that could be read (at most end - start), their timestamps in
+    seconds and a mask of the frames where a pose was detected. As in the analyser, an adaptive stride drops to 1
+    while the most visible side's knee angle is below standing_knee_angle. """
+    cap = cv2.VideoCapture(video_path)
+    cap.set(cv2.CAP_PROP_POS_FRAMES, decode_start)
+    pose_estimator = MediaPipeDetector(**estimator_params)
+    preprocessor = FramePreprocessor(**preprocessing_params)
+    frame_stride = FrameStride(
+        stride_params['frame_stride'],
+        adaptive=stride_params['adaptive_frame_stride'],
+        method=stride_params['frame_interpolation']
+    )
+    form_analyser = MediaPipe_To_Form_Interpreter()
+    feature_extractor = FeatureExtractor()
+    landmark_frame = LandmarkFrame()
+
+    landmarks = np.zeros((end - start, NUM_LANDMARKS, 4), dtype=np.float32)
+    timestamps = np.full(end - start, np.nan)
+    detected = np.zeros(end - start, dtype=bool)
+
+    def set_landmarks(frame_index, frame_landmarks):
+        # Warm-up frames are only run for MediaPipe's tracking, so theirs are discarded
+        if frame_index >= start and frame_landmarks is not None:
+            landmarks[frame_index - start] = frame_landmarks
+            detected[frame_index - start] = True
+
+    frames_read = 0
+    last_keyframe = decode_start - 1
+    frame = None
+    for frame_index in range(decode_start, end):
+        success, frame = cap.read(frame)
+        if not success:
+            break
+        if frame_index >= start:
+            frames_read = frame_index - start + 1
+            timestamps[frame_index - start] = cap.get(cv2.CAP_PROP_POS_MSEC) / 1000
+
+        # The segment's last frame is always a keyframe, so that the frames before it can be filled in
+        if not frame_stride.is_keyframe(frame_index) and frame_index < end - 1:
+            continue
+
+        pose_landmarks = preprocessor.map_to_frame(pose_estimator.make_prediction(preprocessor.prepare(frame)))
+        keyframe_landmarks = None if pose_landmarks is None else landmark_frame.fill(pose_landmarks).landmarks
+        frame_stride.add_keyframe(frame_index, keyframe_landmarks)
+        for i, frame_landmarks in enumerate(frame_stride.interpolate(), last_keyframe + 1):
+            set_landmarks(i, frame_landmarks)
+        set_landmarks(frame_index, keyframe_landmarks)
+        last_keyframe = frame_index
+
+        if frame_stride.adaptive and keyframe_landmarks is not None:
+            features = feature_extractor.extract(keyframe_landmarks)
+            side = SIDE_INDEX[form_analyser.get_most_visible_side(keyframe_landmarks)]
+            frame_stride.set_fast_phase(features.knee_angle[0, side] < standing_knee_angle)
+
+    # Frames after the last keyframe, if the video ended before the segment did, carry on its motion
+    for frame_index in range(last_keyframe + 1, start + frames_read):
+        set_landmarks(frame_index, frame_stride.extrapolate(frame_index))
+
+    cap.release()
+    return start, landmarks[:frames_read], timestamps[:frames_read], detected[:frames_read]
+
+
+def estimate_landmarks_in_parallel(
+    process_pool,
+    video_path,
+    num_segments,
+    estimator_params,
+    preprocessing_params,
+    stride_params,
+    standing_knee_angle,
+    warm_up_frames=30,
+    progress_callback=None
+):
+    """ Estimates the landmarks of every frame of the video by running keyframe-aligned segments on process_pool
+    (see estimate_segment_landmarks()) and stitching the results back together in order. Returns a (T, 33, 4) landmark track, the (T,) frame timestamps
+    and a (T,) mask of the frames where a pose was detected. progress_callback(frames_done, total_frames) is called as segments finish. """
+    keyframes = get_keyframe_indices(video_path)
+    if keyframes is None:
+        cap = cv2.VideoCapture(video_path)
+        total_frames, keyframe_indices = int(cap.get(cv2.CAP_PROP_FRAME_COUNT)), None
+        cap.release()
+    else:
+        total_frames, keyframe_indices = keyframes
+
+    landmark_track = np.zeros((total_frames, NUM_LANDMARKS, 4), dtype=np.float32)
+    timestamps = np.full(total_frames, np.nan)
+    detected = np.zeros(total_frames, dtype=bool)
+    futures = [
+        process_pool.submit(
+            estimate_segment_landmarks,
+            video_path,
+            decode_start,
+            start,
+            end,
+            estimator_params,
+            preprocessing_params,
+            stride_params,
+            standing_knee_angle
+        )
+        for decode_start, start, end in plan_segments(total_frames, num_segments, warm_up_frames, keyframe_indices)
+    ]
+
+    frames_done, frames_read = 0, 0
+    for future in as_completed(futures):
+        start, segment_landmarks, segment_timestamps, segment_detected = future.result()
+        landmark_track[start:start + len(segment_landmarks)] = segment_landmarks
+        timestamps[start:start + len(segment_timestamps)] = segment_timestamps
+        detected[start:start + len(segment_detected)] = segment_detected
+
+        frames_done += len(segment_landmarks)
+        if len(segment_landmarks):
+            frames_read = max(frames_read, start + len(segment_landmarks))
+        if progress_callback is not None:
+            progress_callback(frames_done, total_frames)
+
+    # The frame count can be more than could actually be read, so the track ends at the last frame read, and frames
+    # that a segment couldn't read are timed between the frames either side of them
+    landmark_track, timestamps, detected = landmark_track[:frames_read], timestamps[:frames_read], detected[:frames_read]
+    unread = np.isnan(timestamps)
+    if unread.any():
+        frames = np.arange(frames_read)
+        timestamps[unread] = np.interp(frames[unread], frames[~unread], timestamps[~unread])
+
+    return landmark_track, timestamps, detected
@@ -0,0 +1,103 @@
+import numpy as np
+from landmark_frame import LANDMARK_NAMES, NUM_LANDMARKS, VISIBILITY, X, Y
+
+
+SIDES = ['left_', 'right_']
+SIDE_INDEX = {side: i for i, side in enumerate(SIDES)}
+
+# Each angle is measured at the middle joint, for both sides
+ANGLE_JOINTS = {
+    'ankle_angle': ('foot_index', 'ankle', 'knee'),
+    'knee_angle': ('ankle', 'knee', 'hip'),
+    'hip_angle': ('knee', 'hip', 'shoulder'),
+    'shoulder_angle': ('hip', 'shoulder', 'elbow'),
+    'spine_angle': ('hip', 'shoulder', 'nose'),
+}
+# Absolute difference in height between the left and right joint
+LEVEL_JOINTS = ['shoulder', 'hip', 'knee']
+# Horizontal offset of the joint pair's mid-point from the ankles' mid-point
+ALIGNMENT_JOINTS = ['hip', 'shoulder']
+
+
+def _landmark_index(side, joint):
+    return LANDMARK_NAMES.get(side + joint, LANDMARK_NAMES.get(joint))
+
+
+# (3, num_angles, 2) landmark indices of each angle's joints, for each side
+_ANGLE_INDICES = np.array([
+    [[_landmark_index(side, joints[i]) for side in SIDES] for joints in ANGLE_JOINTS.values()]
+    for i in range(3)
+], dtype=np.intp)
+# (2, num_joints) landmark indices of the left and right joints
+_LEVEL_INDICES = np.array([[LANDMARK_NAMES[side + joint] for joint in LEVEL_JOINTS] for side in SIDES], dtype=np.intp)
+_ALIGNMENT_INDICES = np.array([[LANDMARK_NAMES[side + joint] for joint in ALIGNMENT_JOINTS] for side in SIDES], dtype=np.intp)
+_ANKLE_INDICES = np.array([LANDMARK_NAMES[side + 'ankle'] for side in SIDES], dtype=np.intp)
+
+
+class PoseFeatures():
+    """ Struct-of-arrays holding every derived quantity the form rules use for num_frames frames.
+    Each named feature is a view into one of a handful of contiguous float32 blocks. Sided features
+    have shape (num_frames, 2) indexed by SIDE_INDEX, the rest have shape (num_frames,). """
+    def __init__(self, num_frames):
+        self.num_frames = num_frames
+        self.angles = np.zeros((num_frames, len(ANGLE_JOINTS), 2), dtype=np.float32)
+        self.angle_visibility = np.zeros((num_frames, len(ANGLE_JOINTS), 2), dtype=np.float32)
+        self.levels = np.zeros((num_frames, len(LEVEL_JOINTS)), dtype=np.float32)
+        self.alignments = np.zeros((num_frames, len(ALIGNMENT_JOINTS)), dtype=np.float32)
+        self.ankle_displacement = np.zeros((num_frames, 2), dtype=np.float32)
+
+        for i, name in enumerate(ANGLE_JOINTS):
+            setattr(self, name, self.angles[:, i])
+            setattr(self, name + '_visibility', self.angle_visibility[:, i])
+        for i, joint in enumerate(LEVEL_JOINTS):
+            setattr(self, joint + '_level', self.levels[:, i])
+        for i, joint in enumerate(ALIGNMENT_JOINTS):
+            setattr(self, joint + '_alignment', self.alignments[:, i])
+
+
+class FeatureExtractor():
+    """ Computes PoseFeatures from a (33, 4) landmark frame or a (T, 33, 4) batch in one vectorised pass.
+
+    Single frames (live analysis) are written into the same PoseFeatures on every call. The previous
+    frame's ankles are remembered so that displacement carries across calls until reset() is called. """
+    def __init__(self):
+        self.features = PoseFeatures(1)
+        self.previous_ankles = None
+
+    def reset(self):
+        self.previous_ankles = None
+
+    def extract(self, landmarks, out=None):
+        landmarks = landmarks.reshape(-1, NUM_LANDMARKS, 4)
+        num_frames = len(landmarks)
+        if out is None:
+            out = self.features if num_frames == 1 else PoseFeatures(num_frames)
+
+        # Angles at the middle joint of each triplet, for both sides at once
+        triplets = landmarks[:, _ANGLE_INDICES]
+        vectors = triplets[:, [0, 2], ..., :VISIBILITY] - triplets[:, 1:2, ..., :VISIBILITY]
+        dot_product = np.einsum('tijk,tijk->tij', vectors[:, 0], vectors[:, 1])
+        magnitudes_squared = np.einsum('tvijk,tvijk->tvij', vectors, vectors)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            cosine = dot_product / np.sqrt(magnitudes_squared[:, 0] * magnitudes_squared[:, 1])
+        np.rad2deg(np.arccos(np.clip(cosine, -1, 1)), out=out.angles)
+        np.round(out.angles, 1, out=out.angles)
+        np.min(triplets[..., VISIBILITY], axis=1, out=out.angle_visibility)
+
+        # Levelness of left and right joints
+        level_pairs = landmarks[:, _LEVEL_INDICES, Y]
+        np.abs(level_pairs[:, 0] - level_pairs[:, 1], out=out.levels)
+
+        # Vertical alignment of joint mid-points with the ankles' mid-point
+        alignment_mid_points = landmarks[:, _ALIGNMENT_INDICES, X].mean(axis=1)
+        ankle_mid_point = landmarks[:, _ANKLE_INDICES, X].mean(axis=1)
+        np.abs(alignment_mid_points - ankle_mid_point[:, None], out=out.alignments)
+
+        # Frame to frame ankle displacement
+        ankles = landmarks[:, _ANKLE_INDICES, :VISIBILITY]
+        previous_ankles = ankles[0] if self.previous_ankles is None else self.previous_ankles
+        out.ankle_displacement[0] = np.linalg.norm(ankles[0] - previous_ankles, axis=-1)
+        out.ankle_displacement[1:] = np.linalg.norm(np.diff(ankles, axis=0), axis=-1)
+        self.previous_ankles = ankles[-1].copy()
+
+        return out
@@ -0,0 +1,201 @@
+from collections import Counter
+
+import numpy as np
+from form_rules import (ASCENT, BOTTOM, DESCENT, FACE_ON, ORIENTATION_INDEX,
+                        PHASE_INDEX, SIDE_ON, SQUAT_RULES, STANDING, FormRules)
+from landmark_frame import (LEFT_HIP, LEFT_SHOULDER, RIGHT_HIP,
+                            RIGHT_SHOULDER, Z)
+from pose_features import FeatureExtractor
+
+
+# State sequences of reps that did and didn't reach the bottom, as the live analyser records them
+FULL_REP_STATES = ['STANDING', 'TRANSITION', 'BOTTOM', 'TRANSITION']
+SHALLOW_REP_STATES = ['STANDING', 'TRANSITION']
+
+def get_runs(mask):
+    """ Returns the start and (exclusive) end indices of each run of True in mask. """
+    edges = np.diff(np.concatenate(([0], mask.astype(np.int8), [0])))
+    return np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+
+
+def moving_average(values, window):
+    """ Centred moving average over an odd window of frames, holding the values at either end. """
+    if window <= 1 or len(values) == 0:
+        return values
+
+    half = window // 2
+    padded = np.concatenate((np.full(half, values[0]), values, np.full(half, values[-1])))
+    cumulative = np.concatenate(([0], np.cumsum(padded, dtype=np.float64)))
+    return ((cumulative[window:] - cumulative[:-window]) / window).astype(np.float32)
+
+
+class RepSegmenter():
+    """ Splits a whole video's landmark track into reps and summarises them, in a few passes over arrays rather than
+    a state machine stepped frame by frame.
+
+    The most visible side's knee angle is interpolated over frames without a confident pose and smoothed over
+    smoothing_window seconds. Each stretch below the standing knee angle that goes down into the transition range is
+    a rep, from the last upright frame before it to the first after it, with its bottom at the smallest knee angle.
+    Stretches without an upright frame between them are one rep. Upright frames are within standing_tolerance
+    degrees of the typical standing knee angle, so that a rep's eccentric and concentric durations cover the whole
+    descent and ascent. Reps that the video starts or ends in are left out. The form rules are evaluated over every frame in one batch,
+    with the phase of each frame taken from the reps, and a rule counts against a rep if it fires on at least
+    min_fault_duration seconds of the rep's frames, so single frame spikes don't.
+
+    thresholds holds the form rules' thresholds (see form_rules.SQUAT_RULES) along with 'standing_knee_angle',
+    'TRANSITION_knee_angle_range', 'bottom_knee_angle' and 'face_on'. """
+    def __init__(
+        self,
+        thresholds,
+        confidence_threshold=0.5,
+        smoothing_window=0.2,
+        min_fault_duration=0.1,
+        standing_tolerance=10
+    ):
+        self.threshold = thresholds
+        self.standing_tolerance = standing_tolerance
+        self.confidence_threshold = confidence_threshold
+        self.smoothing_window = smoothing_window
+        self.min_fault_duration = min_fault_duration
+        self.form_rules = FormRules(SQUAT_RULES, thresholds)
+        self.feature_extractor = FeatureExtractor()
+
+    def segment(self, landmarks, detected, timestamps, fps):
+        """ Returns a dict for each rep in landmarks, the (num_frames, 33, 4) landmark track, where detected is a
+        (num_frames,) mask of the frames a pose was detected in and timestamps their times in seconds. """
+        num_frames = len(landmarks)
+        if num_frames == 0:
+            return []
+
+        landmarks = np.asarray(landmarks, dtype=np.float32)
+        detected = np.asarray(detected, dtype=bool)
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        fps = fps or 30
+        self.feature_extractor.reset()
+        features = self.feature_extractor.extract(landmarks)
+
+        # Follow the side that is most visible across the video
+        visibility = np.minimum(features.knee_angle_visibility, features.hip_angle_visibility)
+        visibility[~detected] = 0
+        side = int(np.argmax(visibility.sum(axis=0)))
+        confident = visibility[:, side] >= self.confidence_threshold
+        if not confident.any():
+            return []
+
+        frames = np.arange(num_frames)
+        knee_angle = np.interp(frames, frames[confident], features.knee_angle[confident, side]).astype(np.float32)
+        knee_angle = moving_average(knee_angle, int(round(self.smoothing_window * fps)) | 1)
+
+        # Stretches away from standing, with their deepest frames
+        starts, ends = get_runs(knee_angle < self.threshold['standing_knee_angle'])
+        if len(starts) == 0 or len(starts) == 1 and starts[0] == 0 and ends[0] == num_frames:
+            return []
+        depths = np.minimum.reduceat(knee_angle, starts)
+        run_of_frame = np.searchsorted(starts, frames, side='right') - 1
+        in_run = (run_of_frame >= 0) & (frames < ends[run_of_frame.clip(0)])
+        deepest = in_run & (knee_angle == depths[run_of_frame.clip(0)])
+        _, first_deepest = np.unique(run_of_frame[deepest], return_index=True)
+        bottoms = frames[deepest][first_deepest]
+
+        # Each rep runs from the last frame the lifter was upright before the stretch to the first one after it
+        standing = knee_angle >= self.threshold['standing_knee_angle']
+        upright = standing & (knee_angle >= np.median(knee_angle[standing]) - self.standing_tolerance)
+        upright_frames = np.flatnonzero(upright)
+        before = np.searchsorted(upright_frames, starts) - 1
+        after = np.searchsorted(upright_frames, ends)
+
+        # Stretches with no upright frame between them are the same rep, from its deepest stretch's bottom
+        starts_rep = np.concatenate(([True], before[1:] != before[:-1]))
+        firsts = np.flatnonzero(starts_rep)
+        lasts = np.concatenate((firsts[1:], [len(before)])) - 1
+        rep_of_run = np.cumsum(starts_rep) - 1
+        rep_depths = np.minimum.reduceat(depths, firsts)
+        deepest_runs = np.flatnonzero(depths == rep_depths[rep_of_run])
+        _, first_deepest_run = np.unique(rep_of_run[deepest_runs], return_index=True)
+        bottoms = bottoms[deepest_runs[first_deepest_run]]
+        depths, before, after = rep_depths, before[firsts], after[lasts]
+
+        is_rep = (
+            (depths <= self.threshold['TRANSITION_knee_angle_range'][1])
+            & (before >= 0)
+            & (after < len(upright_frames))
+        )
+        starts = upright_frames[before[is_rep]]
+        ends = upright_frames[after[is_rep]]
+        bottoms, depths = bottoms[is_rep], depths[is_rep]
+        if len(starts) == 0:
+            return []
+
+        # Phase of every frame, for the form rules
+        rep_of_frame = np.searchsorted(starts, frames, side='right') - 1
+        rep_index = rep_of_frame.clip(0)
+        in_rep = (rep_of_frame >= 0) & (frames <= ends[rep_index])
+        phase = np.full(num_frames, PHASE_INDEX[STANDING], dtype=np.intp)
+        phase[in_rep & (frames <= bottoms[rep_index])] = PHASE_INDEX[DESCENT]
+        phase[in_rep & (frames > bottoms[rep_index])] = PHASE_INDEX[ASCENT]
+        phase[in_rep & (knee_angle <= self.threshold['bottom_knee_angle'])] = PHASE_INDEX[BOTTOM]
+
+        orientation = self.__get_orientation(landmarks, confident)
+        fired = self.form_rules.evaluate(features, side, phase, orientation)
+        fired &= (confident & in_rep)[:, None] & self.form_rules.counts_against_rep
+
+        # Frames each rule fired on in each rep, from the running totals at either end of the rep
+        fired_so_far = np.concatenate((np.zeros((1, fired.shape[1]), dtype=np.int64), np.cumsum(fired, axis=0)))
+        fault_frames = fired_so_far[ends + 1] - fired_so_far[starts]
+        faults = fault_frames >= max(1, int(round(self.min_fault_duration * fps)))
+
+        reached_bottom = depths <= self.threshold['bottom_knee_angle']
+        return [
+            {
+                'rep': i + 1,
+                'startFrame': int(start),
+                'bottomFrame': int(bottom),
+                'endFrame': int(end),
+                'eccentricDuration': float(timestamps[bottom] - timestamps[start]),
+                'concentricDuration': float(timestamps[end] - timestamps[bottom]),
+                'depth': round(float(depth), 1),
+                'states': list(FULL_REP_STATES if bottom_reached else SHALLOW_REP_STATES),
+                'mistakes': self.form_rules.get_summaries(rep_faults),
+            }
+            for i, (start, bottom, end, depth, bottom_reached, rep_faults) in enumerate(
+                zip(starts, bottoms, ends, depths, reached_bottom, faults)
+            )
+        ]
+
+    def get_summary(self, landmarks, detected, timestamps, fps):
+        """ Returns the final summary of the set in landmarks (see segment()), with each rep's details under reps. """
+        reps = self.segment(landmarks, detected, timestamps, fps)
+        good_reps = sum(not rep['mistakes'] for rep in reps)
+
+        return {
+            'goodReps': good_reps,
+            'badReps': len(reps) - good_reps,
+            'mistakesMade': [{'rep': rep['rep'], 'mistakes': rep['mistakes']} for rep in reps],
+            'stateSequences': [
+                {'durations': (rep['eccentricDuration'], rep['concentricDuration']), 'states': rep['states']}
+                for rep in reps
+            ],
+            'finalComments': self.__get_final_comments(reps, good_reps),
+            'reps': reps,
+        }
+
+    def __get_orientation(self, landmarks, confident):
+        """ The camera orientation most of the confident frames were filmed from. """
+        depth_difference = np.maximum(
+            np.abs(landmarks[confident, LEFT_SHOULDER, Z] - landmarks[confident, RIGHT_SHOULDER, Z]),
+            np.abs(landmarks[confident, LEFT_HIP, Z] - landmarks[confident, RIGHT_HIP, Z])
+        )
+        face_on = depth_difference < self.threshold['face_on']
+        return ORIENTATION_INDEX[FACE_ON if 2 * face_on.sum() > len(face_on) else SIDE_ON]
+
+    def __get_final_comments(self, reps, good_reps):
+        if not reps:
+            return 'No reps were detected.'
+        if good_reps == len(reps):
+            return 'Great job! No mistakes were detected during the set.'
+
+        mistake, count = Counter(mistake for rep in reps for mistake in rep['mistakes']).most_common(1)[0]
+        return (
+            f'{good_reps} of {len(reps)} reps were good. '
+            f'The most common mistake was: {mistake} ({count} rep{"s" if count > 1 else ""}).'
+        )
@@ -1,43 +1,231 @@
 import base64
+import binascii
+import json
 import os
 import socket
 import tempfile
+import time
 
-from flask import Flask, jsonify, request
-from squat_analyser import SquatFormAnalyser
+from flask import Flask, Response, jsonify, request, send_file
+from job_queue import (DONE, LANDMARKS, OUTPUTS, VIDEO, VIDEO_CODECS,
+                       AnalysisJobQueue, get_result_paths, get_track_paths)
+from metrics import MetricsRegistry, PipelineMetrics
 
 app = Flask(__name__)
 
-form_analyser = SquatFormAnalyser(model_complexity=2)
+num_workers = 2  # Worker processes, each with its own warm analyser
+processes_per_job = 1  # Processes each worker splits a video's pose estimation across
+model_complexity = 2
+upload_chunk_size = 1024 * 1024
+results_dir = os.path.join(tempfile.gettempdir(), 'squat_tracker_results')
+result_time_to_live = 60 * 60  # Seconds to keep processed videos around for the client to download
+landmark_cache_dir = os.path.join(tempfile.gettempdir(), 'squat_tracker_landmark_cache')  # None to disable
+landmark_cache_size = 2 * 1024 * 1024 * 1024  # Bytes
+frame_stride = 1  # Run pose inference on every nth frame, interpolating landmarks in between
+adaptive_frame_stride = True  # Run pose inference on every frame during reps regardless of frame_stride
+frame_interpolation = 'linear'  # 'linear' or 'spline'
+landmark_filter = 'one_euro'  # Smooths landmarks over time, 'one_euro', 'kalman' or None
+min_output_size = 64  # Smallest max_size a client can ask for the processed video to be scaled to
+os.makedirs(results_dir, exist_ok=True)
+
+metrics_registry = MetricsRegistry()
+job_queue = AnalysisJobQueue(
+    results_dir,
+    num_workers=num_workers,
+    model_complexity=model_complexity,
+    processes_per_job=processes_per_job,
+    landmark_cache_dir=landmark_cache_dir,
+    landmark_cache_size=landmark_cache_size,
+    frame_stride=frame_stride,
+    adaptive_frame_stride=adaptive_frame_stride,
+    frame_interpolation=frame_interpolation,
+    landmark_filter=landmark_filter,
+    job_time_to_live=result_time_to_live,
+    metrics=PipelineMetrics(metrics_registry)
+)
+metrics_registry.gauge('job_queue_depth', 'Uploaded videos waiting for a worker', job_queue.get_queue_depth)
+metrics_registry.gauge('jobs_processing', 'Videos currently being analysed', job_queue.get_num_processing)
+metrics_registry.gauge('workers', 'Worker processes analysing videos', lambda: num_workers)
+metrics_registry.gauge('model_complexity', 'MediaPipe pose model complexity in use', lambda: model_complexity)
+
+
+def save_request_body(file):
+    """ Streams the request body into file in fixed-size chunks, returning the number of bytes written.
+    Raw video bodies (video/* or application/octet-stream) are copied as is. Anything else is treated as
+    base64, as sent by older clients, and decoded a chunk at a time. """
+    content_type = request.mimetype or ''
+    if content_type.startswith('video/') or content_type == 'application/octet-stream':
+        decode = None
+    else:
+        decode = base64.b64decode
+
+    bytes_written = 0
+    remainder = b''
+    while True:
+        chunk = request.stream.read(upload_chunk_size)
+        if not chunk:
+            break
+
+        if decode is not None:
+            # Only decode whole groups of 4 base64 characters, carrying the rest into the next chunk
+            chunk = remainder + b''.join(chunk.split())
+            decodable_length = len(chunk) - len(chunk) % 4
+            chunk, remainder = decode(chunk[:decodable_length], validate=True), chunk[decodable_length:]
+
+        file.write(chunk)
+        bytes_written += len(chunk)
+
+    if remainder:
+        raise binascii.Error('Incomplete base64 data')
+
+    return bytes_written
+
+
+def get_output_options():
+    """ Reads what to output for an upload from its query parameters, returning them as keyword args for
+    AnalysisJobQueue.submit() or, if any are not valid, an error message.
+
+    output: one of OUTPUTS, by default the annotated video
+    max_size: the longest side, in pixels, to scale the annotated video down to
+    codec: one of VIDEO_CODECS to encode the annotated video with, by default mp4v """
+    output = request.args.get('output', VIDEO)
+    if output not in OUTPUTS:
+        return None, f'output must be one of {", ".join(OUTPUTS)}'
+
+    codec = request.args.get('codec', 'mp4v')
+    if codec not in VIDEO_CODECS:
+        return None, f'codec must be one of {", ".join(VIDEO_CODECS)}'
+
+    max_size = request.args.get('max_size')
+    if max_size is not None:
+        if not max_size.isdigit() or int(max_size) < min_output_size:
+            return None, f'max_size must be a whole number of pixels, at least {min_output_size}'
+        max_size = int(max_size)
+
+    return {'output': output, 'max_size': max_size, 'codec': codec}, None
+
+
+def remove_expired_results():
+    for file_name in os.listdir(results_dir):
+        path = os.path.join(results_dir, file_name)
+        try:
+            if time.time() - os.path.getmtime(path) > result_time_to_live:
+                os.unlink(path)
+        except FileNotFoundError:
+            pass
+    job_queue.remove_expired_jobs()
+
 
 @app.route('/upload_video', methods=['POST'])
 def upload_video():
+    output_options, error = get_output_options()
+    if error is not None:
+        return error, 400
+
     print('Receiving video from client...')
-    video_base64 = request.get_data()  # Get the base64 video data from the request
-    if not video_base64:
-        return 'No video file found', 400
-    print('Processing video from client...')
+    remove_expired_results()
 
-    # Save the uploaded video to a temporary file
+    # Save the uploaded video to a temporary file without holding it in memory
     with tempfile.NamedTemporaryFile(delete=False, suffix=".mp4") as tmp_file:
-        video_data = base64.b64decode(video_base64)
-        with open(tmp_file.name, 'wb') as f:
-            f.write(video_data)
+        try:
+            bytes_received = save_request_body(tmp_file)
+        except (binascii.Error, ValueError):
+            bytes_received = None
+
+    if not bytes_received:
+        os.unlink(tmp_file.name)
+        if bytes_received is None:
+            return 'Video data is not valid base64', 400
+        return 'No video file found', 400
+
+    # Queue the video for a worker to process, which deletes the upload when done
+    job_id = job_queue.submit(tmp_file.name, **output_options)
+    print(f'Queued video from client as job {job_id}.')
+
+    return jsonify({'job_id': job_id, 'status_url': f'/jobs/{job_id}'}), 202
+
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job_status(job_id):
+    """ Reports a job's status (queued, processing, done or failed) and its progress in frames.
+    Once done, the response also holds the final summary and, depending on the job's output, where to download the
+    processed video or landmark track. """
+    job = job_queue.get_job(job_id)
+    if job is None:
+        return 'Job not found', 404
+
+    del job['updated']
+    if job['status'] == DONE:
+        if job['output'] == VIDEO:
+            job['processed_video_url'] = f'/processed_video/{job_id}'
+        elif job['output'] == LANDMARKS:
+            job['landmark_track_url'] = f'/landmark_track/{job_id}'
+
+    return jsonify(job)
+
+
+@app.route('/processed_video/<video_id>', methods=['GET'])
+def get_processed_video(video_id):
+    """ Streams the processed video from disk, supporting HTTP Range requests. """
+    video_path, _ = get_result_paths(results_dir, os.path.basename(video_id))
+    if not os.path.exists(video_path):
+        return 'Processed video not found', 404
+
+    return send_file(video_path, mimetype='video/mp4', conditional=True)
+
+
+@app.route('/landmark_track/<video_id>', methods=['GET'])
+def get_landmark_track(video_id):
+    """ Sends the landmark track as JSON or, with ?format=binary, as binary (see LandmarkTrack). """
+    track_format = request.args.get('format', 'json')
+    if track_format not in ['json', 'binary']:
+        return 'format must be json or binary', 400
+
+    json_path, binary_path = get_track_paths(results_dir, os.path.basename(video_id))
+    if track_format == 'binary':
+        path, mimetype = binary_path, 'application/octet-stream'
+    else:
+        path, mimetype = json_path, 'application/json'
+    if not os.path.exists(path):
+        return 'Landmark track not found', 404
+
+    return send_file(path, mimetype=mimetype, conditional=True)
+
+
+@app.route('/final_summary/<video_id>', methods=['GET'])
+def get_final_summary(video_id):
+    _, summary_path = get_result_paths(results_dir, os.path.basename(video_id))
+    if not os.path.exists(summary_path):
+        return 'Final summary not found', 404
+
+    with open(summary_path) as f:
+        return jsonify(json.load(f))
+
 
-        # Process the video file using MediaPipeDetector (or any other processing)
-        temp_proc_file, final_summary = form_analyser.analyse(tmp_file.name)
+@app.route('/processed_video/<video_id>', methods=['DELETE'])
+def delete_processed_video(video_id):
+    video_id = os.path.basename(video_id)
+    paths = [
+        path for path in get_result_paths(results_dir, video_id) + get_track_paths(results_dir, video_id)
+        if os.path.exists(path)
+    ]
+    if not paths:
+        return 'Processed video not found', 404
 
-    # Encode the processed video
-    with open(temp_proc_file.name, 'rb') as videoFile:
-        base64Video = base64.b64encode(videoFile.read()).decode('utf-8')
+    for path in paths:
+        os.unlink(path)
+    return '', 204
 
-    temp_proc_file.close()
-    os.unlink(temp_proc_file.name)
 
-    print('Done.')
-    return jsonify({"processed_video": base64Video, "final_summary": final_summary})
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    return Response(metrics_registry.render(), mimetype='text/plain; version=0.0.4')
 
 
 if __name__ == '__main__':
+    job_queue.start()
     ip = socket.gethostbyname(socket.gethostname())
-    app.run(host=ip, port=5000, threaded=True)
+    try:
+        app.run(host=ip, port=5000, threaded=True)
+    finally:
+        job_queue.shutdown()
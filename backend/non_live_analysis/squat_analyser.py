@@ -1,192 +1,416 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
 import cv2
 import numpy as np
+from analysis_stream import (NOT_GIVEN, FeedbackEvent, PoseEstimate,
+                             attach_landmarks, iterate_in_thread, read_frames,
+                             split_item)
+from landmark_frame import (ANKLE, HIP, KNEE, LANDMARK_NAMES, LEFT_ANKLE,
+                            LEFT_SHOULDER, NUM_LANDMARKS, RIGHT_ANKLE,
+                            RIGHT_SHOULDER, SHOULDER, X, Y, LandmarkFrame)
+from landmark_cache import hash_video
 from mediapipe_estimator import MediaPipeDetector
+from parallel_analysis import estimate_landmarks_in_parallel
+from pose_features import SIDE_INDEX, FeatureExtractor
 from form_analyser import MediaPipe_To_Form_Interpreter
+from frame_preprocessor import FramePreprocessor
+from frame_stride import FrameStride
+from rep_segmenter import RepSegmenter
+from frame_renderer import LANDMARKS, LINE, RESIZE, TEXT, FrameRenderer
+from stage_timer import INFERENCE, INTERPRETATION, PREPROCESS
 import tempfile
-import mediapipe as mp
+import time
+from collections import deque
+
+def get_output_resolution(width, height, output_size=None):
+    """ Returns the (width, height) of a width x height video scaled down so that its longest side is at most
+    output_size, keeping it even for the encoder. """
+    if output_size is None or max(width, height) <= output_size:
+        return width, height
+
+    scale = output_size / max(width, height)
+    return max(2, round(width * scale / 2) * 2), max(2, round(height * scale / 2) * 2)
+
+
+def scale_progress(progress_callback, start, share):
+    """ Returns a progress callback for a part of a job that starts start of the way through it and makes up share
+    of it, which reports to progress_callback in frames of the whole job. """
+    def report_progress(frames_done, total_frames):
+        progress_callback(int(total_frames * start + frames_done * share), total_frames)
+    return report_progress
+
 
 class SquatFormAnalyser():
-    def __init__(self, model_complexity, confidence_threshold=0.5):
+    def __init__(self, model_complexity, confidence_threshold=0.5, num_processes=1, warm_up_frames=30, landmark_cache=None, stage_timer=None, preprocessor=None, frame_stride=None, landmark_filter=None):
+        """ With num_processes > 1, pose estimation is split into that many keyframe-aligned segments of the video,
+        each run in its own process with its own MediaPipe graph starting warm_up_frames before the segment, and the
+        same estimator, preprocessor and frame stride settings.
+        If a LandmarkCache is given, videos whose landmarks are cached skip pose estimation altogether, and decoding too
+        unless they are rendered.
+        If given, stage_timer records how long each frame spends in each stage.
+        preprocessor (a FramePreprocessor by default) prepares frames for pose estimation, and frame_stride (a FrameStride,
+        by default with a stride of 1) decides which frames it is run on, the rest being interpolated.
+        If given, landmark_filter (a LandmarkFilter) smooths the estimated landmarks over time. """
+        self.model_complexity = model_complexity
+        self.stage_timer = stage_timer
+        self.landmark_cache = landmark_cache
         self.confidence_threshold = confidence_threshold
-        self.mp_draw = mp.solutions.drawing_utils
-        self.mp_drawing_spec = mp.solutions.drawing_styles.get_default_pose_landmarks_style()
+        self.num_processes = num_processes
+        self.warm_up_frames = warm_up_frames
+        self.process_pool = None
         self.pose_estimator = MediaPipeDetector(model_complexity=model_complexity)
+        self.preprocessor = FramePreprocessor() if preprocessor is None else preprocessor
+        self.frame_stride = FrameStride() if frame_stride is None else frame_stride
+        self.landmark_filter = landmark_filter
+        self.landmark_frame = LandmarkFrame()
         self.form_analyser = MediaPipe_To_Form_Interpreter(confidence_threshold=confidence_threshold)
+        self.feature_extractor = FeatureExtractor()
+        # Shared by the overlay, rep segmentation and the form rules (see form_rules.SQUAT_RULES), so that each
+        # frame's feedback agrees with the final summary
         self.threshold = {
-            'hips_vertically_aligned': 0.05,
-            'shoulders_vertically_aligned': 0.05,
-            'shoulders_level': 0.05
+            'standing_knee_angle': 62,  # Below this the lifter is descending or at the bottom of a rep
+            'TRANSITION_knee_angle_range': (28, 55),
+            'bottom_knee_angle': 26,
+            'face_on': 0.12,
+            'collapsed_torso_knee_angle': 35,
+            'safe_hip_angle': 62,
+            'knee_level': 0.05,
+            'shoulder_level': 0.05,
+            'hip_level': 0.05,
+            'hip_vertically_aligned': 0.04,
+            'shoulder_vertically_aligned': 0.075,
+            'spine_neutral': 80,
         }
+        self.rep_segmenter = RepSegmenter(self.threshold, confidence_threshold=confidence_threshold)
 
-    def analyse(self, video_path, show_output=False):
+    def analyse(self, video_path, show_output=False, progress_callback=None, progress_interval=30, render_video=True, output_size=None, codec='mp4v', track=None):
+        """ Analyses the video at video_path, returning the annotated video's temporary file and the final summary.
+        If given, progress_callback(frames_done, total_frames) is called every progress_interval frames and once at the end.
+        The annotated video is drawn and encoded by a FrameRenderer on its own thread, with the given fourcc codec and,
+        if output_size is given, scaled down so that its longest side is at most output_size pixels. Without
+        render_video, nothing is drawn or encoded and the returned file is None.
+        If given, each frame's landmarks and feedback messages are added to track (a LandmarkTrack). """
         cap = cv2.VideoCapture(video_path)
-
-        temp_video_file = tempfile.NamedTemporaryFile(delete=False, suffix=".mp4")
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
         width  = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
         height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-        out = cv2.VideoWriter(
-            temp_video_file.name,
-            cv2.VideoWriter_fourcc(*'mp4v'),
-            cap.get(cv2.CAP_PROP_FPS),
-            (width, height)
-        )
-
-        final_summary = {}
-        while True:
-            success, frame = cap.read()
-            if not success:
-                break
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        output_resolution = get_output_resolution(width, height, output_size)
+        if track is not None:
+            track.fps = fps
 
-            # Get landmarks
-            pose_landmarks = self.pose_estimator.make_prediction(frame)
-
-            message_to_display = []
-            if pose_landmarks is not None:
-                # Draw landmarks
-                self.mp_draw.draw_landmarks(
-                    frame,
-                    pose_landmarks,
-                    mp.solutions.pose.POSE_CONNECTIONS,
-                    landmark_drawing_spec=self.mp_drawing_spec
+        temp_video_file, renderer = None, None
+        if render_video or show_output:
+            out = None
+            if render_video:
+                temp_video_file = tempfile.NamedTemporaryFile(delete=False, suffix=".mp4")
+                out = cv2.VideoWriter(
+                    temp_video_file.name,
+                    cv2.VideoWriter_fourcc(*codec),
+                    fps,
+                    output_resolution
                 )
+            renderer = FrameRenderer(
+                out,
+                window_name='Video' if show_output else None,
+                stage_timer=self.stage_timer,
+                recycle_frames=True
+            ).start()
 
-                # Get joint dictionaries
-                joints_dict = self.form_analyser.get_joints_dict(pose_landmarks)
-                most_visible_side = self.form_analyser.get_most_visible_side(joints_dict)
-                most_visible_joints_dict = {
-                    joint_name: joints_dict[most_visible_side + joint_name]
-                    for joint_name in self.form_analyser.main_joints
+        landmark_track, detected = None, None
+        if self.landmark_cache is not None:
+            cache_key = self.landmark_cache.get_key(
+                hash_video(video_path),
+                {
+                    **self.pose_estimator.params,
+                    **self.preprocessor.params,
+                    **self.frame_stride.params,
+                    **({} if self.landmark_filter is None else self.landmark_filter.params)
                 }
-                mv_toe, mv_ankle, mv_knee, mv_hip, mv_shoulder, mv_elbow = [most_visible_joints_dict[joint] for joint in ['foot_index', 'ankle', 'knee', 'hip', 'shoulder', 'elbow']]
-
-                # Calculate important angles
-                mv_ankle_angle = self.__get_angle_if_confident([mv_toe, mv_ankle, mv_knee])
-                mv_hip_angle = self.__get_angle_if_confident([mv_ankle, mv_knee, mv_hip])
-                mv_knee_angle = self.__get_angle_if_confident([mv_knee, mv_hip, mv_shoulder])
-                mv_shoulder_angle = self.__get_angle_if_confident([mv_hip, mv_shoulder, mv_elbow])
-
-                # Draw joint angles
-                for joint, joint_angle in [
-                    (mv_ankle, mv_ankle_angle),
-                    (mv_knee, mv_hip_angle),
-                    (mv_hip, mv_knee_angle),
-                    (mv_shoulder, mv_shoulder_angle)
-                ]:
-                    if joint_angle is not None:
-                        self.__draw_angle_at_joint(frame, joint, joint_angle)
-
-                # Draw vertical alignment indicators if out of alignment
-                left_ankle, right_ankle = joints_dict['left_ankle'], joints_dict['right_ankle']
-                if self.form_analyser.check_confidence(self.confidence_threshold, [left_ankle, right_ankle]):
-                    ankle_mid_point = ((left_ankle.x + right_ankle.x) / 2, (left_ankle.y + right_ankle.y) / 2)
-                    self.__draw_vertical_at_point(frame, np.multiply(ankle_mid_point, frame.shape[:2][::-1]).astype(int), (255, 0, 0))
-
-                    for left_joint, right_joint, threshold, joint_name in [[joints_dict['left_' + j], joints_dict['right_' + j], th, j] for j, th in [
-                        ('shoulder', self.threshold['shoulders_vertically_aligned']),
-                        ('hip', self.threshold['hips_vertically_aligned'])
-                    ]]:
-                        if self.form_analyser.check_confidence(self.confidence_threshold, [left_joint, right_joint]):
-                            mid_point = ((left_joint.x + right_joint.x) / 2, (left_joint.y + right_joint.y) / 2)
-                            if abs(ankle_mid_point[0] - mid_point[0]) < threshold:
-                                colour = (0, 255, 0)
-                            else:
-                                colour = (0, 0, 255)
-                                message_to_display.append(f'{joint_name.capitalize()}s are not vertically aligned')
-
-                            self.__draw_vertical_at_point(frame, np.multiply(mid_point, frame.shape[:2][::-1]).astype(int), colour)
-
-                # Draw levelness indicators if not level
-                left_shoulder, right_shoulder = joints_dict['left_shoulder'], joints_dict['right_shoulder']
-                if self.form_analyser.check_confidence(self.confidence_threshold, [left_shoulder, right_shoulder]):
-                    joints_are_level = self.form_analyser.check_joints_are_level(left_shoulder, right_shoulder, self.threshold['shoulders_level'])
-                    if joints_are_level:
-                        colour = (0, 255, 0)
-                    else:
-                        colour = (0, 0, 255)
-                        message_to_display.append('Shoulders are not level')
-
-                    colour = (0, 255, 0) if joints_are_level else (0, 0, 255)
-                    self.__draw_levelness_line_at_points(frame, left_shoulder, right_shoulder, colour)
-
-
-                # TODO: form analysis...
-            else:
-                message_to_display.append('User not detected')
+            )
+            cached_track = self.landmark_cache.load(cache_key)
+            if cached_track is not None:
+                landmark_track, timestamps, detected = cached_track
+
+        # Otherwise estimate the whole landmark track up front in parallel, which is reported as the first half of the
+        # progress and streaming the track below as the second, so that it only ever counts up
+        report_progress = progress_callback
+        if landmark_track is None and self.num_processes > 1:
+            landmark_track, timestamps, detected = estimate_landmarks_in_parallel(
+                self.__get_process_pool(),
+                video_path,
+                self.num_processes,
+                self.pose_estimator.params,
+                self.preprocessor.params,
+                self.frame_stride.params,
+                self.threshold['standing_knee_angle'],
+                warm_up_frames=self.warm_up_frames,
+                progress_callback=None if progress_callback is None else scale_progress(progress_callback, 0, 0.5)
+            )
+            if progress_callback is not None:
+                report_progress = scale_progress(progress_callback, 0.5, 0.5)
+            if self.landmark_filter is not None:
+                self.landmark_filter.filter_track(landmark_track, detected, timestamps)
+            if self.landmark_cache is not None:
+                self.landmark_cache.store(cache_key, landmark_track, timestamps, detected)
 
-            for i, msg in enumerate(message_to_display):
-                self.__draw_text(frame, str(msg), pos=(0, (i+1)*35))
+        # Stream the video's frames, paired with their landmarks if they are already known. With nothing to draw
+        # them on, known landmarks are streamed alone and the video isn't decoded at all
+        spare_frames = deque() if renderer is None else renderer.spare_frames
+        if landmark_track is not None and renderer is None:
+            frames = zip(timestamps, (lm if is_detected else None for lm, is_detected in zip(landmark_track, detected)))
+        else:
+            frames = read_frames(cap, buffers=spare_frames, stage_timer=self.stage_timer)
+            if landmark_track is not None:
+                frames = attach_landmarks(frames, landmark_track, detected, timestamps)
+        events = self.analyse_stream(frames)
+        if renderer is not None:
+            events = self.render(events, renderer, output_resolution)
 
-            if show_output:
-                cv2.imshow('Video', frame)
-                if cv2.waitKey(1) == ord('q'):
-                    break
+        # Landmarks estimated frame by frame are recorded for the cache
+        recorded_landmarks, recorded_timestamps = [], []
+        video_ended = True
+        frames_done = 0
+        for event in events:
+            if landmark_track is None:
+                recorded_landmarks.append(event.landmarks)
+                recorded_timestamps.append(event.timestamp)
+            if track is not None:
+                track.add_frame(event.timestamp, event.landmarks, event.feedback)
+            if renderer is None and event.frame is not None:
+                # Decode into the frame again, now that it is done with
+                spare_frames.append(event.frame)
 
-            out.write(frame)
+            frames_done += 1
+            if report_progress is not None and frames_done % progress_interval == 0:
+                report_progress(frames_done, total_frames)
+
+            if renderer is not None and renderer.quit_requested.is_set():
+                video_ended = False
+                events.close()
+                break
+
+        if progress_callback is not None:
+            progress_callback(frames_done, max(total_frames, frames_done))
 
-        cv2.destroyAllWindows()
         cap.release()
-        out.release()
-
-        # TODO: Create final summary (test data for now)
-        final_summary = {
-            'goodReps': 0,
-            'badReps': 0,
-            'mistakesMade': [],
-            'stateSequences': [],
-            'finalComments': 'NOT IMPLEMENTED'
-        }
+        if renderer is not None:
+            renderer.close()
+            if renderer.out is not None:
+                renderer.out.release()
+
+        if landmark_track is None:
+            landmark_track = np.stack(
+                [np.zeros((NUM_LANDMARKS, 4), dtype=np.float32) if lm is None else lm for lm in recorded_landmarks]
+            ) if recorded_landmarks else np.zeros((0, NUM_LANDMARKS, 4), dtype=np.float32)
+            detected = [lm is not None for lm in recorded_landmarks]
+            timestamps = recorded_timestamps
+            if self.landmark_cache is not None and video_ended and recorded_landmarks:
+                self.landmark_cache.store(cache_key, landmark_track, timestamps, detected)
+
+        # Segment the whole landmark track into reps at once, now that it is known
+        final_summary = self.rep_segmenter.get_summary(landmark_track, detected, timestamps, fps)
 
         return temp_video_file, final_summary
 
-    def __get_angle_if_confident(self, angles):
-        if self.form_analyser.check_confidence(self.confidence_threshold, angles):
-            return self.form_analyser.calc_3D_angle(*angles)
+    def analyse_stream(self, frames):
+        """ Lazily analyses a stream of frames from a single video, yielding a FeedbackEvent (see analysis_stream) with
+        the feedback messages and overlay of each. Items of frames are (timestamp, frame), (timestamp, landmarks) for
+        landmarks already estimated, as a (33, 4) array or None if no pose was detected, or (timestamp, frame,
+        landmarks). frames can be any iterable, e.g. read_frames(cap) or a landmark track, or an async iterable, in
+        which case an async generator is returned that analyses them on a thread of its own.
+        The stream is made of the estimate_landmarks() and interpret() stages, which render() can be composed onto.
+        Events are yielded in order, but between keyframes (see FrameStride) only once the next keyframe is in. """
+        if hasattr(frames, '__aiter__'):
+            return iterate_in_thread(self.analyse_stream, frames)
+
+        self.form_analyser.initialise_state()
+        self.feature_extractor.reset()
+        self.preprocessor.reset()
+        self.frame_stride.reset()
+        if self.landmark_filter is not None:
+            self.landmark_filter.reset()
+        return self.interpret(self.estimate_landmarks(frames))
+
+    def estimate_landmarks(self, frames):
+        """ Pose estimation stage: yields a PoseEstimate for each stream item (see analyse_stream()) of frames. Pose
+        estimation is only run on keyframes, and the landmarks of the frames between them interpolated. """
+        frame_index = -1
+        # Frames between keyframes wait here for the next keyframe so that their landmarks can be interpolated
+        pending_frames = []
+        items = iter(frames)
+        while True:
+            item = next(items, None)
+            if item is not None:
+                frame_index += 1
+                ingest_time = time.time()
+                stage_start = time.perf_counter()
+                timestamp, frame, landmarks = split_item(item)
+                if landmarks is not NOT_GIVEN:
+                    landmarks = None if landmarks is None else np.asarray(landmarks, dtype=np.float32)
+                    if self.stage_timer is not None:
+                        self.stage_timer.record_since(INFERENCE, stage_start)
+                    yield PoseEstimate(timestamp, frame, landmarks, ingest_time, time.time())
+                    continue
+                if not self.frame_stride.is_keyframe(frame_index):
+                    pending_frames.append((timestamp, frame, ingest_time))
+                    continue
+            elif pending_frames:
+                # Make the last frame a keyframe so the frames waiting on it can be filled in
+                timestamp, frame, ingest_time = pending_frames.pop()
+                stage_start = time.perf_counter()
+            else:
+                return
+
+            image = self.preprocessor.prepare(frame)
+            if self.stage_timer is not None:
+                stage_start = self.stage_timer.record_since(PREPROCESS, stage_start)
+
+            # Get landmarks, normalised to the whole frame
+            pose_landmarks = self.preprocessor.map_to_frame(self.pose_estimator.make_prediction(image))
+            keyframe_landmarks = None if pose_landmarks is None else self.landmark_frame.fill(pose_landmarks).landmarks
+            if keyframe_landmarks is not None and self.landmark_filter is not None:
+                keyframe_landmarks = self.landmark_filter.filter(keyframe_landmarks, timestamp)
+            # Passed on as the frame stride's own copy, as the buffers above are refilled for the next keyframe
+            keyframe_landmarks = self.frame_stride.add_keyframe(frame_index, keyframe_landmarks)
+            inferred_at = time.time()
+            if self.stage_timer is not None:
+                self.stage_timer.record_since(INFERENCE, stage_start)
+
+            for (pending_timestamp, pending_frame, pending_ingest_time), landmarks in zip(
+                pending_frames,
+                self.frame_stride.interpolate()
+            ):
+                yield PoseEstimate(pending_timestamp, pending_frame, landmarks, pending_ingest_time, inferred_at)
+            yield PoseEstimate(timestamp, frame, keyframe_landmarks, ingest_time, inferred_at)
+            pending_frames = []
+
+    def interpret(self, estimates):
+        """ Interpretation stage: yields a FeedbackEvent for each PoseEstimate of estimates, with its feedback
+        messages and the overlay for drawing it. """
+        for index, estimate in enumerate(estimates):
+            # Streams of landmarks alone have nothing to draw on, but the feedback comes with the overlay
+            frame_shape = (1, 1) if estimate.frame is None else estimate.frame.shape
+            overlay, feedback = self.__get_overlay(frame_shape, estimate.landmarks)
+            if estimate.frame is None:
+                overlay = None
+            yield FeedbackEvent(index, estimate.timestamp, estimate.frame, estimate.landmarks, feedback, overlay)
+
+    def render(self, events, renderer, output_resolution=None):
+        """ Rendering stage: submits each FeedbackEvent's frame and overlay to renderer (a FrameRenderer), scaled to
+        output_resolution if given, passing the events on. """
+        for event in events:
+            if event.frame is not None:
+                overlay = event.overlay
+                if output_resolution is not None and output_resolution != (event.frame.shape[1], event.frame.shape[0]):
+                    overlay = overlay + [(RESIZE, output_resolution)]
+                renderer.submit(event.frame, overlay)
+            yield event
+
+    def __get_overlay(self, frame_shape, landmarks):
+        """ Interprets the frame's landmarks and returns the overlay instructions (see frame_renderer) for drawing
+        them and the form indicators on the frame, along with the frame's feedback messages. """
+        stage_start = time.perf_counter()
+        if self.stage_timer is not None:
+            self.stage_timer.record_frame(landmarks is None)
+
+        overlay = []
+        message_to_display = []
+        if landmarks is not None:
+            # Get the landmarks' features and the most visible side's main joints
+            features = self.feature_extractor.extract(landmarks)
+            most_visible_side = self.form_analyser.get_most_visible_side(landmarks)
+            most_visible_joints = self.form_analyser.get_main_joints(landmarks, most_visible_side)
+            mv_ankle, mv_knee, mv_hip, mv_shoulder = most_visible_joints[[ANKLE, KNEE, HIP, SHOULDER]]
+            side = SIDE_INDEX[most_visible_side]
+            # Run inference on every frame while descending and at the bottom of a rep
+            self.frame_stride.set_fast_phase(features.knee_angle[0, side] < self.threshold['standing_knee_angle'])
+
+            # Draw landmarks
+            overlay.append((LANDMARKS, landmarks))
+
+            # Draw joint angles
+            for joint, joint_angle, angle_visibility in [
+                (mv_ankle, features.ankle_angle[0, side], features.ankle_angle_visibility[0, side]),
+                (mv_knee, features.knee_angle[0, side], features.knee_angle_visibility[0, side]),
+                (mv_hip, features.hip_angle[0, side], features.hip_angle_visibility[0, side]),
+                (mv_shoulder, features.shoulder_angle[0, side], features.shoulder_angle_visibility[0, side])
+            ]:
+                if angle_visibility >= self.confidence_threshold:
+                    overlay.append(self.__get_angle_at_joint(frame_shape, joint, joint_angle))
+
+            # Draw vertical alignment indicators if out of alignment
+            ankles = landmarks[[LEFT_ANKLE, RIGHT_ANKLE]]
+            if self.form_analyser.check_confidence(self.confidence_threshold, ankles):
+                ankle_mid_point = ankles[:, X:Y + 1].mean(axis=0)
+                overlay.append(self.__get_vertical_at_point(np.multiply(ankle_mid_point, frame_shape[:2][::-1]).astype(int), (255, 0, 0)))
+
+                for joints, alignment_offset, threshold, joint_name in [[landmarks[[LANDMARK_NAMES['left_' + j], LANDMARK_NAMES['right_' + j]]], offset[0], th, j] for j, offset, th in [
+                    ('shoulder', features.shoulder_alignment, self.threshold['shoulder_vertically_aligned']),
+                    ('hip', features.hip_alignment, self.threshold['hip_vertically_aligned'])
+                ]]:
+                    if self.form_analyser.check_confidence(self.confidence_threshold, joints):
+                        mid_point = joints[:, X:Y + 1].mean(axis=0)
+                        if self.form_analyser.check_joints_are_vertically_aligned(alignment_offset, threshold):
+                            colour = (0, 255, 0)
+                        else:
+                            colour = (0, 0, 255)
+                            message_to_display.append(f'{joint_name.capitalize()}s are not vertically aligned')
+
+                        overlay.append(self.__get_vertical_at_point(np.multiply(mid_point, frame_shape[:2][::-1]).astype(int), colour))
+
+            # Draw levelness indicators if not level
+            left_shoulder, right_shoulder = landmarks[LEFT_SHOULDER], landmarks[RIGHT_SHOULDER]
+            if self.form_analyser.check_confidence(self.confidence_threshold, landmarks[[LEFT_SHOULDER, RIGHT_SHOULDER]]):
+                joints_are_level = self.form_analyser.check_joints_are_level(features.shoulder_level[0], self.threshold['shoulder_level'])
+                if joints_are_level:
+                    colour = (0, 255, 0)
+                else:
+                    colour = (0, 0, 255)
+                    message_to_display.append('Shoulders are not level')
+
+                colour = (0, 255, 0) if joints_are_level else (0, 0, 255)
+                overlay.append(self.__get_levelness_line_at_points(frame_shape, left_shoulder, right_shoulder, colour))
+
+
+            # TODO: form analysis...
+        else:
+            message_to_display.append('User not detected')
+
+        for i, msg in enumerate(message_to_display):
+            overlay.append((TEXT, str(msg), (0, (i+1)*35), False, 3))
+
+        if self.stage_timer is not None:
+            self.stage_timer.record_since(INTERPRETATION, stage_start)
+
+        return overlay, message_to_display
+
+    def close(self):
+        if self.process_pool is not None:
+            self.process_pool.shutdown()
+            self.process_pool = None
 
-        return None
+    def __get_process_pool(self):
+        # Created on first use and kept so that later videos don't pay the process start up cost again
+        if self.process_pool is None:
+            self.process_pool = ProcessPoolExecutor(
+                max_workers=self.num_processes,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+        return self.process_pool
 
-    def __draw_levelness_line_at_points(self, frame, left_shoulder, right_shoulder, colour):
-        p1 = self.__get_image_coords_from_joint(frame.shape, left_shoulder)
-        p2 = self.__get_image_coords_from_joint(frame.shape, right_shoulder)
-        cv2.line(frame, p1, p2, colour, thickness=3)
+    def __get_levelness_line_at_points(self, frame_shape, left_shoulder, right_shoulder, colour):
+        p1 = self.__get_image_coords_from_joint(frame_shape, left_shoulder)
+        p2 = self.__get_image_coords_from_joint(frame_shape, right_shoulder)
+        return (LINE, p1, p2, colour)
 
-    def __draw_vertical_at_point(self, frame, pos, colour):
-        cv2.line(frame, (pos[0], 0), (pos[0], pos[1]), colour, thickness=3)
+    def __get_vertical_at_point(self, pos, colour):
+        return (LINE, (int(pos[0]), 0), (int(pos[0]), int(pos[1])), colour)
 
-    def __draw_angle_at_joint(self, frame, joint, joint_angle):
-        joint_pos = self.__get_image_coords_from_joint(frame.shape, joint)
-        self.__draw_text(
-            frame,
-            f'{round(joint_angle)} deg',
-            to_centre=True,
-            pos=joint_pos
-        )
+    def __get_angle_at_joint(self, frame_shape, joint, joint_angle):
+        joint_pos = self.__get_image_coords_from_joint(frame_shape, joint)
+        return (TEXT, f'{round(joint_angle)} deg', joint_pos, True, 3)
 
     def __get_image_coords_from_joint(self, frame_shape, joint):
-        return tuple(np.multiply([joint.x, joint.y], frame_shape[:2][::-1]).astype(int))
-
-    def __draw_text(self, img, text,
-        to_centre=False,
-        font=cv2.FONT_HERSHEY_PLAIN,
-        pos=(0, 0),
-        font_scale=3,
-        font_thickness=2,
-        text_color=(219, 123, 3),
-        text_color_bg=(0, 0, 0)
-    ):
-        x, y = pos
-        text_size, _ = cv2.getTextSize(text, font, font_scale, font_thickness)
-        text_w, text_h = text_size
-        if to_centre:
-            x -= text_w // 2
-            y -= text_h // 2
-        cv2.rectangle(img, (x, y), (x + text_w, y + text_h), text_color_bg, -1)
-        cv2.putText(
-            img,
-            text,
-            (x, y + text_h + font_scale - 1),
-            font,
-            font_scale,
-            text_color,
-            font_thickness
-        )
-        return text_size
+        return tuple(int(c) for c in np.multiply(joint[X:Y + 1], frame_shape[:2][::-1]))
@@ -0,0 +1,62 @@
+import time
+
+import numpy as np
+
+
+DECODE = 'decode'
+PREPROCESS = 'preprocess'
+INFERENCE = 'inference'
+INTERPRETATION = 'interpretation'
+OVERLAY = 'overlay'
+ENCODE = 'encode'
+STAGES = [DECODE, PREPROCESS, INFERENCE, INTERPRETATION, OVERLAY, ENCODE]
+
+
+class StageTimer():
+    """ Collects the per-frame latency of each stage of the analysis pipeline.
+
+    Analysers given a StageTimer call record() once per frame for each stage they run. Stages that aren't
+    run (e.g. overlay without output, or encode for live analysis) simply have no samples. """
+    def __init__(self):
+        self.samples = {stage: [] for stage in STAGES}
+        self.frames = 0
+        self.frames_dropped = 0
+        self.frames_not_detected = 0
+
+    def record(self, stage, seconds):
+        self.samples[stage].append(seconds)
+
+    def record_since(self, stage, start):
+        """ Records the time since start (from time.perf_counter()) and returns the current time, so that
+        consecutive stages can be timed back to back. """
+        end = time.perf_counter()
+        self.samples[stage].append(end - start)
+        return end
+
+    def record_frame(self, not_detected, frames_dropped=0):
+        """ Called once per analysed frame, with whether the user was not detected and how many stale frames
+        were dropped before it. """
+        self.frames += 1
+        self.frames_dropped += frames_dropped
+        self.frames_not_detected += int(not_detected)
+
+    def get_summary(self):
+        """ Returns frames, total seconds, frames/sec and p50/p95/p99 latency (ms) for each stage that has samples. """
+        summary = {}
+        for stage, samples in self.samples.items():
+            if not samples:
+                continue
+
+            samples = np.array(samples)
+            total_seconds = float(samples.sum())
+            p50, p95, p99 = np.percentile(samples, [50, 95, 99]) * 1000
+            summary[stage] = {
+                'frames': len(samples),
+                'total_seconds': round(total_seconds, 4),
+                'fps': round(len(samples) / total_seconds, 2) if total_seconds > 0 else None,
+                'p50_ms': round(float(p50), 3),
+                'p95_ms': round(float(p95), 3),
+                'p99_ms': round(float(p99), 3),
+            }
+
+        return summary
@@ -1,7 +1,27 @@
+import json
+import sys
+
 import numpy as np
 import matplotlib.pyplot as plt
 
+# Measured by hand. Pass a session latency log recorded by the live server (see latency_log_dir in
+# live_analysis/rtmp_server.py) to plot the latencies of every frame of that session instead:
+#   python latency_graph.py path/to/<stream_key>.jsonl
 latency_measurements = [1.61, 1.81, 1.9, 1.31, 1.48, 1.5, 1.46, 1.4, 1.26, 1.23, 1.7, 1.3, 1.56, 1.2, 1.34, 1.4, 1.67, 1.81, 1.51, 1.34, 1.2, 1.13, 1.42, 1.23, 1.54]
+output_path = './assets/processed/live_analysis_latency_graph.png'
+
+
+def load_session_latencies(latency_log_path):
+    """ Returns the ingest to feedback latency (seconds) of every frame in a recorded session latency log. """
+    with open(latency_log_path) as f:
+        frame_timings = [json.loads(line) for line in f if line.strip()]
+
+    return [frame_timing['emitted_at'] - frame_timing['ingested_at'] for frame_timing in frame_timings]
+
+
+if len(sys.argv) > 1:
+    latency_measurements = load_session_latencies(sys.argv[1])
+    output_path = './assets/processed/live_analysis_session_latency_graph.png'
 
 mean_latency = np.mean(latency_measurements)
 std_dev = np.std(latency_measurements)
@@ -21,14 +41,16 @@ plt.errorbar(range(len(latency_measurements)), latency_measurements, yerr=error_
 plt.text(0.5, 0.95, f"Standard Error of Mean = {sem:.3f}", transform=plt.gca().transAxes, ha='center', va='top')
 plt.text(0.5, 0.9, f"Average = {mean_latency:.3f}", transform=plt.gca().transAxes, ha='center', va='top')
 
-# set the x-axis label and tick labels
+# set the x-axis label and tick labels (only label every measurement when there are few enough to read)
 plt.xlabel('Measurement Number')
-plt.xticks(range(len(latency_measurements)), [str(i+1) for i in range(len(latency_measurements))])
+if len(latency_measurements) <= 30:
+    plt.xticks(range(len(latency_measurements)), [str(i+1) for i in range(len(latency_measurements))])
 
 # set the y-axis label and tick labels
 plt.ylabel('Latency (seconds)')
-plt.yticks(np.arange(0.5, 2.5, 0.1))
+if len(sys.argv) == 1:
+    plt.yticks(np.arange(0.5, 2.5, 0.1))
 
 # save the plot
 plt.title('Latency Measurements')
-plt.savefig('./assets/processed/live_analysis_latency_graph.png')
+plt.savefig(output_path)
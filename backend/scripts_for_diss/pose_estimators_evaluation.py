@@ -1,3 +1,4 @@
+import argparse
 import time
 
 import cv2
@@ -7,6 +8,7 @@ import numpy as np
 import tensorflow as tf
 import tensorflow_hub as hub
 from matplotlib import pyplot as plt
+from landmark_cache import CachedDetector
 from matplotlib.collections import LineCollection
 from mediapipe_estimator import MediaPipeDetector
 # from openpose import pyopenpose as op
@@ -290,14 +292,14 @@ def draw_angle(frame, angle):
     return cv2.putText(frame, str(round(angle)), (0, 30), cv2.FONT_HERSHEY_COMPLEX, 1, (0, 255, 0), 3)
 
 
-def evaluate_model(method, model, show_output=False):
+def evaluate_model(method, model, show_output=False, use_landmark_cache=False):
     print(f'Evaluating: {method}')
-    elapsed_time = process_video(method, video_path, model, show_output)
+    elapsed_time = process_video(method, video_path, model, show_output, use_landmark_cache)
     print(f"Time taken for {method}: {elapsed_time:.2f} seconds")
     return elapsed_time
 
 
-def process_video(method, video_path, model, show_output):
+def process_video(method, video_path, model, show_output, use_landmark_cache=False):
     cap = cv2.VideoCapture(video_path)
     frame_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
     frame_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
@@ -305,6 +307,10 @@ def process_video(method, video_path, model, show_output):
         print("Error: Could not open video.")
         return
 
+    # NOTE: cached landmarks skip inference, so only use the cache when the timings don't matter
+    if method == "mediapipe" and use_landmark_cache:
+        model = CachedDetector(model, video_path, cap=cap)
+
     start_time = time.time()
     extra_time = 0
 
@@ -423,12 +429,22 @@ def process_video(method, video_path, model, show_output):
             extra_time += time.time()
 
     elapsed_time = time.time() - start_time - extra_time
+    if isinstance(model, CachedDetector):
+        model.finish()
     cap.release()
     cv2.destroyAllWindows()
     return elapsed_time
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        '--use-landmark-cache',
+        action='store_true',
+        help='replay cached MediaPipe landmarks, e.g. to check the overlays (the timings are then meaningless)'
+    )
+    args = parser.parse_args()
+
     video_path = "../assets/goblet_squat.mp4"
 
     # OpenPose Setup
@@ -443,15 +459,15 @@ if __name__ == "__main__":
 
     # MediaPipe Pose model
     mp_pose_classifier_0 = MediaPipeDetector(model_complexity=0)
-    evaluate_model('mediapipe', mp_pose_classifier_0, show_output=True)
+    evaluate_model('mediapipe', mp_pose_classifier_0, show_output=True, use_landmark_cache=args.use_landmark_cache)
     del mp_pose_classifier_0
 
     mp_pose_classifier_1 = MediaPipeDetector(model_complexity=1)
-    evaluate_model('mediapipe', mp_pose_classifier_1, show_output=True)
+    evaluate_model('mediapipe', mp_pose_classifier_1, show_output=True, use_landmark_cache=args.use_landmark_cache)
     del mp_pose_classifier_1
 
     mp_pose_classifier_2 = MediaPipeDetector(model_complexity=2)
-    evaluate_model('mediapipe', mp_pose_classifier_2, show_output=True)
+    evaluate_model('mediapipe', mp_pose_classifier_2, show_output=True, use_landmark_cache=args.use_landmark_cache)
     del mp_pose_classifier_2
 
     print('MediaPipe Done')
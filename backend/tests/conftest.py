@@ -0,0 +1,8 @@
+import os
+import sys
+
+
+# The analysers import their modules by name from their own directories. The modules they share are identical, so
+# the non-live copies are used for both
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(BACKEND_DIR, 'non_live_analysis'), os.path.join(BACKEND_DIR, 'live_analysis')]
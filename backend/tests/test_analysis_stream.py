@@ -0,0 +1,66 @@
+import asyncio
+import threading
+
+import pytest
+
+pytest.importorskip('cv2')
+from analysis_stream import iterate_in_thread
+
+
+async def count(n):
+    for i in range(n):
+        yield i
+
+
+def run(coroutine):
+    return asyncio.run(asyncio.wait_for(coroutine, timeout=5))
+
+
+def test_outputs_are_yielded_in_order():
+    async def collect():
+        return [output async for output in iterate_in_thread(lambda items: (item * 2 for item in items), count(10))]
+
+    assert run(collect()) == [i * 2 for i in range(10)]
+
+
+def test_pipeline_errors_are_raised():
+    def pipeline(items):
+        for item in items:
+            if item == 3:
+                raise ValueError('bad item')
+            yield item
+
+    async def collect():
+        return [output async for output in iterate_in_thread(pipeline, count(10))]
+
+    with pytest.raises(ValueError, match='bad item'):
+        run(collect())
+
+
+def test_pipeline_waits_for_its_outputs_to_be_taken():
+    produced = []
+    finished = threading.Event()
+
+    def pipeline(items):
+        try:
+            for item in items:
+                produced.append(item)
+                yield item
+        finally:
+            finished.set()
+
+    async def take_one():
+        outputs = iterate_in_thread(pipeline, count(100), max_pending=2)
+        first = await outputs.__anext__()
+        await asyncio.sleep(0.1)
+        backlog = len(produced)
+        await outputs.aclose()
+        await asyncio.get_running_loop().run_in_executor(None, finished.wait, 1)
+        return first, backlog
+
+    first, backlog = run(take_one())
+
+    assert first == 0
+    assert backlog <= 4
+    assert finished.is_set()
+    assert len(produced) < 100
@@ -0,0 +1,40 @@
+from feedback_accumulator import FeedbackAccumulator
+
+
+def test_add_keeps_first_of_each_tag_and_message_in_order():
+    accumulator = FeedbackAccumulator()
+    accumulator.add([{'tag': 'TIP', 'message': 'Lower Hips'}, {'tag': 'FEEDBACK', 'message': 'Hips are not level'}])
+    accumulator.add([{'tag': 'TIP', 'message': 'Lower Hips', 'extra': 1}, {'tag': 'TIP', 'message': 'Keep your knees over your toes'}])
+
+    assert len(accumulator) == 3
+    assert accumulator.drain() == [
+        {'tag': 'TIP', 'message': 'Lower Hips'},
+        {'tag': 'FEEDBACK', 'message': 'Hips are not level'},
+        {'tag': 'TIP', 'message': 'Keep your knees over your toes'},
+    ]
+
+
+def test_feedback_without_a_message_is_keyed_on_its_tag():
+    accumulator = FeedbackAccumulator()
+    accumulator.add([{'tag': 'SET_ENDED', 'summary': 1}, {'tag': 'SET_ENDED', 'summary': 2}])
+
+    assert accumulator.drain() == [{'tag': 'SET_ENDED', 'summary': 1}]
+
+
+def test_drain_empties_and_allows_the_same_feedback_again():
+    accumulator = FeedbackAccumulator()
+    accumulator.add([{'tag': 'TIP', 'message': 'Lower Hips'}])
+    accumulator.drain()
+
+    assert len(accumulator) == 0
+    assert accumulator.drain() == []
+    accumulator.add([{'tag': 'TIP', 'message': 'Lower Hips'}])
+    assert accumulator.drain() == [{'tag': 'TIP', 'message': 'Lower Hips'}]
+
+
+def test_replace_discards_waiting_feedback():
+    accumulator = FeedbackAccumulator()
+    accumulator.add([{'tag': 'TIP', 'message': 'Lower Hips'}])
+    accumulator.replace([{'tag': 'SET_ENDED', 'summary': {}}, {'tag': 'SET_ENDED', 'summary': {}}])
+
+    assert accumulator.drain() == [{'tag': 'SET_ENDED', 'summary': {}}]
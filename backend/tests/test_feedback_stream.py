@@ -0,0 +1,47 @@
+import threading
+
+from feedback_stream import FeedbackStream
+
+
+def test_events_are_numbered_from_one_and_resumed_after_a_sequence():
+    stream = FeedbackStream()
+    stream.publish(['a', 'b'])
+    stream.publish(['c'])
+
+    assert stream.get_events() == ([(1, 'a'), (2, 'b'), (3, 'c')], False)
+    assert stream.get_events(after_sequence=2) == ([(3, 'c')], False)
+
+
+def test_only_the_newest_events_are_kept():
+    stream = FeedbackStream(max_events=2)
+    stream.publish(['a', 'b', 'c'])
+
+    assert stream.get_events() == ([(2, 'b'), (3, 'c')], False)
+
+
+def test_waiting_times_out_with_no_new_events():
+    stream = FeedbackStream()
+    stream.publish(['a'])
+
+    assert stream.get_events(after_sequence=1, timeout=0.01) == ([], False)
+
+
+def test_a_waiting_client_is_woken_by_new_events_and_by_closing():
+    stream = FeedbackStream()
+    results = []
+    received = threading.Event()
+
+    def follow():
+        events, closed = stream.get_events(timeout=1)
+        results.append((events, closed))
+        received.set()
+        results.append(stream.get_events(after_sequence=events[-1][0], timeout=1))
+
+    follower = threading.Thread(target=follow)
+    follower.start()
+    stream.publish(['a'])
+    received.wait(timeout=1)
+    stream.close()
+    follower.join(timeout=1)
+
+    assert results == [([(1, 'a')], False), ([], True)]
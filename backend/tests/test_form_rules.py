@@ -0,0 +1,105 @@
+import numpy as np
+import pytest
+from form_rules import (ASCENT, BOTTOM, DESCENT, FACE_ON, ORIENTATION_INDEX,
+                        ORIENTATIONS, PHASE_INDEX, PHASES, SIDE_ON,
+                        SQUAT_RULES, FormRules)
+from pose_features import PoseFeatures
+
+
+THRESHOLDS = {
+    'TRANSITION_knee_angle_range': (28, 55),
+    'collapsed_torso_knee_angle': 35,
+    'safe_hip_angle': 62,
+    'knee_level': 0.05,
+    'shoulder_level': 0.05,
+    'hip_level': 0.05,
+    'hip_vertically_aligned': 0.04,
+    'shoulder_vertically_aligned': 0.075,
+    'spine_neutral': 80,
+}
+
+
+def get_if_chain_feedback(features, i, side, phase, orientation):
+    """ The feedback messages of frame i as the live analyser's if-chain gave them before the rule table. """
+    knee_angle, hip_angle = features.knee_angle[i, side], features.hip_angle[i, side]
+    messages = []
+    low, high = THRESHOLDS['TRANSITION_knee_angle_range']
+    if phase == DESCENT and low < knee_angle < high:
+        messages.append('Lower Hips')
+    if phase == BOTTOM:
+        messages.append('Keep your knees over your toes')
+        if orientation == FACE_ON and not features.knee_level[i] <= THRESHOLDS['knee_level']:
+            messages.append('Knees are not level')
+    if phase in (DESCENT, ASCENT) and knee_angle < 35 and THRESHOLDS['safe_hip_angle'] < hip_angle:
+        messages.append('COLLAPSED TORSO!\nLean back slightly')
+    if orientation == FACE_ON:
+        if not features.shoulder_level[i] <= THRESHOLDS['shoulder_level']:
+            messages.append('Shoulders are not level')
+        if not features.hip_level[i] <= THRESHOLDS['hip_level']:
+            messages.append('Hips are not level')
+        if not features.hip_alignment[i] <= THRESHOLDS['hip_vertically_aligned']:
+            messages.append('Hips are not vertically aligned with feet')
+        if not features.shoulder_alignment[i] <= THRESHOLDS['shoulder_vertically_aligned']:
+            messages.append('Shoulders are not vertically aligned with feet')
+    elif orientation == SIDE_ON:
+        if not abs(features.spine_angle[i, side] - 180) <= THRESHOLDS['spine_neutral']:
+            messages.append('Maintain a neutral spine')
+    return messages
+
+
+def make_features(num_frames=2000):
+    """ Random features, with some of every feature exactly on the thresholds the rules compare it with. """
+    rng = np.random.default_rng(0)
+    features = PoseFeatures(num_frames)
+    features.angles[:] = rng.uniform(0, 180, features.angles.shape)
+    features.levels[:] = rng.uniform(0, 0.1, features.levels.shape)
+    features.alignments[:] = rng.uniform(0, 0.15, features.alignments.shape)
+
+    on_threshold = rng.random(num_frames) < 0.2
+    features.knee_angle[on_threshold] = rng.choice([28, 35, 55], (on_threshold.sum(), 2))
+    features.hip_angle[on_threshold] = 62
+    features.spine_angle[on_threshold] = rng.choice([100, 260], (on_threshold.sum(), 2))
+    features.levels[on_threshold] = 0.05
+    features.hip_alignment[on_threshold] = 0.04
+    features.shoulder_alignment[on_threshold] = 0.075
+    return features
+
+
+@pytest.mark.parametrize('side', [0, 1])
+def test_rules_match_the_if_chain(side):
+    features = make_features()
+    form_rules = FormRules(SQUAT_RULES, THRESHOLDS)
+    rng = np.random.default_rng(side)
+    phase = rng.integers(len(PHASES), size=features.num_frames)
+    orientation = rng.integers(len(ORIENTATIONS), size=features.num_frames)
+
+    fired = form_rules.evaluate(features, side, phase, orientation)
+
+    assert fired.shape == (features.num_frames, len(SQUAT_RULES))
+    for i in range(features.num_frames):
+        messages = [f['message'] for f in form_rules.get_feedback(fired[i])]
+        assert messages == get_if_chain_feedback(features, i, side, PHASES[phase[i]], ORIENTATIONS[orientation[i]])
+
+
+def test_phase_and_orientation_names_apply_to_every_frame():
+    features = make_features(50)
+    form_rules = FormRules(SQUAT_RULES, THRESHOLDS)
+
+    fired = form_rules.evaluate(features, 0, BOTTOM, FACE_ON)
+
+    phase = np.full(50, PHASE_INDEX[BOTTOM])
+    orientation = np.full(50, ORIENTATION_INDEX[FACE_ON])
+    np.testing.assert_array_equal(fired, form_rules.evaluate(features, 0, phase, orientation))
+    assert fired[:, [rule['message'] == 'Keep your knees over your toes' for rule in SQUAT_RULES]].all()
+
+
+def test_summaries_are_only_of_rules_that_count_against_the_rep():
+    form_rules = FormRules(SQUAT_RULES, THRESHOLDS)
+    fired = np.ones(len(SQUAT_RULES), dtype=bool)
+
+    assert form_rules.get_summaries(fired) == [rule['summary'] for rule in SQUAT_RULES if 'summary' in rule]
+
+
+def test_unknown_comparison_is_rejected():
+    with pytest.raises(ValueError):
+        FormRules([{'tag': 'TIP', 'message': '', 'conditions': [('knee_angle', 'equal', 'knee_level')]}], THRESHOLDS)
@@ -0,0 +1,72 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+pytest.importorskip('cv2')
+from frame_preprocessor import FramePreprocessor
+
+
+def make_pose(points, visibility=1.0):
+    return SimpleNamespace(landmark=[SimpleNamespace(x=x, y=y, z=0.1, visibility=visibility) for x, y in points])
+
+
+def test_frames_are_downsized_and_converted_to_rgb():
+    frame = np.zeros((480, 1280, 3), dtype=np.uint8)
+    frame[..., 0] = 255  # Blue in BGR
+
+    image = FramePreprocessor(max_size=640).prepare(frame)
+
+    assert image.shape == (240, 640, 3)
+    assert (image[..., 2] == 255).all() and (image[..., :2] == 0).all()
+
+
+def test_small_frames_are_not_upsized_and_buffers_are_reused():
+    preprocessor = FramePreprocessor(max_size=640)
+    frame = np.zeros((240, 320, 3), dtype=np.uint8)
+
+    image = preprocessor.prepare(frame)
+
+    assert image.shape == (240, 320, 3)
+    assert preprocessor.prepare(frame) is image
+
+
+def test_landmarks_are_left_alone_without_cropping():
+    preprocessor = FramePreprocessor()
+    preprocessor.prepare(np.zeros((480, 640, 3), dtype=np.uint8))
+    pose = make_pose([(0.25, 0.5)])
+
+    preprocessor.map_to_frame(pose)
+
+    assert (pose.landmark[0].x, pose.landmark[0].y) == (0.25, 0.5)
+    assert preprocessor.person_box is None
+
+
+def test_cropped_landmarks_are_mapped_back_to_the_whole_frame():
+    preprocessor = FramePreprocessor(crop_to_person=True, crop_margin=0, crop_granularity=32)
+    frame = np.zeros((480, 640, 3), dtype=np.uint8)
+    preprocessor.prepare(frame)
+    preprocessor.map_to_frame(make_pose([(0.25, 0.25), (0.5, 0.75)]))
+
+    assert preprocessor.person_box == (160, 120, 320, 360)
+
+    image = preprocessor.prepare(frame)
+    assert preprocessor.crop == (160, 96, 320, 384)
+    assert image.shape == (288, 160, 3)
+
+    pose = preprocessor.map_to_frame(make_pose([(0.5, 0.5)]))
+    assert pose.landmark[0].x == pytest.approx(0.375)
+    assert pose.landmark[0].y == pytest.approx(0.5)
+    assert pose.landmark[0].z == pytest.approx(0.1 * 160 / 640)
+
+
+def test_losing_the_person_goes_back_to_the_whole_frame():
+    preprocessor = FramePreprocessor(crop_to_person=True)
+    frame = np.zeros((480, 640, 3), dtype=np.uint8)
+    preprocessor.prepare(frame)
+    preprocessor.map_to_frame(make_pose([(0.25, 0.25), (0.5, 0.75)]))
+
+    preprocessor.map_to_frame(None)
+    preprocessor.prepare(frame)
+
+    assert preprocessor.crop == (0, 0, 640, 480)
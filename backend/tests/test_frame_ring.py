@@ -0,0 +1,57 @@
+import threading
+
+import pytest
+
+pytest.importorskip('cv2')
+from frame_capture import FrameRing
+
+
+def test_reading_takes_the_newest_frame_and_drops_the_rest():
+    ring = FrameRing(3)
+    for frame in range(3):
+        ring.put(frame)
+
+    assert ring.get_latest() == 2
+    assert ring.frames_dropped == 2
+    assert ring.get_latest(timeout=0) is None
+
+
+def test_writing_to_a_full_ring_overwrites_the_oldest_frame():
+    ring = FrameRing(2)
+    for frame in range(5):
+        ring.put(frame)
+
+    assert ring.frames_dropped == 3
+    assert ring.get_latest() == 4
+    assert ring.frames_dropped == 4
+
+
+def test_dropped_frames_are_kept_for_reuse_up_to_the_ring_size():
+    ring = FrameRing(2)
+    for frame in range(5):
+        ring.put(frame)
+    ring.get_latest()
+
+    assert [ring.take_dropped(), ring.take_dropped(), ring.take_dropped()] == [3, 2, None]
+
+
+def test_closing_wakes_a_blocked_reader():
+    ring = FrameRing()
+    frames = []
+    reader = threading.Thread(target=lambda: frames.append(ring.get_latest()))
+    reader.start()
+
+    ring.close()
+    reader.join(timeout=1)
+
+    assert not reader.is_alive()
+    assert frames == [None]
+
+
+def test_frames_left_when_closed_are_still_read():
+    ring = FrameRing()
+    ring.put('frame')
+    ring.close()
+
+    assert ring.get_latest() == 'frame'
+    assert ring.get_latest() is None
@@ -0,0 +1,91 @@
+import numpy as np
+import pytest
+from frame_stride import LINEAR, SPLINE, FrameStride
+
+
+def make_landmarks(x, visibility=1.0):
+    landmarks = np.zeros((33, 4), dtype=np.float32)
+    landmarks[:, 0] = x
+    landmarks[:, 3] = visibility
+    return landmarks
+
+
+def test_every_stride_th_frame_is_a_keyframe():
+    frame_stride = FrameStride(3)
+    keyframes = []
+    for i in range(10):
+        if frame_stride.is_keyframe(i):
+            frame_stride.add_keyframe(i, make_landmarks(i))
+            keyframes.append(i)
+
+    assert keyframes == [0, 3, 6, 9]
+
+
+def test_adaptive_stride_drops_to_one_in_the_fast_phase():
+    frame_stride = FrameStride(4, adaptive=True)
+    frame_stride.add_keyframe(0, make_landmarks(0))
+
+    assert not frame_stride.is_keyframe(1)
+    frame_stride.set_fast_phase(True)
+    assert frame_stride.is_keyframe(1)
+    assert FrameStride(4).current_stride == 4
+
+
+@pytest.mark.parametrize('method', [LINEAR, SPLINE])
+def test_steady_motion_is_interpolated_exactly(method):
+    frame_stride = FrameStride(4, method=method)
+    for i in [0, 4, 8]:
+        frame_stride.add_keyframe(i, make_landmarks(i / 10))
+
+    frames = frame_stride.interpolate()
+
+    assert len(frames) == 3
+    for i, landmarks in zip([5, 6, 7], frames):
+        np.testing.assert_allclose(landmarks[:, 0], i / 10, atol=1e-6)
+        np.testing.assert_allclose(landmarks[:, 3], 1)
+
+
+def test_spline_visibility_stays_a_probability():
+    frame_stride = FrameStride(4, method=SPLINE)
+    for i, visibility in zip([0, 4, 8], [0, 1, 1]):
+        frame_stride.add_keyframe(i, make_landmarks(0, visibility))
+
+    for landmarks in frame_stride.interpolate():
+        assert ((landmarks[:, 3] >= 0) & (landmarks[:, 3] <= 1)).all()
+
+
+def test_frames_next_to_a_keyframe_without_a_pose_get_none():
+    frame_stride = FrameStride(3)
+    frame_stride.add_keyframe(0, make_landmarks(0))
+    frame_stride.add_keyframe(3, None)
+
+    assert frame_stride.interpolate() == [None, None]
+    assert frame_stride.extrapolate(4) is None
+
+
+def test_extrapolate_carries_on_the_motion_holding_visibility():
+    frame_stride = FrameStride(2)
+    frame_stride.add_keyframe(0, make_landmarks(0.1, 0.5))
+    frame_stride.add_keyframe(2, make_landmarks(0.2, 0.9))
+
+    landmarks = frame_stride.extrapolate(3)
+
+    np.testing.assert_allclose(landmarks[:, 0], 0.25, atol=1e-6)
+    np.testing.assert_allclose(landmarks[:, 3], 0.9)
+
+
+def test_add_keyframe_keeps_its_own_copy():
+    frame_stride = FrameStride(2)
+    landmarks = make_landmarks(0.1)
+
+    kept = frame_stride.add_keyframe(0, landmarks)
+    landmarks[:] = 0
+
+    assert kept is not landmarks
+    np.testing.assert_allclose(kept[:, 0], 0.1)
+    np.testing.assert_allclose(frame_stride.extrapolate(1)[:, 0], 0.1)
+
+
+def test_unknown_method_is_rejected():
+    with pytest.raises(ValueError):
+        FrameStride(2, method='cubic')
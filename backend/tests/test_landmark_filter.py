@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+from landmark_filter import KALMAN, ONE_EURO, LandmarkFilter
+
+
+FPS = 30
+
+
+def make_landmarks(rng, num_frames, noise=0.01):
+    """ Landmarks holding still at random positions, with jitter of the given standard deviation. """
+    still = rng.random((33, 4)).astype(np.float32)
+    landmarks = np.repeat(still[None], num_frames, axis=0)
+    landmarks[..., :3] += rng.normal(0, noise, (num_frames, 33, 3)).astype(np.float32)
+    return still, landmarks
+
+
+@pytest.mark.parametrize('method', [ONE_EURO, KALMAN])
+def test_jitter_is_smoothed_and_visibility_passed_through(method):
+    rng = np.random.default_rng(0)
+    still, landmarks = make_landmarks(rng, 60)
+    landmark_filter = LandmarkFilter(method)
+
+    filtered = np.stack([landmark_filter.filter(frame, i / FPS).copy() for i, frame in enumerate(landmarks)])
+
+    raw_error = np.abs(landmarks[30:, :, :3] - still[:, :3]).mean()
+    filtered_error = np.abs(filtered[30:, :, :3] - still[:, :3]).mean()
+    assert filtered_error < 0.75 * raw_error
+    np.testing.assert_array_equal(filtered[..., 3], landmarks[..., 3])
+
+
+@pytest.mark.parametrize('method', [ONE_EURO, KALMAN])
+def test_first_frame_and_frames_after_a_gap_are_passed_through(method):
+    rng = np.random.default_rng(1)
+    _, landmarks = make_landmarks(rng, 3)
+    landmark_filter = LandmarkFilter(method, reset_after=0.5)
+
+    np.testing.assert_array_equal(landmark_filter.filter(landmarks[0], 0), landmarks[0])
+    assert not np.array_equal(landmark_filter.filter(landmarks[1], 1 / FPS), landmarks[1])
+    np.testing.assert_array_equal(landmark_filter.filter(landmarks[2], 1), landmarks[2])
+    landmark_filter.reset()
+    np.testing.assert_array_equal(landmark_filter.filter(landmarks[0], 1 + 1 / FPS), landmarks[0])
+
+
+def test_filter_follows_movement():
+    # A landmark moving steadily across the frame ends up close to where it is, rather than lagging far behind
+    landmarks = np.zeros((60, 33, 4), dtype=np.float32)
+    landmarks[:, :, 0] = np.linspace(0, 0.6, 60)[:, None]
+    landmark_filter = LandmarkFilter(ONE_EURO)
+
+    for i, frame in enumerate(landmarks):
+        filtered = landmark_filter.filter(frame, i / FPS)
+
+    assert filtered[0, 0] == pytest.approx(0.6, abs=0.02)
+
+
+def test_filter_track_skips_frames_not_detected():
+    rng = np.random.default_rng(2)
+    _, landmarks = make_landmarks(rng, 10)
+    landmarks[4] = 0
+    detected = np.ones(10, dtype=bool)
+    detected[4] = False
+    expected = landmarks.copy()
+    landmark_filter = LandmarkFilter()
+    for i in np.flatnonzero(detected):
+        expected[i] = landmark_filter.filter(expected[i], i / FPS)
+
+    LandmarkFilter().filter_track(landmarks, detected, np.arange(10) / FPS)
+
+    np.testing.assert_array_equal(landmarks, expected)
+    assert not landmarks[4].any()
+
+
+def test_unknown_method_is_rejected():
+    with pytest.raises(ValueError):
+        LandmarkFilter('median')
@@ -0,0 +1,54 @@
+import json
+import struct
+
+import numpy as np
+from landmark_track import LandmarkTrack
+
+
+def read_binary(data):
+    """ Reads a track back out of LandmarkTrack.to_binary(), as a client would. """
+    (header_length,) = struct.unpack_from('<I', data)
+    header = json.loads(data[4:4 + header_length])
+    landmarks = np.frombuffer(data[4 + header_length:], dtype='<f4').reshape(header['landmarks_shape'])
+    return header, landmarks
+
+
+def make_track():
+    rng = np.random.default_rng(0)
+    track = LandmarkTrack(fps=30)
+    landmarks = [rng.random((33, 4), dtype=np.float32), None, rng.random((33, 4), dtype=np.float32)]
+    for i, frame_landmarks in enumerate(landmarks):
+        track.add_frame(i / 30, frame_landmarks, ['User not detected'] if frame_landmarks is None else [])
+    return track, landmarks
+
+
+def test_binary_round_trip():
+    track, landmarks = make_track()
+    data = track.to_binary()
+    header, read_landmarks = read_binary(data)
+
+    assert (4 + struct.unpack_from('<I', data)[0]) % 4 == 0
+    assert header['fps'] == 30
+    assert header['frames'] == 3
+    assert header['timestamps'] == [0.0, 0.033, 0.067]
+    assert header['feedback'] == [[], ['User not detected'], []]
+    np.testing.assert_array_equal(read_landmarks[0], landmarks[0])
+    assert np.isnan(read_landmarks[1]).all()
+    np.testing.assert_array_equal(read_landmarks[2], landmarks[2])
+
+
+def test_binary_header_matches_json():
+    track, landmarks = make_track()
+    header, _ = read_binary(track.to_binary())
+    track_json = track.to_json()
+
+    assert {key: value for key, value in track_json.items() if key != 'landmarks'} == header
+    assert track_json['landmarks'][1] is None
+    np.testing.assert_allclose(track_json['landmarks'][0], landmarks[0], atol=1e-4)
+
+
+def test_empty_track():
+    header, landmarks = read_binary(LandmarkTrack().to_binary())
+
+    assert header['frames'] == 0
+    assert landmarks.shape == (0, 33, 4)
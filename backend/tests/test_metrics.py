@@ -0,0 +1,74 @@
+from metrics import Histogram, MetricsRegistry, PipelineMetrics, escape_label_value
+from stage_timer import STAGES
+
+
+def test_label_values_are_escaped():
+    assert escape_label_value('a "b"\\c\nd') == 'a \\"b\\"\\\\c\\nd'
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = MetricsRegistry()
+    histogram = registry.histogram('latency_seconds', 'Latency', buckets=(0.1, 1.0))
+    for value in [0.05, 0.1, 0.5, 2.0]:
+        histogram.observe(value)
+
+    lines = registry.render().splitlines()
+
+    assert lines == [
+        '# HELP squat_tracker_latency_seconds Latency',
+        '# TYPE squat_tracker_latency_seconds histogram',
+        'squat_tracker_latency_seconds_bucket{le="0.1"} 2',
+        'squat_tracker_latency_seconds_bucket{le="1.0"} 3',
+        'squat_tracker_latency_seconds_bucket{le="+Inf"} 4',
+        'squat_tracker_latency_seconds_sum 2.65',
+        'squat_tracker_latency_seconds_count 4',
+    ]
+
+
+def test_series_of_a_family_share_its_help_and_type():
+    registry = MetricsRegistry()
+    registry.counter('requests_total', 'Requests', labels=(('route', 'a'),)).inc()
+    registry.counter('requests_total', 'Requests', labels=(('route', 'b'),)).inc(2)
+    registry.gauge('sessions', 'Sessions', lambda: {(('session', 'x'),): 1, (('session', 'y'),): 0})
+
+    assert registry.render() == (
+        '# HELP squat_tracker_requests_total Requests\n'
+        '# TYPE squat_tracker_requests_total counter\n'
+        'squat_tracker_requests_total{route="a"} 1\n'
+        'squat_tracker_requests_total{route="b"} 2\n'
+        '# HELP squat_tracker_sessions Sessions\n'
+        '# TYPE squat_tracker_sessions gauge\n'
+        'squat_tracker_sessions{session="x"} 1\n'
+        'squat_tracker_sessions{session="y"} 0\n'
+    )
+
+
+def test_histogram_state_moves_between_histograms():
+    source, target = Histogram((1.0,)), Histogram((1.0,))
+    source.observe(0.5)
+    source.observe(3.0)
+
+    target.add_state(source.take_state())
+    target.add_state(source.take_state())
+
+    assert target.counts == [1, 1]
+    assert target.sum == 3.5
+    assert source.counts == [0, 0]
+
+
+def test_pipeline_metrics_from_another_process_are_added():
+    worker = PipelineMetrics(MetricsRegistry())
+    server = PipelineMetrics(MetricsRegistry())
+    worker.record(STAGES[0], 0.01)
+    worker.record_frame(not_detected=True, frames_dropped=2)
+    worker.record_frame(not_detected=False)
+    worker.record_complexity_switch()
+
+    server.add_state(worker.take_state())
+
+    assert server.frames_processed.value == 2
+    assert server.frames_dropped.value == 2
+    assert server.frames_not_detected.value == 1
+    assert server.complexity_switches.value == 1
+    assert sum(server.stage_latency[STAGES[0]].counts) == 1
+    assert worker.frames_processed.value == 0
@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+from landmark_frame import LANDMARK_NAMES, X, Y
+from pose_features import SIDE_INDEX, FeatureExtractor
+
+
+def make_landmarks(num_frames=1):
+    """ A (num_frames, 33, 4) track of a lifter standing straight, side on, with every landmark visible. """
+    landmarks = np.zeros((num_frames, 33, 4), dtype=np.float32)
+    landmarks[..., 3] = 1
+    for side in ['left_', 'right_']:
+        for joint, (x, y) in {
+            'foot_index': (0.55, 0.9),
+            'ankle': (0.5, 0.9),
+            'knee': (0.5, 0.7),
+            'hip': (0.5, 0.5),
+            'shoulder': (0.5, 0.2),
+            'elbow': (0.5, 0.35),
+        }.items():
+            landmarks[:, LANDMARK_NAMES[side + joint], [X, Y]] = [x, y]
+    landmarks[:, LANDMARK_NAMES['nose'], [X, Y]] = [0.5, 0.1]
+    return landmarks
+
+
+def test_angles_are_measured_at_the_middle_joint():
+    landmarks = make_landmarks()
+    # Bend the left knee to a right angle
+    landmarks[0, LANDMARK_NAMES['left_hip'], [X, Y]] = [0.7, 0.7]
+
+    features = FeatureExtractor().extract(landmarks)
+
+    assert features.knee_angle[0, SIDE_INDEX['left_']] == pytest.approx(90)
+    assert features.knee_angle[0, SIDE_INDEX['right_']] == pytest.approx(180)
+    assert features.ankle_angle[0, SIDE_INDEX['right_']] == pytest.approx(90)
+
+
+def test_angle_visibility_is_the_least_visible_joint():
+    landmarks = make_landmarks()
+    landmarks[0, LANDMARK_NAMES['right_knee'], 3] = 0.3
+
+    features = FeatureExtractor().extract(landmarks)
+
+    assert features.knee_angle_visibility[0, SIDE_INDEX['right_']] == pytest.approx(0.3)
+    assert features.hip_angle_visibility[0, SIDE_INDEX['right_']] == pytest.approx(0.3)
+    assert features.knee_angle_visibility[0, SIDE_INDEX['left_']] == 1
+
+
+def test_levels_and_alignments():
+    landmarks = make_landmarks()
+    landmarks[0, LANDMARK_NAMES['left_shoulder'], Y] = 0.25
+    landmarks[0, [LANDMARK_NAMES['left_hip'], LANDMARK_NAMES['right_hip']], X] = [0.55, 0.65]
+
+    features = FeatureExtractor().extract(landmarks)
+
+    assert features.shoulder_level[0] == pytest.approx(0.05)
+    assert features.hip_level[0] == pytest.approx(0)
+    assert features.hip_alignment[0] == pytest.approx(0.1)
+    assert features.shoulder_alignment[0] == pytest.approx(0)
+
+
+def test_batch_matches_frame_by_frame():
+    rng = np.random.default_rng(0)
+    landmarks = make_landmarks(10) + rng.normal(0, 0.02, (10, 33, 4)).astype(np.float32)
+
+    batch = FeatureExtractor().extract(landmarks)
+    feature_extractor = FeatureExtractor()
+    for i in range(len(landmarks)):
+        features = feature_extractor.extract(landmarks[i])
+        np.testing.assert_array_equal(features.angles[0], batch.angles[i])
+        np.testing.assert_array_equal(features.levels[0], batch.levels[i])
+        np.testing.assert_allclose(features.ankle_displacement[0], batch.ankle_displacement[i], atol=1e-6)
+
+
+def test_ankle_displacement_carries_across_calls_until_reset():
+    landmarks = make_landmarks(2)
+    landmarks[1, LANDMARK_NAMES['left_ankle'], X] += 0.03
+    feature_extractor = FeatureExtractor()
+
+    feature_extractor.extract(landmarks[0])
+    moved = feature_extractor.extract(landmarks[1]).ankle_displacement[0].copy()
+    feature_extractor.reset()
+    after_reset = feature_extractor.extract(landmarks[1]).ankle_displacement[0]
+
+    assert moved == pytest.approx([0.03, 0], abs=1e-6)
+    assert after_reset == pytest.approx([0, 0])
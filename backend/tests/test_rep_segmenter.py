@@ -0,0 +1,100 @@
+import numpy as np
+from landmark_frame import LANDMARK_NAMES, X, Y
+from rep_segmenter import FULL_REP_STATES, RepSegmenter
+
+
+THRESHOLDS = {
+    'standing_knee_angle': 62,
+    'TRANSITION_knee_angle_range': (28, 55),
+    'bottom_knee_angle': 26,
+    'face_on': 0.12,
+    'collapsed_torso_knee_angle': 35,
+    'safe_hip_angle': 62,
+    'knee_level': 0.05,
+    'shoulder_level': 0.05,
+    'hip_level': 0.05,
+    'hip_vertically_aligned': 0.04,
+    'shoulder_vertically_aligned': 0.075,
+    'spine_neutral': 80,
+}
+FPS = 30
+
+
+def make_track(knee_angles):
+    """ A side on (num_frames, 33, 4) landmark track of a lifter whose knees bend to knee_angles (degrees). """
+    landmarks = np.zeros((len(knee_angles), 33, 4), dtype=np.float32)
+    landmarks[..., 3] = 1
+    bend = np.deg2rad(180 - np.asarray(knee_angles, dtype=np.float64))
+    for side in ['left_', 'right_']:
+        landmarks[:, LANDMARK_NAMES[side + 'foot_index'], [X, Y]] = [0.55, 0.92]
+        landmarks[:, LANDMARK_NAMES[side + 'ankle'], [X, Y]] = [0.5, 0.9]
+        landmarks[:, LANDMARK_NAMES[side + 'knee'], [X, Y]] = [0.5, 0.7]
+        landmarks[:, LANDMARK_NAMES[side + 'hip'], X] = 0.5 + 0.2 * np.sin(bend)
+        landmarks[:, LANDMARK_NAMES[side + 'hip'], Y] = 0.7 - 0.2 * np.cos(bend)
+        landmarks[:, LANDMARK_NAMES[side + 'shoulder'], X] = 0.5
+        landmarks[:, LANDMARK_NAMES[side + 'shoulder'], Y] = landmarks[:, LANDMARK_NAMES[side + 'hip'], Y] - 0.3
+    landmarks[:, LANDMARK_NAMES['nose'], [X, Y]] = [0.5, 0.05]
+    return landmarks
+
+
+def segment(knee_angles, detected=None):
+    knee_angles = np.asarray(knee_angles, dtype=np.float64)
+    detected = np.ones(len(knee_angles), dtype=bool) if detected is None else detected
+    # Without smoothing, so that rep boundaries land exactly on the frames of knee_angles
+    rep_segmenter = RepSegmenter(THRESHOLDS, smoothing_window=0)
+    return rep_segmenter.segment(make_track(knee_angles), detected, np.arange(len(knee_angles)) / FPS, FPS)
+
+
+def standing(num_frames):
+    return np.full(num_frames, 180.0)
+
+
+def squat(depth=20):
+    """ 20 frames down to depth and 20 back up, the first and last frames standing. """
+    return np.concatenate((np.linspace(180, depth, 20), np.linspace(depth, 180, 21)[1:]))
+
+
+def test_reps_run_between_upright_frames():
+    reps = segment(np.concatenate((standing(30), squat(), standing(20), squat(), standing(20))))
+
+    assert [(rep['startFrame'], rep['bottomFrame'], rep['endFrame']) for rep in reps] == [(31, 49, 68), (91, 109, 128)]
+    assert [rep['rep'] for rep in reps] == [1, 2]
+    for rep in reps:
+        assert rep['depth'] == 20
+        assert rep['states'] == FULL_REP_STATES
+        assert np.isclose(rep['eccentricDuration'], 18 / FPS)
+        assert np.isclose(rep['concentricDuration'], 19 / FPS)
+
+
+def test_shallow_dips_and_unfinished_reps_are_not_reps():
+    knee_angles = np.concatenate((standing(30), squat(depth=60), standing(20), squat()[:25]))
+
+    assert segment(knee_angles) == []
+
+
+def test_runs_without_an_upright_frame_between_them_are_one_rep():
+    # Back up above the standing knee angle between the dips, but not upright
+    knee_angles = np.concatenate((
+        standing(30),
+        np.linspace(180, 40, 15),
+        np.linspace(40, 70, 10),
+        np.linspace(70, 20, 10),
+        np.linspace(20, 180, 15),
+        standing(30),
+    ))
+
+    reps = segment(knee_angles)
+
+    assert len(reps) == 1
+    assert (reps[0]['startFrame'], reps[0]['bottomFrame'], reps[0]['endFrame']) == (31, 64, 79)
+    assert reps[0]['depth'] == 20
+
+
+def test_frames_without_a_pose_are_interpolated():
+    knee_angles = np.concatenate((standing(30), squat(), standing(20)))
+    detected = np.ones(len(knee_angles), dtype=bool)
+    detected[40:45] = False
+
+    reps = segment(knee_angles, detected)
+
+    assert [(rep['startFrame'], rep['bottomFrame'], rep['endFrame']) for rep in reps] == [(31, 49, 68)]
@@ -5,10 +5,12 @@ import * as ImagePicker from 'expo-image-picker';
 import * as MediaLibrary from 'expo-media-library';
 import Button from '../components/Button';
 import { Text, View } from '../components/Themed';
-import { FinalSummary, RootTabScreenProps } from '../../types';
+import { FinalSummary, JobStatus, RootTabScreenProps } from '../../types';
 
 const ip = '192.168.0.28';
-const UPLOAD_VIDEO_ENDPOINT = `http://${ip}:5000/upload_video`;
+const SERVER_URL = `http://${ip}:5000`;
+const UPLOAD_VIDEO_ENDPOINT = `${SERVER_URL}/upload_video`;
+const JOB_POLL_INTERVAL_MS = 1000;
 
 export default function MenuScreen({ navigation }: RootTabScreenProps<'Menu'>) {
   const [galleyButtonDisabled, setGalleryButtonDisabled] = useState<boolean>(true);
@@ -38,25 +40,29 @@ export default function MenuScreen({ navigation }: RootTabScreenProps<'Menu'>) {
 
       if (!result.canceled) {
         setVideoIsProcessing(true);
-        // Send video to backend for processing
-        const base64VideoData = await FileSystem.readAsStringAsync(result.assets[0].uri, {
-          encoding: FileSystem.EncodingType.Base64,
-        });
-        const response = await fetch(UPLOAD_VIDEO_ENDPOINT, {
-          method: 'POST',
-          body: base64VideoData
+        // Stream video file to backend for processing
+        const response = await FileSystem.uploadAsync(UPLOAD_VIDEO_ENDPOINT, result.assets[0].uri, {
+          httpMethod: 'POST',
+          uploadType: FileSystem.FileSystemUploadType.BINARY_CONTENT,
+          headers: { 'Content-Type': 'application/octet-stream' },
         });
 
-        if (response.status === 200) {
-          const jsonData = await response.json();
-          const processedBase64 = jsonData['processed_video'];
-          const finalSummary = jsonData['final_summary'];
+        if (response.status === 202) {
+          // Wait for the queued analysis job to finish
+          const statusUrl = SERVER_URL + JSON.parse(response.body)['status_url'];
+          let jobStatus: JobStatus = { status: 'queued' };
+          while (jobStatus.status === 'queued' || jobStatus.status === 'processing') {
+            await new Promise(resolve => setTimeout(resolve, JOB_POLL_INTERVAL_MS));
+            jobStatus = await (await fetch(statusUrl)).json();
+          }
+          if (jobStatus.status !== 'done') {
+            throw new Error('Video processing failed: ' + jobStatus.error);
+          }
+          const finalSummary = jobStatus.final_summary as FinalSummary;
 
-          // Save the video to the device
+          // Download the processed video straight to the device
           const fileUri = FileSystem.documentDirectory + 'received_video.mp4';
-          await FileSystem.writeAsStringAsync(fileUri, processedBase64, {
-            encoding: FileSystem.EncodingType.Base64,
-          });
+          await FileSystem.downloadAsync(SERVER_URL + jobStatus.processed_video_url, fileUri);
           const asset = await MediaLibrary.createAssetAsync(fileUri);
 
           console.log(finalSummary)
@@ -41,6 +41,17 @@ export type FinalSummary = {
   finalComments: string,
 }
 
+export type JobStatus = {
+  status: 'queued' | 'processing' | 'done' | 'failed',
+  output?: string,
+  frames_done?: number,
+  total_frames?: number | null,
+  error?: string,
+  final_summary?: FinalSummary,
+  processed_video_url?: string,
+  landmark_track_url?: string,
+}
+
 export type RootTabParamList = {
   Menu: undefined;
   Settings: undefined;